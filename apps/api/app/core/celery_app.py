@@ -0,0 +1,29 @@
+from celery import Celery
+from .config import settings
+
+if settings.CELERY_TASK_ALWAYS_EAGER:
+    # In-process mode for tests and local development: no Redis needed
+    broker_url = "memory://"
+    result_backend = "cache+memory://"
+else:
+    broker_url = settings.CELERY_BROKER_URL or settings.REDIS_URL
+    result_backend = settings.CELERY_RESULT_BACKEND or settings.REDIS_URL
+
+celery_app = Celery(
+    "akaar",
+    broker=broker_url,
+    backend=result_backend,
+    include=["app.services.geometry.tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_track_started=True,
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_store_eager_result=True,
+    result_expires=24 * 3600,
+    worker_prefetch_multiplier=1,
+    task_acks_late=True
+)
@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from typing import Optional
@@ -29,6 +30,126 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "ap-south-1"
     AWS_S3_BUCKET: Optional[str] = None
+    # Custom endpoint for S3-compatible stores (MinIO, a local moto server)
+    AWS_S3_ENDPOINT_URL: Optional[str] = None
+    # Connections of the shared S3 client, also the number of S3 calls
+    # the API runs at once; covers range prefetch and multipart parts
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    # Ranged reads when geometry jobs stream stored models
+    S3_RANGE_CHUNK_BYTES: int = 8 * 1024 * 1024
+    S3_RANGE_PREFETCH: int = 2
+    # Multipart uploads: part size (S3 minimum 5 MiB) and parts in flight;
+    # an upload holds at most (concurrency + 1) parts in memory
+    S3_MULTIPART_CHUNK_BYTES: int = 8 * 1024 * 1024
+    S3_MULTIPART_CONCURRENCY: int = 4
+    # Direct-to-S3 model uploads (/upload/model/presign)
+    UPLOAD_MAX_MODEL_BYTES: int = 1024 * 1024 * 1024
+    PRESIGNED_UPLOAD_EXPIRES: int = 900  # seconds
+    # Resumable uploads (/upload/sessions): chunk size (at least 5 MiB; larger
+    # for files over 10,000 chunks), how long a session lives, and how
+    # often abandoned ones are aborted
+    UPLOAD_CHUNK_BYTES: int = 8 * 1024 * 1024
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # seconds
+    UPLOAD_SESSION_SWEEP_INTERVAL: int = 3600  # seconds
+    # Stored models: blob and compact copy keys are derived from the content
+    # SHA-256 with this secret (default SECRET_KEY), so the digests previews
+    # publish do not locate the files; changing it stops new uploads from
+    # deduplicating against existing blobs. Models are handed out as
+    # presigned GETs valid for MODEL_URL_EXPIRES seconds.
+    MODEL_BLOB_KEY_SECRET: Optional[str] = None
+    MODEL_URL_EXPIRES: int = 900
+    # Hash-first claims (/upload/model/claim) prove the client has the file
+    # by hashing this many server-chosen byte ranges of this length
+    CLAIM_PROOF_RANGES: int = 4
+    CLAIM_PROOF_BYTES: int = 64 * 1024
+    CLAIM_CHALLENGE_TTL: int = 300  # seconds
+    # Compact copy of each uploaded model stored on ingest (see
+    # services/geometry/compact.py); optional grid step in mm (lossy) and
+    # zlib level
+    MESH_COMPACT_ON_INGEST: bool = True
+    MESH_QUANTIZATION_STEP: Optional[float] = None
+    MESH_COMPRESSION_LEVEL: int = 6
+    # Responsive derivatives of /upload/image uploads (see services/images.py)
+    IMAGE_DERIVATIVE_WIDTHS: list[int] = [320, 640, 1024, 1600, 2400]
+    IMAGE_DERIVATIVE_QUALITY: int = 80
+    IMAGE_MAX_PIXELS: int = 100_000_000
+
+    # Geometry processing
+    GEOMETRY_WORKERS: int = 2
+    GEOMETRY_MAX_QUEUE: int = 16
+    GEOMETRY_JOB_TIMEOUT: float = 120.0
+    GEOMETRY_WORKER_MAX_JOBS: int = 50
+    GEOMETRY_BATCH_MAX_PARTS: int = 500
+    GEOMETRY_BATCH_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # uncompressed
+
+    # Print estimation defaults (see services/geometry/profiles.py)
+    PRINTER_PROFILE: str = "bambu-p1s"
+    MATERIAL_PROFILE: str = "PLA"
+    LAYER_HEIGHT: float = 0.2  # mm
+    INFILL_DENSITY: float = 0.15
+    # JSON file with extra or overriding printer/material profiles
+    PRINT_PROFILES_FILE: Optional[str] = None
+    # Axes of the estimate matrix returned with each analysis
+    ESTIMATE_MATERIALS: list[str] = ["PLA", "PETG", "ABS", "RESIN"]
+    ESTIMATE_LAYER_HEIGHTS: list[float] = [0.12, 0.16, 0.2, 0.28]
+    ESTIMATE_INFILL_DENSITIES: list[float] = [0.1, 0.15, 0.25, 0.5]
+
+    # Printability checks run by /validate and /inspect (not /analyze or
+    # quotes). Both checks together, setup included, stop after the time
+    # budget; a stopped run's sampled verdict is returned but not cached.
+    OVERHANG_ANGLE: float = 45.0  # degrees past vertical before support is needed
+    MIN_WALL_THICKNESS: Optional[float] = None  # mm; defaults to the printer's line width
+    PRINTABILITY_TIME_BUDGET: float = 5.0  # seconds
+
+    # Build-plate nesting
+    NESTING_PART_SPACING: float = 2.0  # mm between neighbouring parts
+    NESTING_MAX_INSTANCES: int = 10000
+
+    # Near-duplicate detection (see services/geometry/fingerprint.py):
+    # size descriptors may differ by this much in log space, the D2 shape
+    # CDFs by this much at any point
+    SIMILARITY_SCALAR_TOLERANCE: float = 0.01
+    SIMILARITY_SHAPE_TOLERANCE: float = 0.05
+    # /analyze misses may take volume, area and watertightness from a cached
+    # near duplicate (bounds and estimates are still computed for the upload)
+    SIMILARITY_REUSE_ANALYSIS: bool = False
+
+    # Quote pricing (see services/pricing.py). Material prices and machine
+    # rates live on the print profiles; discounts apply from each quantity
+    # break upwards, so breaks must increase and pair up with discounts.
+    QUOTE_CURRENCY: str = "INR"
+    QUOTE_PLATE_FEE: float = 50.0  # per build plate: bed preparation and part removal
+    QUOTE_MINIMUM: float = 200.0
+    QUOTE_QUANTITY_BREAKS: list[int] = [10, 50, 200]
+    QUOTE_QUANTITY_DISCOUNTS: list[float] = [0.05, 0.1, 0.15]
+    QUOTE_MAX_ITEMS: int = 500
+
+    # Mesh repair (/geometry/repair)
+    REPAIR_MERGE_TOLERANCE: float = 1e-5  # mm; closer corners become one vertex
+    REPAIR_MAX_HOLE_EDGES: int = 100  # larger boundary loops are left open
+
+    # Background jobs (Celery). Broker and backend default to REDIS_URL;
+    # eager mode runs tasks in-process with an in-memory broker.
+    CELERY_BROKER_URL: Optional[str] = None
+    CELERY_RESULT_BACKEND: Optional[str] = None
+    CELERY_TASK_ALWAYS_EAGER: bool = False
+    # Directory shared by the API and Celery workers for queued model files
+    GEOMETRY_JOB_DIR: Optional[str] = None
+    # LOD previews: face budgets per level and where the GLB files live
+    # (shared by the API and workers; defaults to a temp directory)
+    PREVIEW_LOD_FACES: list[int] = [5000, 50000, 500000]
+    PREVIEW_DIR: Optional[str] = None
+    THUMBNAIL_SIZE: int = 256  # px, square
+    # cProfile dumps of the pool jobs of requests sent with X-Debug-Profile
+    # (DEBUG only)
+    GEOMETRY_PROFILE_DIR: Optional[str] = None
+    # Bearer token Prometheus scrapes /metrics with; without it /metrics is off
+    METRICS_TOKEN: Optional[str] = None
+
+    # Analysis result cache
+    ANALYSIS_CACHE_SIZE: int = 1024
+    ANALYSIS_CACHE_TTL: int = 7 * 24 * 3600  # seconds, Redis tier
+    ANALYSIS_CACHE_REDIS: bool = True
 
     # CORS
     CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:8000"]
@@ -37,6 +158,20 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
+    @model_validator(mode="after")
+    def check_quantity_discounts(self):
+        breaks, discounts = self.QUOTE_QUANTITY_BREAKS, self.QUOTE_QUANTITY_DISCOUNTS
+        if len(breaks) != len(discounts):
+            raise ValueError(
+                f"QUOTE_QUANTITY_BREAKS has {len(breaks)} entries but "
+                f"QUOTE_QUANTITY_DISCOUNTS has {len(discounts)}"
+            )
+        if any(b <= a for a, b in zip(breaks, breaks[1:])) or any(b < 1 for b in breaks):
+            raise ValueError("QUOTE_QUANTITY_BREAKS must be positive and strictly increasing")
+        if any(not 0 <= d < 1 for d in discounts):
+            raise ValueError("QUOTE_QUANTITY_DISCOUNTS must be fractions in [0, 1)")
+        return self
+
 
 @lru_cache()
 def get_settings() -> Settings:
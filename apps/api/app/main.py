@@ -1,18 +1,37 @@
-from fastapi import FastAPI
+import hmac
+import os
+import time
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from .core.config import settings
 from .core.database import engine, Base
 from .routers import health, auth, products, orders, quotes, geometry, upload
+from .services.geometry.pool import geometry_pool
+from .services.geometry.cache import analysis_cache
+from .services.geometry.similarity import fingerprint_index
+from .services.geometry import timing
+from .services import storage, upload_sessions
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
+    geometry_pool.start()
+    storage.start()
+    upload_sessions.start()
+    await fingerprint_index.load()
     yield
     # Shutdown
     print("Shutting down...")
+    geometry_pool.shutdown()
+    await upload_sessions.close()
+    storage.close()
+    await analysis_cache.close()
 
 
 app = FastAPI(
@@ -33,6 +52,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def geometry_stage_timing(request: Request, call_next):
+    """Per-stage Server-Timing header and histograms for geometry requests."""
+    if not request.url.path.startswith(geometry.router.prefix):
+        return await call_next(request)
+
+    profile = settings.DEBUG and request.headers.get("X-Debug-Profile") == "1"
+    timer = timing.start_request(profile)
+    response = await call_next(request)
+    timer.add("total", time.perf_counter() - timer.started)
+    response.headers["Server-Timing"] = timer.server_timing()
+    if timer.profile_path and os.path.exists(timer.profile_path):
+        response.headers["X-Profile"] = os.path.basename(timer.profile_path)
+    timer.observe()
+    return response
+
+
 # Routers
 app.include_router(health.router)
 app.include_router(auth.router)
@@ -51,3 +88,12 @@ async def root():
         "docs": "/docs",
         "health": "/health"
     }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint; only answers with the METRICS_TOKEN bearer token."""
+    expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+    if not settings.METRICS_TOKEN or not hmac.compare_digest((authorization or "").encode(), expected):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
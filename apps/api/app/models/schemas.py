@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -134,11 +134,45 @@ class QuoteItemCreate(BaseModel):
     description: str
     quantity: int
     fileUrl: Optional[str] = None
+    # Key of a model stored by /upload/model; taken from fileUrl if omitted
+    fileKey: Optional[str] = None
+    material: Optional[str] = None  # defaults to MATERIAL_PROFILE
 
 
 class QuoteCreate(BaseModel):
     items: List[QuoteItemCreate]
     notes: Optional[str] = None
+    printer: Optional[str] = None  # defaults to PRINTER_PROFILE
+
+
+class QuoteItemEstimate(BaseModel):
+    index: int
+    quantity: int
+    material: Optional[str] = None
+    # Per unit
+    printTime: Optional[float] = None  # hours
+    materialUsed: Optional[float] = None  # grams
+    unitPrice: Optional[float] = None
+    discount: float = 0.0  # fraction taken off for the quantity
+    totalPrice: Optional[float] = None
+    # Why the item could not be priced automatically
+    error: Optional[str] = None
+
+
+class QuoteEstimate(BaseModel):
+    currency: str
+    printer: str
+    items: List[QuoteItemEstimate]
+    plateCount: int
+    machineTime: float  # hours, all units
+    materialUsed: float  # grams, all units
+    materialCost: float
+    machineCost: float
+    plateCost: float
+    discount: float
+    total: float
+    # False when some items need to be priced by hand
+    complete: bool
 
 
 class QuoteResponse(BaseModel):
@@ -147,6 +181,7 @@ class QuoteResponse(BaseModel):
     status: QuoteStatus
     notes: Optional[str]
     createdAt: datetime
+    estimate: Optional[QuoteEstimate] = None
 
     class Config:
         from_attributes = True
@@ -177,10 +212,100 @@ class AddressResponse(AddressBase):
 
 
 # File Upload
+class ImageDerivative(BaseModel):
+    url: str
+    key: str
+    width: int
+    height: int
+    format: str
+    bytes: int
+
+
 class FileUploadResponse(BaseModel):
+    # For models, a presigned URL valid for MODEL_URL_EXPIRES seconds; get a
+    # fresh one from /upload/model/download
+    url: str
+    key: str
+    filename: str
+    # LOD preview manifest and thumbnail for models, available once generated
+    previewUrl: Optional[str] = None
+    thumbnailUrl: Optional[str] = None
+    # Geometry analysis queued for a direct upload; poll /geometry/jobs/{id}
+    jobId: Optional[str] = None
+    # Resized copies of images, and their srcset strings by content type
+    # (one <source type=...> each, best format first)
+    derivatives: Optional[List[ImageDerivative]] = None
+    srcset: Optional[Dict[str, str]] = None
+    # True when the model was already stored and the upload only added a
+    # reference to it
+    deduplicated: Optional[bool] = None
+
+
+class ModelClaim(BaseModel):
+    sha256: str  # hex digest of the file's contents
+    size: int  # bytes
+    filename: str
+
+
+class ByteRange(BaseModel):
+    offset: int
+    length: int
+
+
+class ClaimChallenge(BaseModel):
+    # Send back with, for each range in order, the hex SHA-256 of the
+    # nonce's bytes (hex-decoded) followed by that range of the file
+    challenge: str
+    nonce: str
+    ranges: List[ByteRange]
+    expiresAt: datetime
+
+
+class ModelClaimProof(ModelClaim):
+    challenge: str
+    proofs: List[str]
+
+
+class PresignedUploadRequest(BaseModel):
+    filename: str
+    size: int  # bytes
+
+
+class PresignedUpload(BaseModel):
+    key: str
+    # POST the file as multipart/form-data to url: every field, then "file"
     url: str
+    fields: Dict[str, str]
+    expiresIn: int  # seconds
+    maxSize: int  # bytes
+
+
+class UploadComplete(BaseModel):
+    key: str
+    filename: Optional[str] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int  # bytes
+
+
+class UploadSessionChunk(BaseModel):
+    offset: int
+    size: int
+
+
+class UploadSession(BaseModel):
+    id: str
     key: str
     filename: str
+    size: int
+    chunkSize: int
+    # Chunks stored so far, and the offsets still to send
+    received: int
+    chunks: List[UploadSessionChunk]
+    missing: List[int]
+    expiresAt: datetime
 
 
 # Health Check
@@ -192,6 +317,16 @@ class HealthResponse(BaseModel):
 
 
 # 3D Model Analysis
+class EstimateMatrix(BaseModel):
+    """Print time (hours) and material (grams), indexed [material][layerHeight][infillDensity]."""
+    printer: str
+    materials: List[str]
+    layerHeights: List[float]
+    infillDensities: List[float]
+    printTime: List[List[List[float]]]
+    material: List[List[List[float]]]
+
+
 class ModelAnalysis(BaseModel):
     volume: float
     surfaceArea: float
@@ -200,3 +335,108 @@ class ModelAnalysis(BaseModel):
     isWatertight: bool
     estimatedPrintTime: Optional[float] = None
     estimatedMaterial: Optional[float] = None
+    estimates: Optional[EstimateMatrix] = None
+
+
+class PrintabilityRegion(BaseModel):
+    """Bounding box of a cluster of flagged faces."""
+    min: List[float]
+    max: List[float]
+    faceCount: int
+
+
+class OverhangCheck(BaseModel):
+    faceCount: int
+    area: float
+    angle: float
+    checkedFaces: int
+    checkedFraction: float
+    complete: bool
+    regions: List[PrintabilityRegion]
+
+
+class ThinWallCheck(BaseModel):
+    faceCount: int
+    minThickness: float
+    thinnest: Optional[float] = None
+    checkedFaces: int
+    checkedFraction: float
+    complete: bool
+    regions: List[PrintabilityRegion]
+
+
+class PrintabilityChecks(BaseModel):
+    overhangs: OverhangCheck
+    thinWalls: ThinWallCheck
+
+
+class ModelInspection(BaseModel):
+    analysis: ModelAnalysis
+    valid: bool
+    issues: List[str]
+    warnings: List[str] = []
+    checks: Optional[PrintabilityChecks] = None
+
+
+class PreviewLevel(BaseModel):
+    url: str
+    faces: int
+    bytes: int
+
+
+class PreviewManifest(BaseModel):
+    """Thumbnail image and LOD previews as quantized GLB, smallest first."""
+    digest: str
+    thumbnailUrl: str
+    levels: List[PreviewLevel]
+
+
+class SimilarModel(BaseModel):
+    """A previously analyzed model; ``distance`` <= 1 is a near duplicate."""
+    digest: str
+    fileExt: str
+    distance: float
+
+
+class NestPart(BaseModel):
+    """A part footprint, e.g. the dimensions of an analysis bounding box (mm)."""
+    id: str
+    width: float = Field(..., gt=0)
+    depth: float = Field(..., gt=0)
+    height: float = Field(..., gt=0)
+    quantity: int = Field(1, ge=1)
+
+
+class NestRequest(BaseModel):
+    parts: List[NestPart]
+    printer: Optional[str] = None
+    spacing: Optional[float] = Field(None, ge=0)
+    allowRotation: bool = True
+
+
+class NestPlacement(BaseModel):
+    id: str
+    instance: int
+    plate: int
+    x: float
+    y: float
+    width: float
+    depth: float
+    rotated: bool
+
+
+class NestResult(BaseModel):
+    printer: str
+    plateCount: int
+    plateSize: List[float]
+    utilization: float
+    plateUtilization: List[float]
+    placements: List[NestPlacement]
+
+
+class GeometryJob(BaseModel):
+    id: str
+    status: str
+    progress: Optional[float] = None
+    result: Optional[ModelInspection] = None
+    error: Optional[str] = None
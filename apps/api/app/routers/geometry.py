@@ -1,73 +1,396 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..models.schemas import ModelAnalysis
-import tempfile
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response, Query, Depends
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from botocore.exceptions import ClientError
+from ..core.config import settings
+from ..core.celery_app import celery_app
+from ..core.database import get_db
+from ..core.security import get_current_user, get_optional_user
+from ..models.schemas import (
+    ModelAnalysis, ModelInspection, GeometryJob, NestRequest, NestResult, SimilarModel,
+    PreviewManifest, PreviewLevel
+)
+from ..services import model_store, storage
+from ..services.geometry import (
+    analysis, batch, tasks, nesting, profiles, fingerprint, previews, repair, objects, timing
+)
+from ..services.geometry.cache import analysis_cache
+from ..services.geometry.similarity import fingerprint_index
+from ..services.geometry.pool import geometry_pool, GeometryPoolFull, GeometryJobTimeout
+from ..services.geometry.spool import spool_to_disk, SpoolLimitExceeded, CHUNK_SIZE
+from contextlib import contextmanager
+import asyncio
+import json
+import time
 import os
+import re
 
 router = APIRouter(prefix="/geometry", tags=["3D Geometry"])
 
+PREVIEW_DIGEST = re.compile(r"[0-9a-f]{64}")
+PREVIEW_NAME = re.compile(r"lod\d+\.glb")
+# Preview URLs are content-addressed, so their contents never change
+PREVIEW_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-@router.post("/analyze", response_model=ModelAnalysis)
-async def analyze_model(file: UploadFile = File(...)):
+
+def build_analysis(
+    volume, area, bounds, triangle_count, is_watertight, print_time, material, estimates
+) -> ModelAnalysis:
     """
-    Analyze a 3D model file (STL, OBJ, etc.)
-    Returns volume, surface area, bounding box, and other metrics.
+    Assemble a ModelAnalysis from raw mesh metrics (mm units). Print time
+    (hours) and material (grams) come from the layer-slicing estimator;
+    ``estimates`` is its full material × layer height × infill matrix.
     """
-    # Validate file type
-    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    bounds = [list(map(float, bounds[0])), list(map(float, bounds[1]))]
+    dimensions = [hi - lo for lo, hi in zip(bounds[0], bounds[1])]
 
-    if file_ext not in allowed_extensions:
+    return ModelAnalysis(
+        volume=float(volume),
+        surfaceArea=float(area),
+        boundingBox={
+            "min": bounds[0],
+            "max": bounds[1],
+            "dimensions": dimensions
+        },
+        triangleCount=int(triangle_count),
+        isWatertight=bool(is_watertight),
+        estimatedPrintTime=print_time,
+        estimatedMaterial=material,
+        estimates=estimates
+    )
+
+
+def build_inspection(inspection: dict) -> ModelInspection:
+    validation = inspection["validation"]
+    return ModelInspection(
+        analysis=build_analysis(**inspection["analysis"]),
+        valid=validation["valid"],
+        issues=validation["issues"],
+        warnings=validation["warnings"],
+        checks=validation["checks"]
+    )
+
+
+async def run_cached_job(
+    kind: str, fn, tmp_path: str, digest: str, file_ext: str, reuse_similar: bool = False
+):
+    """
+    Run ``fn(tmp_path, file_ext)`` in the geometry worker pool unless a
+    result for the same bytes is cached. Returns ``(result, cache_tier)``,
+    where the tier is None on a miss.
+
+    With ``reuse_similar``, a miss first fingerprints the model and, if a
+    near duplicate's inspection is cached, returns tier "similar" and only
+    an analysis built from it (see ``analysis.reuse_analysis``).
+    """
+    timer = timing.request_timer()
+    cache_key = analysis_cache.key(kind, digest, file_ext)
+    with timer.stage("cache"):
+        cached, tier = await analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached, tier
+
+    if reuse_similar and settings.SIMILARITY_REUSE_ANALYSIS and len(fingerprint_index):
+        with timer.stage("similar"):
+            similar = await find_similar_inspection(tmp_path, digest, file_ext)
+        if similar is not None:
+            return similar, "similar"
+
+    result = await timing.run_timed(geometry_pool, fn, tmp_path, file_ext)
+    await analysis_cache.set(cache_key, result)
+    await remember_fingerprint(digest, file_ext, result)
+    return result, None
+
+
+async def run_checked_inspection(tmp_path: str, digest: str, file_ext: str):
+    """
+    ``run_cached_job`` for an inspection with the printability checks.
+    The checks are cached apart from the rest, and only once they covered
+    the whole mesh: a sampled verdict depends on how busy the worker was,
+    so it is recomputed next time rather than kept.
+    """
+    timer = timing.request_timer()
+    inspection_key = analysis_cache.key("inspect", digest, file_ext)
+    checks_key = analysis_cache.key("printability", digest, file_ext)
+    with timer.stage("cache"):
+        inspection, tier = await analysis_cache.get(inspection_key)
+        checks, _ = await analysis_cache.get(checks_key)
+    if inspection is not None and checks is not None:
+        return analysis.with_checks(inspection, checks), tier
+
+    if inspection is None:
+        # One load for both; skip the checks if only the rest was evicted
+        inspection = await timing.run_timed(
+            geometry_pool, analysis.inspect_path, tmp_path, file_ext, None, checks is None
+        )
+        checks = inspection.pop("checks", checks)
+        await analysis_cache.set(inspection_key, inspection)
+        await remember_fingerprint(digest, file_ext, inspection)
+    else:
+        checks = await timing.run_timed(geometry_pool, analysis.printability_path, tmp_path, file_ext)
+    await cache_checks(digest, file_ext, checks)
+    return analysis.with_checks(inspection, checks), None
+
+
+async def cache_checks(digest: str, file_ext: str, checks: dict):
+    if analysis.checks_complete(checks):
+        await analysis_cache.set(analysis_cache.key("printability", digest, file_ext), checks)
+
+
+async def find_similar_inspection(tmp_path: str, digest: str, file_ext: str):
+    """
+    ``{"analysis": ...}`` for the upload, reusing what does not depend on
+    placement from the closest cached near duplicate; None if there is none.
+    """
+    encoded = await geometry_pool.run(analysis.fingerprint_path, tmp_path, file_ext)
+    matches = fingerprint_index.nearest(fingerprint.decode(encoded), limit=3, exclude=digest)
+    for match_digest, match_ext, _ in matches:
+        cached, _ = await analysis_cache.get(analysis_cache.key("inspect", match_digest, match_ext))
+        if cached is not None:
+            reused = await timing.run_timed(
+                geometry_pool, analysis.reuse_analysis, tmp_path, file_ext, cached["analysis"]
+            )
+            return {"analysis": reused}
+    return None
+
+
+async def remember_fingerprint(digest: str, file_ext: str, inspection: dict):
+    if isinstance(inspection, dict) and "fingerprint" in inspection:
+        await fingerprint_index.add(digest, file_ext, fingerprint.decode(inspection["fingerprint"]))
+
+
+@contextmanager
+def geometry_pool_errors():
+    """Map worker pool back-pressure and timeouts to 503 and 504."""
+    try:
+        yield
+    except GeometryPoolFull:
         raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+            status_code=503,
+            detail="Geometry service is busy, please retry shortly",
+            headers={"Retry-After": "5"}
         )
+    except GeometryJobTimeout:
+        raise HTTPException(status_code=504, detail="Model analysis timed out")
 
+
+async def run_geometry_job(
+    kind: str, fn, file: UploadFile, file_ext: str, response: Response,
+    reuse_similar: bool = False, checks: bool = False
+):
+    """
+    Spool the upload to a temp file and run ``fn(path, file_ext)`` through
+    the cache and worker pool. Sets the X-Cache response header. With
+    ``checks``, the inspection comes from ``run_checked_inspection``.
+    """
+    timer = timing.request_timer()
+    timer.since_start("upload")
+    with timer.stage("spool"):
+        tmp_path, digest = await asyncio.to_thread(
+            spool_to_disk, file.file, file_ext, None, settings.GEOMETRY_JOB_DIR
+        )
     try:
-        import trimesh
+        with geometry_pool_errors():
+            if checks:
+                result, tier = await run_checked_inspection(tmp_path, digest, file_ext)
+            else:
+                result, tier = await run_cached_job(
+                    kind, fn, tmp_path, digest, file_ext, reuse_similar
+                )
+        response.headers["X-Cache"] = f"HIT-{tier.upper()}" if tier else "MISS"
+        timer.label(file_ext, triangle_count(result))
+        return result
+    finally:
+        os.unlink(tmp_path)
 
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
 
-        # Load and analyze mesh
-        mesh = trimesh.load(tmp_path)
+def triangle_count(inspection):
+    if isinstance(inspection, dict) and "analysis" in inspection:
+        return inspection["analysis"]["triangle_count"]
+    return None
 
-        # Clean up temp file
-        os.unlink(tmp_path)
 
-        # Handle scene vs mesh
-        if isinstance(mesh, trimesh.Scene):
-            if len(mesh.geometry) == 0:
-                raise HTTPException(status_code=400, detail="Empty model")
-            mesh = trimesh.util.concatenate(mesh.geometry.values())
+def preview_url(digest: str) -> str:
+    return f"{router.prefix}/previews/{digest}"
 
-        # Calculate metrics
-        bounds = mesh.bounds.tolist()
-        dimensions = (mesh.bounds[1] - mesh.bounds[0]).tolist()
 
-        # Estimate print time (rough: 1 hour per 100 cm³)
-        volume_cm3 = mesh.volume / 1000  # mm³ to cm³
-        estimated_print_time = volume_cm3 / 100  # hours
+async def inspect_upload(
+    file: UploadFile, file_ext: str, response: Response,
+    reuse_similar: bool = False, checks: bool = False
+) -> dict:
+    """
+    Shared pipeline behind /analyze, /validate and /inspect: one load of the
+    model yields both metrics and the topology verdict, cached under a
+    single key. /validate and /inspect pass ``checks`` for the printability
+    checks too. Only /analyze passes ``reuse_similar``: a near duplicate's
+    volume and area are a fair answer, its validation verdict is not.
+    """
+    return await run_geometry_job(
+        "inspect", analysis.inspect_path, file, file_ext, response, reuse_similar, checks
+    )
 
-        # Estimate material (PLA density ~1.25 g/cm³)
-        estimated_material = volume_cm3 * 1.25  # grams
 
-        return ModelAnalysis(
-            volume=float(mesh.volume),
-            surfaceArea=float(mesh.area),
-            boundingBox={
-                "min": bounds[0],
-                "max": bounds[1],
-                "dimensions": dimensions
-            },
-            triangleCount=len(mesh.faces),
-            isWatertight=mesh.is_watertight,
-            estimatedPrintTime=estimated_print_time,
-            estimatedMaterial=estimated_material
+async def queue_inspection(
+    file: UploadFile, file_ext: str, response: Response, checks: bool = False
+):
+    """
+    Async mode: hand the model to a Celery worker and return
+    ``(job, None)``. If the result is already cached, return
+    ``(None, inspection)`` so the caller can answer immediately.
+    With ``checks`` the worker runs the printability checks too.
+    """
+    timer = timing.request_timer()
+    timer.since_start("upload")
+    with timer.stage("spool"):
+        tmp_path, digest = await asyncio.to_thread(
+            spool_to_disk, file.file, file_ext, None, settings.GEOMETRY_JOB_DIR
+        )
+    timer.label(file_ext)
+
+    try:
+        with timer.stage("cache"):
+            cached, tier = await analysis_cache.get(analysis_cache.key("inspect", digest, file_ext))
+            if cached is not None and checks:
+                found, _ = await analysis_cache.get(analysis_cache.key("printability", digest, file_ext))
+                cached = None if found is None else analysis.with_checks(cached, found)
+        if cached is not None:
+            os.unlink(tmp_path)
+            response.headers["X-Cache"] = f"HIT-{tier.upper()}"
+            timer.label(file_ext, triangle_count(cached))
+            return None, cached
+
+        # The task owns the file from here and removes it when done
+        result = await asyncio.to_thread(
+            tasks.inspect_task.apply_async, (tmp_path, file_ext, digest, checks)
         )
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return GeometryJob(id=result.id, status="PENDING"), None
+
+
+async def inspect_stored_model(
+    key: str, file_ext: str, response: Response, current_user: Optional[dict], async_mode: bool,
+    db: Session
+):
+    """
+    Inspect a model that /upload/model already stored, streamed from S3
+    by the worker instead of being uploaded again. Returns ``(job,
+    inspection)`` like ``queue_inspection``; job is None unless queued.
+    Uploads record the content SHA-256 on the object, so a cached result
+    is found without reading the model at all. Deduplicated uploads are
+    read from their shared blob.
+    """
+    if current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Sign in to analyze a stored model",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    key = model_store.readable_keys(db, current_user["user_id"], [key])[key]
+    if key is None:
+        raise HTTPException(status_code=403, detail="Not authorized to analyze this file")
+
+    timer = timing.request_timer()
+    timer.label(file_ext)
+    s3 = storage.get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+    try:
+        with timer.stage("head"):
+            head = await storage.call(s3.head_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise HTTPException(status_code=404, detail="Model not found")
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+
+    digest = head.get("Metadata", {}).get("sha256")
+    if digest:
+        with timer.stage("cache"):
+            cached, tier = await analysis_cache.get(analysis_cache.key("inspect", digest, file_ext))
+        if cached is not None:
+            response.headers["X-Cache"] = f"HIT-{tier.upper()}"
+            timer.label(file_ext, triangle_count(cached))
+            return None, cached
+
+    if async_mode:
+        args = (key, file_ext, head["ContentLength"], head.get("ETag"), False, digest)
+        result = await asyncio.to_thread(tasks.inspect_object_task.apply_async, args)
+        return GeometryJob(id=result.id, status="PENDING"), None
+
+    # A known digest lets the worker read the model's compact form
+    args = (key, file_ext, head["ContentLength"], head.get("ETag"), None, False, digest)
+    with geometry_pool_errors():
+        result = await timing.run_timed(geometry_pool, objects.inspect_object, *args)
+    response.headers["X-Cache"] = "MISS"
+    timer.label(file_ext, triangle_count(result["inspection"]))
+    await analysis_cache.set(
+        analysis_cache.key("inspect", result["digest"], file_ext), result["inspection"]
+    )
+    await remember_fingerprint(result["digest"], file_ext, result["inspection"])
+    return None, result["inspection"]
+
+
+def queued_response(job: GeometryJob) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content=job.model_dump(),
+        headers={"Location": f"{router.prefix}/jobs/{job.id}"}
+    )
+
+
+@router.post("/analyze", response_model=ModelAnalysis)
+async def analyze_model(
+    response: Response,
+    file: Optional[UploadFile] = File(None),
+    key: Optional[str] = Form(None),
+    async_mode: bool = Query(False, alias="async"),
+    current_user: Optional[dict] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze a 3D model file (STL, OBJ, etc.)
+    Returns volume, surface area, bounding box, and other metrics.
+    Instead of the file, send the ``key`` /upload/model returned for it
+    (signed in as its owner) to analyze the stored copy.
+    With ?async=true, returns 202 and a job id to poll at /geometry/jobs/{id}.
+    """
+    if (file is None) == (key is None):
+        raise HTTPException(status_code=400, detail="Send either a file or the key of an uploaded model")
+
+    # Validate file type
+    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+    file_ext = os.path.splitext(file.filename if file is not None else key)[1].lower()
 
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+
+    try:
+        if key is not None:
+            job, inspection = await inspect_stored_model(
+                key, file_ext, response, current_user, async_mode, db
+            )
+            if job is not None:
+                return queued_response(job)
+        elif async_mode:
+            job, inspection = await queue_inspection(file, file_ext, response)
+            if job is not None:
+                return queued_response(job)
+        else:
+            inspection = await inspect_upload(file, file_ext, response, reuse_similar=True)
+        return build_analysis(**inspection["analysis"])
+
+    except HTTPException:
+        raise
+    except analysis.EmptyModelError:
+        raise HTTPException(status_code=400, detail="Empty model")
     except ImportError:
         # Trimesh not available, return mock data
         return ModelAnalysis(
@@ -88,10 +411,15 @@ async def analyze_model(file: UploadFile = File(...)):
 
 
 @router.post("/validate")
-async def validate_model(file: UploadFile = File(...)):
+async def validate_model(
+    response: Response,
+    file: UploadFile = File(...),
+    async_mode: bool = Query(False, alias="async")
+):
     """
     Validate a 3D model for printability.
     Checks for common issues like non-manifold edges, holes, etc.
+    With ?async=true, returns 202 and a job id to poll at /geometry/jobs/{id}.
     """
     allowed_extensions = [".stl", ".obj", ".ply"]
     file_ext = os.path.splitext(file.filename)[1].lower()
@@ -103,42 +431,16 @@ async def validate_model(file: UploadFile = File(...)):
         )
 
     try:
-        import trimesh
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-
-        mesh = trimesh.load(tmp_path)
-        os.unlink(tmp_path)
-
-        if isinstance(mesh, trimesh.Scene):
-            mesh = trimesh.util.concatenate(mesh.geometry.values())
-
-        issues = []
-
-        if not mesh.is_watertight:
-            issues.append("Model is not watertight (has holes)")
-
-        if not mesh.is_winding_consistent:
-            issues.append("Inconsistent face winding")
-
-        if len(mesh.faces) < 4:
-            issues.append("Too few faces for a valid 3D model")
-
-        # Check for degenerate faces
-        degenerate = mesh.area_faces < 1e-8
-        if degenerate.any():
-            issues.append(f"Contains {degenerate.sum()} degenerate faces")
-
-        return {
-            "valid": len(issues) == 0,
-            "issues": issues,
-            "triangleCount": len(mesh.faces),
-            "isWatertight": mesh.is_watertight
-        }
+        if async_mode:
+            job, inspection = await queue_inspection(file, file_ext, response, checks=True)
+            if job is not None:
+                return queued_response(job)
+        else:
+            inspection = await inspect_upload(file, file_ext, response, checks=True)
+        return inspection["validation"]
 
+    except HTTPException:
+        raise
     except ImportError:
         return {
             "valid": True,
@@ -149,3 +451,394 @@ async def validate_model(file: UploadFile = File(...)):
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error validating model: {str(e)}")
+
+
+@router.post("/inspect", response_model=ModelInspection)
+async def inspect_model(response: Response, file: UploadFile = File(...)):
+    """
+    Analyze and validate a 3D model in a single pass.
+    Returns the /analyze metrics together with the /validate verdict.
+    """
+    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+    file_ext = os.path.splitext(file.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+
+    try:
+        inspection = await inspect_upload(file, file_ext, response, checks=True)
+        return build_inspection(inspection)
+
+    except HTTPException:
+        raise
+    except analysis.EmptyModelError:
+        raise HTTPException(status_code=400, detail="Empty model")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error inspecting model: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=GeometryJob)
+async def get_geometry_job(job_id: str):
+    """
+    Status of a queued geometry job. Unknown ids report PENDING, as the
+    result backend cannot tell them apart from jobs not yet picked up.
+    """
+    meta = await asyncio.to_thread(celery_app.backend.get_task_meta, job_id)
+    status = meta["status"]
+    info = meta.get("result")
+    job = GeometryJob(id=job_id, status=status)
+
+    if status == "PROGRESS" and isinstance(info, dict):
+        job.progress = info.get("progress")
+    elif status == "SUCCESS":
+        job.progress = 1.0
+        inspection = dict(info["inspection"])
+        checks = inspection.pop("checks", None)
+        await analysis_cache.set(
+            analysis_cache.key("inspect", info["digest"], info["fileExt"]), inspection
+        )
+        await remember_fingerprint(info["digest"], info["fileExt"], inspection)
+        if checks is not None:
+            await cache_checks(info["digest"], info["fileExt"], checks)
+            inspection = analysis.with_checks(inspection, checks)
+        job.result = build_inspection(inspection)
+    elif status == "FAILURE":
+        job.error = str(info)
+
+    return job
+
+
+@router.post("/similar", response_model=List[SimilarModel])
+async def find_similar_models(
+    file: UploadFile = File(...),
+    limit: int = Query(5, ge=1, le=50),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    The caller's stored models with the same shape as the upload, even if
+    re-exported with a different triangulation. Closest first; a distance
+    of 1 is the edge of the near-duplicate tolerance. Other customers'
+    models are never returned: their digests would give access to their
+    previews.
+    """
+    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+    file_ext = os.path.splitext(file.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+
+    timer = timing.request_timer()
+    timer.since_start("upload")
+    timer.label(file_ext)
+    with timer.stage("spool"):
+        tmp_path, digest = await asyncio.to_thread(spool_to_disk, file.file, file_ext)
+    try:
+        with timer.stage("cache"):
+            cached, _ = await analysis_cache.get(analysis_cache.key("inspect", digest, file_ext))
+        if cached is not None:
+            encoded = cached["fingerprint"]
+            timer.label(file_ext, triangle_count(cached))
+        else:
+            with geometry_pool_errors():
+                encoded = await timing.run_timed(
+                    geometry_pool, analysis.fingerprint_path, tmp_path, file_ext
+                )
+    except HTTPException:
+        raise
+    except analysis.EmptyModelError:
+        raise HTTPException(status_code=400, detail="Empty model")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error fingerprinting model: {str(e)}")
+    finally:
+        os.unlink(tmp_path)
+
+    # Every near duplicate, then only those the caller has stored
+    matches = fingerprint_index.nearest(fingerprint.decode(encoded), limit=None, exclude=digest)
+    blobs = [model_store.blob_key(match_digest, match_ext) for match_digest, match_ext, _ in matches]
+    readable = model_store.readable_keys(db, current_user["user_id"], blobs)
+    return [
+        SimilarModel(digest=match_digest, fileExt=match_ext, distance=score)
+        for (match_digest, match_ext, score), blob in zip(matches, blobs)
+        if readable[blob] is not None
+    ][:limit]
+
+
+@router.post("/repair")
+async def repair_model(
+    file: UploadFile = File(...),
+    format: str = Query("stl", pattern="^(stl|glb)$")
+):
+    """
+    Repair a model that fails validation: weld vertices, drop degenerate
+    and duplicate faces, make winding consistent with normals pointing out
+    and close small holes. The repaired mesh is streamed back as binary
+    STL or GLB; what was changed is in the X-Repair-Report header (JSON).
+    """
+    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+    file_ext = os.path.splitext(file.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+
+    timer = timing.request_timer()
+    timer.since_start("upload")
+    timer.label(file_ext)
+    with timer.stage("spool"):
+        tmp_path, _ = await asyncio.to_thread(
+            spool_to_disk, file.file, file_ext, None, settings.GEOMETRY_JOB_DIR
+        )
+    out_path = f"{tmp_path}.repaired.{format}"
+    try:
+        try:
+            with geometry_pool_errors():
+                report = await timing.run_timed(
+                    geometry_pool, repair.repair_path, tmp_path, file_ext, out_path, format
+                )
+            timer.label(file_ext, report["inputTriangles"])
+        except HTTPException:
+            raise
+        except analysis.EmptyModelError:
+            raise HTTPException(status_code=400, detail="Empty model")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error repairing model: {str(e)}")
+        finally:
+            os.unlink(tmp_path)
+    except BaseException:
+        # Partly written output. Removed after the input, so a job that
+        # timed out but is still running removes its own (see repair_path)
+        _discard(out_path)
+        raise
+
+    name = re.sub(r"[^\w.-]", "_", os.path.splitext(os.path.basename(file.filename))[0])
+    return StreamingResponse(
+        _stream_file(out_path),
+        media_type=repair.OUTPUT_FORMATS[format],
+        headers={
+            "Content-Length": str(report["bytes"]),
+            "Content-Disposition": f'attachment; filename="{name}-repaired.{format}"',
+            "X-Repair-Report": json.dumps(report, separators=(",", ":"))
+        },
+        # Also runs when the client disconnects before the body starts
+        background=BackgroundTask(_discard, out_path)
+    )
+
+
+@router.post("/nest", response_model=NestResult)
+async def nest_parts(request: NestRequest):
+    """
+    Pack part footprints onto build plates. Returns how many plates the
+    parts need on the chosen printer, plate utilization and the position
+    of every instance.
+    """
+    instances = sum(part.quantity for part in request.parts)
+    if instances > settings.NESTING_MAX_INSTANCES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.NESTING_MAX_INSTANCES} instances per request"
+        )
+
+    try:
+        printer = profiles.get_printer(request.printer or settings.PRINTER_PROFILE)
+        footprints = [
+            nesting.PartFootprint(
+                id=part.id,
+                width=part.width,
+                depth=part.depth,
+                height=part.height,
+                quantity=part.quantity
+            )
+            for part in request.parts
+        ]
+        spacing = settings.NESTING_PART_SPACING if request.spacing is None else request.spacing
+        return await asyncio.to_thread(
+            nesting.nest, footprints, printer, spacing, None, request.allowRotation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/previews/{digest}", response_model=PreviewManifest)
+async def get_previews(digest: str, response: Response):
+    """
+    LOD previews of a model, smallest first. Load the first level for an
+    immediate preview and swap in larger ones as they download. Previews
+    are content-addressed, so responses are cacheable indefinitely.
+    """
+    if not PREVIEW_DIGEST.fullmatch(digest):
+        raise HTTPException(status_code=404, detail="Preview not found")
+
+    manifest = await asyncio.to_thread(previews.load_manifest, digest)
+    if manifest is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Preview not found or still being generated",
+            headers={"Retry-After": "5", "Cache-Control": "no-store"}
+        )
+
+    response.headers["Cache-Control"] = PREVIEW_CACHE_CONTROL
+    return PreviewManifest(
+        digest=digest,
+        thumbnailUrl=f"{preview_url(digest)}/thumbnail",
+        levels=[
+            PreviewLevel(
+                url=f"{preview_url(digest)}/{level['name']}",
+                faces=level["faces"],
+                bytes=level["bytes"]
+            )
+            for level in manifest["levels"]
+        ]
+    )
+
+
+@router.get("/previews/{digest}/thumbnail")
+async def get_preview_thumbnail(digest: str):
+    """Shaded thumbnail of a model, for plain <img> tags on listing pages."""
+    if not PREVIEW_DIGEST.fullmatch(digest):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    image_format = previews.thumbnail_format()
+    path = os.path.join(previews.preview_dir(digest), f"thumbnail.{image_format}")
+    if not await asyncio.to_thread(os.path.exists, path):
+        raise HTTPException(
+            status_code=404,
+            detail="Thumbnail not found or still being generated",
+            headers={"Retry-After": "5", "Cache-Control": "no-store"}
+        )
+
+    return FileResponse(
+        path,
+        media_type=f"image/{image_format}",
+        headers={"Cache-Control": PREVIEW_CACHE_CONTROL}
+    )
+
+
+@router.get("/previews/{digest}/{name}")
+async def get_preview_file(digest: str, name: str):
+    """One LOD of a model as quantized binary glTF."""
+    if not PREVIEW_DIGEST.fullmatch(digest) or not PREVIEW_NAME.fullmatch(name):
+        raise HTTPException(status_code=404, detail="Preview not found")
+
+    path = os.path.join(previews.preview_dir(digest), name)
+    if not await asyncio.to_thread(os.path.exists, path):
+        raise HTTPException(status_code=404, detail="Preview not found")
+
+    return FileResponse(
+        path,
+        media_type="model/gltf-binary",
+        headers={"Cache-Control": PREVIEW_CACHE_CONTROL}
+    )
+
+
+@router.post("/batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyze many parts in one request: several model files, or one ZIP
+    archive of models. Streams one NDJSON line per part as it finishes,
+    then a final line with totals for volume, print time and material.
+    """
+    allowed_extensions = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+    max_parts = settings.GEOMETRY_BATCH_MAX_PARTS
+    max_bytes = settings.GEOMETRY_BATCH_MAX_BYTES
+
+    # Uploads are closed once this handler returns, so everything the
+    # stream needs is spooled to our own temp files first.
+    is_archive = len(files) == 1 and files[0].filename.lower().endswith(".zip")
+    if is_archive:
+        try:
+            archive_path, _ = await asyncio.to_thread(
+                spool_to_disk, files[0].file, ".zip", max_bytes
+            )
+        except SpoolLimitExceeded as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        parts = _archive_parts(archive_path, allowed_extensions, max_parts, max_bytes)
+    else:
+        if len(files) > max_parts:
+            raise HTTPException(status_code=400, detail=f"At most {max_parts} files per batch")
+        spooled = []
+        try:
+            for index, file in enumerate(files):
+                file_ext = os.path.splitext(file.filename)[1].lower()
+                part = batch.BatchPart(index=index, filename=file.filename, file_ext=file_ext)
+                if file_ext in allowed_extensions:
+                    part.path, part.digest = await asyncio.to_thread(
+                        spool_to_disk, file.file, file_ext
+                    )
+                else:
+                    part.error = "Unsupported file type"
+                spooled.append(part)
+        except BaseException:
+            _remove_parts(spooled)
+            raise
+        parts = _uploaded_parts(spooled)
+
+    return StreamingResponse(
+        batch.stream_batch(parts, _analyze_batch_part, concurrency=geometry_pool.workers),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _analyze_batch_part(part: batch.BatchPart) -> dict:
+    # Batches wait for pool capacity instead of failing a part with 503
+    deadline = time.monotonic() + geometry_pool.job_timeout
+    while True:
+        try:
+            inspection, _ = await run_cached_job(
+                "inspect", analysis.inspect_path, part.path, part.digest, part.file_ext
+            )
+            break
+        except GeometryPoolFull:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Geometry service is busy")
+            await asyncio.sleep(0.5)
+        except GeometryJobTimeout:
+            raise RuntimeError("Model analysis timed out")
+    return build_analysis(**inspection["analysis"]).model_dump()
+
+
+def _stream_file(path):
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+    finally:
+        _discard(path)
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _archive_parts(archive_path, allowed_extensions, max_parts, max_bytes):
+    try:
+        yield from batch.iter_archive_parts(archive_path, allowed_extensions, max_parts, max_bytes)
+    finally:
+        os.unlink(archive_path)
+
+
+def _uploaded_parts(parts):
+    pending = list(parts)
+    try:
+        while pending:
+            yield pending.pop(0)
+    finally:
+        # Parts never handed out (client disconnected) still own temp files
+        _remove_parts(pending)
+
+
+def _remove_parts(parts):
+    for part in parts:
+        if part.path:
+            os.unlink(part.path)
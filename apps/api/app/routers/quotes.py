@@ -2,12 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List
+import json
+from ..core.config import settings
 from ..core.database import get_db
 from ..core.security import get_current_user
 from ..models.schemas import QuoteCreate, QuoteResponse, QuoteStatus
+from ..services import pricing
 
 router = APIRouter(prefix="/quotes", tags=["Quotes"])
 
+# Reads the estimate column through the row's JSON, so listing and
+# fetching quotes keep working (estimate null) on a database the
+# add_quote_estimate migration has not reached yet
+ESTIMATE = """to_jsonb(q) -> 'estimate' AS estimate"""
+
 
 @router.get("", response_model=List[QuoteResponse])
 async def get_quotes(
@@ -15,9 +23,9 @@ async def get_quotes(
     db: Session = Depends(get_db)
 ):
     result = db.execute(
-        text("""
-            SELECT id, "userId", status, notes, "createdAt"
-            FROM "Quote"
+        text(f"""
+            SELECT id, "userId", status, notes, "createdAt", {ESTIMATE}
+            FROM "Quote" q
             WHERE "userId" = :userId
             ORDER BY "createdAt" DESC
         """),
@@ -31,7 +39,8 @@ async def get_quotes(
             userId=str(q.userId),
             status=q.status,
             notes=q.notes,
-            createdAt=q.createdAt
+            createdAt=q.createdAt,
+            estimate=q.estimate
         )
         for q in quotes
     ]
@@ -43,17 +52,37 @@ async def create_quote(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Create a quote request. Items referencing a model stored by
+    /upload/model are priced automatically from its geometry; the estimate
+    is saved with the quote, and items it could not price carry an error
+    for manual review.
+    """
+    if len(quote_data.items) > settings.QUOTE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.QUOTE_MAX_ITEMS} items per quote"
+        )
+
+    try:
+        estimate = await pricing.price_quote(
+            quote_data.items, current_user["user_id"], quote_data.printer, db
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Create quote
     result = db.execute(
         text("""
-            INSERT INTO "Quote" (id, "userId", status, notes, "createdAt", "updatedAt")
-            VALUES (gen_random_uuid(), :userId, :status, :notes, NOW(), NOW())
-            RETURNING id, "userId", status, notes, "createdAt"
+            INSERT INTO "Quote" (id, "userId", status, notes, estimate, "createdAt", "updatedAt")
+            VALUES (gen_random_uuid(), :userId, :status, :notes, CAST(:estimate AS JSONB), NOW(), NOW())
+            RETURNING id, "userId", status, notes, "createdAt", estimate
         """),
         {
             "userId": current_user["user_id"],
             "status": QuoteStatus.PENDING,
-            "notes": quote_data.notes
+            "notes": quote_data.notes,
+            "estimate": json.dumps(estimate)
         }
     )
     quote = result.fetchone()
@@ -80,7 +109,8 @@ async def create_quote(
         userId=str(quote.userId),
         status=quote.status,
         notes=quote.notes,
-        createdAt=quote.createdAt
+        createdAt=quote.createdAt,
+        estimate=quote.estimate
     )
 
 
@@ -91,9 +121,9 @@ async def get_quote(
     db: Session = Depends(get_db)
 ):
     result = db.execute(
-        text("""
-            SELECT id, "userId", status, notes, "createdAt"
-            FROM "Quote"
+        text(f"""
+            SELECT id, "userId", status, notes, "createdAt", {ESTIMATE}
+            FROM "Quote" q
             WHERE id = :quoteId AND "userId" = :userId
         """),
         {"quoteId": quote_id, "userId": current_user["user_id"]}
@@ -108,5 +138,6 @@ async def get_quote(
         userId=str(quote.userId),
         status=quote.status,
         notes=quote.notes,
-        createdAt=quote.createdAt
+        createdAt=quote.createdAt,
+        estimate=quote.estimate
     )
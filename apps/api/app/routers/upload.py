@@ -1,34 +1,76 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import RedirectResponse
+from sqlalchemy.orm import Session
+from typing import Optional
 from ..core.security import get_current_user
 from ..core.config import settings
-from ..models.schemas import FileUploadResponse
-import boto3
+from ..core.database import get_db
+from ..models.schemas import (
+    ByteRange, ClaimChallenge, FileUploadResponse, ImageDerivative, ModelClaim, ModelClaimProof,
+    PresignedUploadRequest, PresignedUpload, UploadComplete, UploadSessionCreate, UploadSessionChunk,
+    UploadSession
+)
+from ..services import images, model_store, upload_sessions
+from ..services.geometry import tasks
+from ..services.geometry.pool import geometry_pool, GeometryPoolFull, GeometryJobTimeout
+from ..services.geometry.spool import spool_to_disk
+from ..services import storage
+from ..services.storage import get_s3_client, object_url, owns_key, presigned_url, upload_stream
 from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+import asyncio
+import io
 import uuid
 import os
+import re
 
 router = APIRouter(prefix="/upload", tags=["File Upload"])
 
+# Content type stored with each model format; direct uploads must send it
+MODEL_CONTENT_TYPES = {
+    ".stl": "model/stl",
+    ".obj": "model/obj",
+    ".ply": "application/octet-stream",
+    ".gltf": "model/gltf+json",
+    ".glb": "model/gltf-binary",
+    ".step": "model/step",
+    ".stp": "model/step",
+    ".iges": "model/iges",
+    ".igs": "model/iges",
+}
+# Formats geometry analysis can read
+ANALYZABLE_EXTENSIONS = {".stl", ".obj", ".ply", ".gltf", ".glb"}
 
-def get_s3_client():
-    if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
-        return None
 
-    return boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION
-    )
+def model_key(user_id: str, file_ext: str) -> str:
+    return f"models/{user_id}/{uuid.uuid4()}{file_ext}"
+
+
+def preview_urls(digest: str) -> tuple:
+    """Preview manifest and thumbnail URLs of a model, by content."""
+    preview_url = f"/geometry/previews/{digest}"
+    return preview_url, f"{preview_url}/thumbnail"
+
+
+def is_model_key(user_id: str, key: str) -> bool:
+    """Whether ``key`` has the layout ``model_key`` gives ``user_id``."""
+    match = re.fullmatch(rf"models/{re.escape(user_id)}/[0-9a-f-]{{36}}(\.[a-z]+)", key)
+    return match is not None and match.group(1) in MODEL_CONTENT_TYPES
 
 
 @router.post("/model", response_model=FileUploadResponse)
 async def upload_model(
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """Upload a 3D model file to S3"""
-    allowed_extensions = [".stl", ".obj", ".ply", ".gltf", ".glb", ".step", ".stp", ".iges", ".igs"]
+    """
+    Upload a 3D model file to S3. Files are stored once by content;
+    uploading one that is already stored (by anyone) only records a
+    reference to it, and the response has ``deduplicated`` set. Clients
+    can skip sending such files with /upload/model/claim/challenge.
+    """
+    allowed_extensions = list(MODEL_CONTENT_TYPES)
     file_ext = os.path.splitext(file.filename)[1].lower()
 
     if file_ext not in allowed_extensions:
@@ -38,36 +80,445 @@ async def upload_model(
         )
 
     # Generate unique key
-    file_id = str(uuid.uuid4())
-    key = f"models/{current_user['user_id']}/{file_id}{file_ext}"
+    key = model_key(current_user["user_id"], file_ext)
 
-    s3 = get_s3_client()
-    if not s3:
-        # Return mock response if S3 not configured
-        return FileUploadResponse(
-            url=f"https://example.com/{key}",
-            key=key,
-            filename=file.filename
-        )
+    # Spooled where geometry workers can read it, for preview generation
+    tmp_path, digest = await asyncio.to_thread(
+        spool_to_disk, file.file, file_ext, None, settings.GEOMETRY_JOB_DIR
+    )
+    handed_off = False
 
     try:
-        content = await file.read()
-        s3.put_object(
-            Bucket=settings.AWS_S3_BUCKET,
-            Key=key,
-            Body=content,
-            ContentType=file.content_type
-        )
+        s3 = get_s3_client()
+        deduplicated = None
+        if not s3:
+            # Mock response if S3 not configured
+            url = f"https://example.com/{key}"
+        else:
+            deduplicated = await storage.call(
+                model_store.store, db, s3, settings.AWS_S3_BUCKET, current_user["user_id"], key,
+                file.filename, digest, file_ext, tmp_path, MODEL_CONTENT_TYPES[file_ext]
+            )
+            url = presigned_url(s3, model_store.blob_key(digest, file_ext))
 
-        url = f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+        preview_url = thumbnail_url = None
+        # Previews only for stored models; they are removed with the blob
+        if s3 and file_ext in tasks.PREVIEW_EXTENSIONS:
+            preview_url, thumbnail_url = preview_urls(digest)
+            # Stored models also get a compact copy for faster reads
+            queue = tasks.queue_ingest if settings.MESH_COMPACT_ON_INGEST else tasks.queue_previews
+            try:
+                handed_off = await asyncio.to_thread(queue, tmp_path, file_ext, digest)
+            except Exception as e:
+                print(f"Could not queue ingest for {digest}: {e}")
 
         return FileUploadResponse(
             url=url,
             key=key,
-            filename=file.filename
+            filename=file.filename,
+            previewUrl=preview_url,
+            thumbnailUrl=thumbnail_url,
+            deduplicated=deduplicated
         )
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        if not handed_off:
+            os.unlink(tmp_path)
+
+
+def claimed_file(request: ModelClaim) -> tuple:
+    """Extension and lowercase digest of a claim, or 400."""
+    allowed_extensions = list(MODEL_CONTENT_TYPES)
+    file_ext = os.path.splitext(request.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+    digest = request.sha256.lower()
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=400, detail="sha256 must be a hex SHA-256 digest")
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    return file_ext, digest
+
+
+@router.post("/model/claim/challenge", response_model=ClaimChallenge)
+async def challenge_model_claim(
+    request: ModelClaim,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Hash-first upload, step one: send the SHA-256 and size of a model
+    before the file. If that content is already stored, the response
+    lists byte ranges of the file to hash with a nonce; send the hashes to
+    /upload/model/claim to add it to your files without sending it.
+    Otherwise 404, and the file should be sent to /upload/model as usual.
+    """
+    file_ext, digest = claimed_file(request)
+    if not await storage.call(model_store.is_stored, db, digest, file_ext, request.size):
+        raise HTTPException(status_code=404, detail="Not stored yet, upload the file")
+
+    challenge = model_store.new_challenge(current_user["user_id"], digest, file_ext, request.size)
+    return ClaimChallenge(
+        challenge=model_store.encode_challenge(challenge),
+        nonce=challenge["nonce"],
+        ranges=[ByteRange(offset=offset, length=length) for offset, length in challenge["ranges"]],
+        expiresAt=datetime.fromtimestamp(challenge["exp"], timezone.utc)
+    )
+
+
+@router.post("/model/claim", response_model=FileUploadResponse)
+async def claim_model(
+    request: ModelClaimProof,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Hash-first upload, step two: the challenge from
+    /upload/model/claim/challenge and the hash of each of its ranges.
+    If they match the stored file, it is added to your files; otherwise
+    404, and the file should be sent to /upload/model as usual.
+    """
+    file_ext, digest = claimed_file(request)
+    try:
+        challenge = model_store.decode_challenge(request.challenge, current_user["user_id"])
+    except model_store.ChallengeInvalid as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (challenge["sha256"], challenge["ext"], challenge["size"]) != (digest, file_ext, request.size):
+        raise HTTPException(status_code=400, detail="The challenge was issued for another file")
+
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+
+    key = model_key(current_user["user_id"], file_ext)
+    try:
+        claimed = await storage.call(
+            model_store.claim, db, s3, settings.AWS_S3_BUCKET, current_user["user_id"], key,
+            request.filename, challenge, request.proofs
+        )
+        url = presigned_url(s3, model_store.blob_key(digest, file_ext))
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+    if not claimed:
+        raise HTTPException(status_code=404, detail="Not stored or the proofs do not match, upload the file")
+
+    preview_url = thumbnail_url = None
+    if file_ext in tasks.PREVIEW_EXTENSIONS:
+        preview_url, thumbnail_url = preview_urls(digest)
+    return FileUploadResponse(
+        url=url,
+        key=key,
+        filename=request.filename,
+        previewUrl=preview_url,
+        thumbnailUrl=thumbnail_url,
+        deduplicated=True
+    )
+
+
+@router.get("/model/download")
+async def download_model(
+    key: str = Query(...),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Redirect to a short-lived presigned URL for one of your models (the
+    ``key`` /upload/model returned). Stored models are private; this is
+    how to get a fresh URL once the one returned on upload has expired.
+    """
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+    readable = (await storage.call(model_store.readable_keys, db, current_user["user_id"], [key]))[key]
+    if readable is None or not readable.startswith(("models/", model_store.BLOB_PREFIX)):
+        raise HTTPException(status_code=404, detail="Model not found")
+    return RedirectResponse(presigned_url(s3, readable), status_code=307)
+
+
+@router.post("/model/presign", response_model=PresignedUpload)
+async def presign_model_upload(
+    request: PresignedUploadRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Presigned POST for uploading a model straight to S3, so the bytes
+    never pass through the API. Send every returned field and then the
+    file (as "file") to ``url``; S3 rejects other keys, content types and
+    files larger than the declared size. Then call /upload/model/complete.
+    """
+    allowed_extensions = list(MODEL_CONTENT_TYPES)
+    file_ext = os.path.splitext(request.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+    if not 0 < request.size <= settings.UPLOAD_MAX_MODEL_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model files must be between 1 byte and {settings.UPLOAD_MAX_MODEL_BYTES} bytes"
+        )
+
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+
+    key = model_key(current_user["user_id"], file_ext)
+    content_type = MODEL_CONTENT_TYPES[file_ext]
+    post = s3.generate_presigned_post(
+        Bucket=settings.AWS_S3_BUCKET,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, request.size]
+        ],
+        ExpiresIn=settings.PRESIGNED_UPLOAD_EXPIRES
+    )
+    return PresignedUpload(
+        key=key,
+        url=post["url"],
+        fields=post["fields"],
+        expiresIn=settings.PRESIGNED_UPLOAD_EXPIRES,
+        maxSize=request.size
+    )
+
+
+@router.post("/model/complete", response_model=FileUploadResponse)
+async def complete_model_upload(
+    request: UploadComplete,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Confirm a direct upload from /upload/model/presign. Checks the stored
+    object and queues geometry analysis on it; poll the returned jobId at
+    /geometry/jobs/{id}. The worker streams the model from S3 and records
+    its SHA-256 on the object, as uploads through /upload/model have.
+    """
+    key = request.key
+    if not owns_key(current_user["user_id"], key):
+        raise HTTPException(status_code=403, detail="Not authorized to complete this upload")
+    if not is_model_key(current_user["user_id"], key):
+        raise HTTPException(status_code=400, detail="Not a model upload key")
+
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+
+    try:
+        head = await storage.call(s3.head_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+
+    file_ext = os.path.splitext(key)[1]
+    if (
+        head["ContentLength"] > settings.UPLOAD_MAX_MODEL_BYTES
+        or head.get("ContentType") != MODEL_CONTENT_TYPES[file_ext]
+    ):
+        # Only possible if the object was written some other way
+        await storage.call(s3.delete_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+        raise HTTPException(status_code=400, detail="Uploaded file does not match the upload policy")
+
+    job_id = None
+    if file_ext in ANALYZABLE_EXTENSIONS and "sha256" not in head.get("Metadata", {}):
+        args = (key, file_ext, head["ContentLength"], head.get("ETag"), True)
+        result = await asyncio.to_thread(tasks.inspect_object_task.apply_async, args)
+        job_id = result.id
+
+    return FileUploadResponse(
+        url=presigned_url(s3, key),
+        key=key,
+        filename=request.filename or os.path.basename(key),
+        jobId=job_id
+    )
+
+
+def session_response(token: str, session: dict, parts: list) -> UploadSession:
+    return UploadSession(
+        id=token,
+        key=session["key"],
+        filename=session["filename"],
+        size=session["size"],
+        chunkSize=session["chunkSize"],
+        received=sum(part["Size"] for part in parts),
+        chunks=[
+            UploadSessionChunk(offset=(part["PartNumber"] - 1) * session["chunkSize"], size=part["Size"])
+            for part in parts
+        ],
+        missing=upload_sessions.missing_offsets(session, parts),
+        expiresAt=datetime.fromtimestamp(session["exp"], timezone.utc)
+    )
+
+
+def open_session(session_id: str, current_user: dict):
+    """The S3 client and the caller's session ``session_id``, or 404/503."""
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+    try:
+        return s3, upload_sessions.decode(session_id, current_user["user_id"])
+    except upload_sessions.SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/sessions", response_model=UploadSession, status_code=201)
+async def create_upload_session(
+    request: UploadSessionCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start a resumable model upload, for large files and unreliable
+    connections. PUT the file in chunks of ``chunkSize`` to
+    /upload/sessions/{id}?offset=..., in any order and in parallel;
+    resend any that fail. GET the session to see which offsets are still
+    missing (e.g. after reconnecting), then POST /upload/sessions/{id}/complete.
+    Sessions expire at ``expiresAt``.
+    """
+    allowed_extensions = list(MODEL_CONTENT_TYPES)
+    file_ext = os.path.splitext(request.filename)[1].lower()
+
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+    if not 0 < request.size <= settings.UPLOAD_MAX_MODEL_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model files must be between 1 byte and {settings.UPLOAD_MAX_MODEL_BYTES} bytes"
+        )
+
+    s3 = get_s3_client()
+    if not s3:
+        raise HTTPException(status_code=503, detail="File storage is not configured")
+
+    key = model_key(current_user["user_id"], file_ext)
+    try:
+        session = await storage.call(
+            upload_sessions.create, s3, settings.AWS_S3_BUCKET, current_user["user_id"], key,
+            request.filename, request.size, MODEL_CONTENT_TYPES[file_ext]
+        )
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+    return session_response(upload_sessions.encode(session), session, [])
+
+
+@router.get("/sessions/{session_id}", response_model=UploadSession)
+async def get_upload_session(
+    session_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Progress of a resumable upload: the chunks received and the offsets still missing."""
+    s3, session = open_session(session_id, current_user)
+    try:
+        parts = await storage.call(upload_sessions.received, s3, settings.AWS_S3_BUCKET, session)
+    except upload_sessions.SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+    return session_response(session_id, session, parts)
+
+
+@router.put("/sessions/{session_id}", response_model=UploadSessionChunk)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(...),
+    content_md5: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload the chunk starting at ``offset`` as the raw request body. It
+    must be ``chunkSize`` bytes, or the rest of the file for the last one.
+    With a Content-MD5 header, S3 rejects a chunk corrupted in transit.
+    """
+    s3, session = open_session(session_id, current_user)
+    try:
+        expected = upload_sessions.chunk_length(session, offset)
+    except upload_sessions.ChunkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        if len(body) > expected:
+            raise HTTPException(status_code=400, detail=f"The chunk at {offset} must be {expected} bytes")
+
+    try:
+        await storage.call(
+            upload_sessions.upload_chunk, s3, settings.AWS_S3_BUCKET, session, offset, bytes(body),
+            content_md5
+        )
+    except upload_sessions.ChunkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except s3.exceptions.NoSuchUpload:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("BadDigest", "InvalidDigest"):
+            raise HTTPException(status_code=400, detail="Chunk does not match its Content-MD5")
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+    return UploadSessionChunk(offset=offset, size=len(body))
+
+
+@router.post("/sessions/{session_id}/complete", response_model=FileUploadResponse)
+async def complete_upload_session(
+    session_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Finish a resumable upload once every chunk is in; 409 listing the
+    missing offsets otherwise. Geometry analysis is queued as for
+    /upload/model/complete.
+    """
+    s3, session = open_session(session_id, current_user)
+    key = session["key"]
+    try:
+        await storage.call(upload_sessions.complete, s3, settings.AWS_S3_BUCKET, session)
+        head = await storage.call(s3.head_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+    except upload_sessions.IncompleteUpload as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "missing": e.missing})
+    except upload_sessions.SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+
+    job_id = None
+    file_ext = os.path.splitext(key)[1]
+    if file_ext in ANALYZABLE_EXTENSIONS:
+        args = (key, file_ext, head["ContentLength"], head.get("ETag"), True)
+        result = await asyncio.to_thread(tasks.inspect_object_task.apply_async, args)
+        job_id = result.id
+
+    return FileUploadResponse(
+        url=presigned_url(s3, key),
+        key=key,
+        filename=session["filename"],
+        jobId=job_id
+    )
+
+
+@router.delete("/sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Abandon a resumable upload and discard its chunks."""
+    s3, session = open_session(session_id, current_user)
+    try:
+        await storage.call(upload_sessions.abort, s3, settings.AWS_S3_BUCKET, session)
+    except upload_sessions.SessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Storage error: {str(e)}")
+    return {"message": "Upload session aborted"}
 
 
 @router.post("/image", response_model=FileUploadResponse)
@@ -75,7 +526,10 @@ async def upload_image(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload an image file to S3"""
+    """
+    Upload an image file to S3, with resized WebP (and AVIF, where
+    supported) copies for responsive ``srcset``s stored alongside it.
+    """
     allowed_extensions = [".jpg", ".jpeg", ".png", ".gif", ".webp"]
     file_ext = os.path.splitext(file.filename)[1].lower()
 
@@ -97,34 +551,81 @@ async def upload_image(
             filename=file.filename
         )
 
+    # Spooled where geometry workers can read it to build the derivatives
+    tmp_path, _ = await asyncio.to_thread(
+        spool_to_disk, file.file, file_ext, None, settings.GEOMETRY_JOB_DIR
+    )
     try:
-        content = await file.read()
-        s3.put_object(
-            Bucket=settings.AWS_S3_BUCKET,
-            Key=key,
-            Body=content,
-            ContentType=file.content_type
-        )
+        try:
+            built = await geometry_pool.run(images.build_derivatives, tmp_path)
+        except images.InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except GeometryPoolFull:
+            raise HTTPException(status_code=503, detail="Image processing is busy, try again shortly")
+        except GeometryJobTimeout:
+            raise HTTPException(status_code=504, detail="Image processing timed out")
 
-        url = f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+        # Derivatives live under the original's key without its extension
+        prefix = os.path.splitext(key)[0]
+        derivatives = built["derivatives"]
+        with open(tmp_path, "rb") as body:
+            await asyncio.gather(
+                storage.call(upload_stream, s3, body, settings.AWS_S3_BUCKET, key, file.content_type),
+                *(
+                    storage.call(
+                        upload_stream, s3, io.BytesIO(derivative["data"]), settings.AWS_S3_BUCKET,
+                        f"{prefix}/{derivative['name']}", derivative["contentType"]
+                    )
+                    for derivative in derivatives
+                )
+            )
 
+        urls = {derivative["name"]: object_url(f"{prefix}/{derivative['name']}") for derivative in derivatives}
         return FileUploadResponse(
-            url=url,
+            url=object_url(key),
             key=key,
-            filename=file.filename
+            filename=file.filename,
+            derivatives=[
+                ImageDerivative(
+                    url=urls[derivative["name"]],
+                    key=f"{prefix}/{derivative['name']}",
+                    width=derivative["width"],
+                    height=derivative["height"],
+                    format=derivative["format"],
+                    bytes=len(derivative["data"])
+                )
+                for derivative in derivatives
+            ],
+            srcset=images.srcset(derivatives, urls)
         )
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        os.unlink(tmp_path)
+
+
+def _delete_derivatives(s3, key: str):
+    """Delete the derivatives /upload/image stored next to ``key``."""
+    prefix = os.path.splitext(key)[0] + "/"
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=settings.AWS_S3_BUCKET, Prefix=prefix):
+        objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+        if objects:
+            s3.delete_objects(Bucket=settings.AWS_S3_BUCKET, Delete={"Objects": objects, "Quiet": True})
 
 
 @router.delete("/{key:path}")
 async def delete_file(
     key: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """Delete a file from S3"""
+    """
+    Delete a file from S3. Deleting a model upload removes your reference
+    to it; the stored file goes with its last reference.
+    """
     # Verify user owns the file
-    if f"/{current_user['user_id']}/" not in key:
+    if not owns_key(current_user["user_id"], key):
         raise HTTPException(status_code=403, detail="Not authorized to delete this file")
 
     s3 = get_s3_client()
@@ -132,7 +633,13 @@ async def delete_file(
         return {"message": "File deleted (mock)"}
 
     try:
-        s3.delete_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
+        if key.startswith("models/") and await storage.call(
+            model_store.release, db, s3, settings.AWS_S3_BUCKET, current_user["user_id"], key
+        ):
+            return {"message": "File deleted successfully"}
+        await storage.call(s3.delete_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+        if key.startswith("images/"):
+            await storage.call(_delete_derivatives, s3, key)
         return {"message": "File deleted successfully"}
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
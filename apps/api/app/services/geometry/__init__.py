@@ -0,0 +1,4 @@
+"""
+Geometry services: mesh ingest, analysis and related processing used by the
+/geometry router.
+"""
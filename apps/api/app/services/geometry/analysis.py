@@ -0,0 +1,477 @@
+"""
+Mesh analysis jobs.
+
+Functions here run inside geometry worker processes, so they take a file
+path and return plain picklable data rather than touching the request.
+
+Everything goes through ``inspect_path``, which loads a model once and
+produces the analysis metrics, the topology verdict and, when asked, the
+printability checks from shared intermediates (face areas, edge adjacency,
+the flattened scene mesh). The checks are slow and only /validate and
+/inspect want them, so they are returned separately and combined with the
+rest by ``with_checks``.
+"""
+from dataclasses import asdict
+import hashlib
+import io
+import itertools
+import json
+import time
+
+import numpy as np
+
+from ...core.config import settings
+from . import compact, stl, slicing, profiles, printability, fingerprint
+from .timing import stage
+
+# Bump whenever the output of these functions changes; cached results are
+# keyed on it so old entries stop matching.
+ANALYSIS_VERSION = 9
+
+# Triangles per chunk when slicing a trimesh-loaded mesh
+SLICE_CHUNK = 1 << 18
+
+
+class EmptyModelError(ValueError):
+    """Raised when a model file loads but has no geometry."""
+
+
+def load_mesh(source, file_type: str = None):
+    """
+    Load a model with trimesh, flattening scenes into a single mesh.
+    ``source`` is a path, or a file object when ``file_type`` is given.
+    """
+    import trimesh
+
+    with stage("load"):
+        mesh = trimesh.load(source, file_type=file_type)
+    if isinstance(mesh, trimesh.Scene):
+        if len(mesh.geometry) == 0:
+            raise EmptyModelError("Empty model")
+        with stage("concatenate"):
+            mesh = trimesh.util.concatenate(mesh.geometry.values())
+    return mesh
+
+
+def load_triangles(path: str, file_ext: str) -> np.ndarray:
+    """
+    All triangles of a model as an in-memory float32 (n, 3, 3) array, for
+    jobs that need random access to the whole mesh.
+    """
+    if file_ext == compact.COMPACT_EXT:
+        with stage("parse"), open(path, "rb") as f:
+            return compact.load_triangles(f.read())
+    if file_ext == ".stl":
+        try:
+            with stage("parse"), open(path, "rb") as f, stl.map_upload(f) as buf:
+                return np.array(stl.load_triangles(buf), dtype=np.float32)
+        except stl.STLFormatError:
+            pass
+    return np.asarray(load_mesh(path).triangles, dtype=np.float32)
+
+
+def inspect_path(path: str, file_ext: str, progress=None, checks: bool = False) -> dict:
+    """
+    Load a model once and return ``{"analysis": ..., "validation": ...,
+    "fingerprint": ...}``.
+
+    ``analysis`` holds volume, area, bounds, triangle count, watertightness
+    and the sliced print estimate; ``validation`` holds the verdict on the
+    mesh topology; ``fingerprint`` is the encoded shape signature. With
+    ``checks``, the printability checks also run and are returned under
+    ``"checks"`` (see ``with_checks``). ``progress``, if given, is called
+    with a completed fraction in [0, 1].
+    """
+    if file_ext == compact.COMPACT_EXT:
+        with open(path, "rb") as f:
+            return inspect_compact(f.read(), progress, checks)
+    if file_ext == ".stl":
+        try:
+            with open(path, "rb") as f, stl.map_upload(f) as buf:
+                return _inspect_stl_buffer(buf, progress, checks)
+        except stl.STLFormatError:
+            # Not something the native parser handles; let trimesh try
+            pass
+
+    mesh = load_mesh(path)
+    if progress is not None:
+        progress(0.5)
+    return _inspect_mesh(mesh, checks)
+
+
+def inspect_stream(chunks, size: int, file_ext: str, progress=None) -> dict:
+    """
+    ``inspect_path`` for a model arriving as byte chunks of a ``size`` byte
+    file, such as ranged reads from object storage, without a temp file.
+    Binary STL is parsed chunk by chunk as it arrives; anything else is
+    gathered in memory and parsed from there.
+    """
+    chunks = iter(chunks)
+    head = next(chunks, b"")
+    chunks = itertools.chain([head], chunks)
+
+    if file_ext == ".stl":
+        count = stl.binary_count(head, size)
+        if count is not None:
+            try:
+                # Includes waiting for the download, which overlaps parsing
+                with stage("parse"):
+                    stats, triangles = stl.read_binary_stream(
+                        chunks, count, progress and (lambda fraction: progress(0.6 * fraction))
+                    )
+            except stl.EmptyMeshError:
+                raise EmptyModelError("Empty model")
+            return _inspect_stl(stats, triangles, progress)
+
+    data = bytearray()
+    with stage("download"):
+        for chunk in chunks:
+            data += chunk
+    if file_ext == ".stl":
+        try:
+            return _inspect_stl_buffer(data, progress)
+        except stl.STLFormatError:
+            pass
+
+    mesh = load_mesh(io.BytesIO(data), file_type=file_ext.lstrip("."))
+    del data
+    if progress is not None:
+        progress(0.5)
+    return _inspect_mesh(mesh)
+
+
+def inspect_compact(data, progress=None, checks: bool = False) -> dict:
+    """``inspect_path`` for a model in the compact stored form (see ``compact``)."""
+    try:
+        with stage("parse"):
+            triangles = compact.load_triangles(data)
+            stats = stl.analyze_triangles(triangles)
+    except stl.EmptyMeshError:
+        raise EmptyModelError("Empty model")
+    if progress is not None:
+        progress(0.6)
+    return _inspect_stl(stats, triangles, progress, checks)
+
+
+def _inspect_stl_buffer(buf, progress=None, checks: bool = False) -> dict:
+    try:
+        with stage("parse"):
+            stats = stl.analyze_stl_buffer(
+                buf, progress and (lambda fraction: progress(0.6 * fraction))
+            )
+    except stl.EmptyMeshError:
+        raise EmptyModelError("Empty model")
+    # Further passes over the buffer; for binary STL nothing is copied
+    triangles = stl.load_triangles(buf)
+    result = _inspect_stl(stats, triangles, progress, checks)
+    # A view over a memory map must be gone before the map is closed
+    del triangles
+    return result
+
+
+def _inspect_stl(stats, triangles, progress=None, checks: bool = False) -> dict:
+    with stage("estimate"):
+        estimate = estimate_print(_chunks(triangles, SLICE_CHUNK), stats.bounds)
+    if progress is not None:
+        progress(0.7)
+    if checks:
+        with stage("checks"):
+            checks = check_printability(triangles, stats.bounds)
+    with stage("fingerprint"):
+        signature = fingerprint.compute_signature(triangles)
+    return _inspection(
+        volume=stats.volume,
+        area=stats.area,
+        bounds=stats.bounds.tolist(),
+        triangle_count=stats.triangle_count,
+        is_watertight=stats.is_watertight,
+        is_winding_consistent=stats.is_winding_consistent,
+        degenerate_count=stats.degenerate_count,
+        estimate=estimate,
+        checks=checks,
+        signature=signature
+    )
+
+
+def _inspect_mesh(mesh, checks: bool = False) -> dict:
+    import trimesh
+
+    with stage("metrics"):
+        area_faces = mesh.area_faces
+        # One edge grouping answers both topology questions
+        is_watertight, is_winding_consistent = trimesh.graph.is_watertight(
+            edges=mesh.edges, edges_sorted=mesh.edges_sorted
+        )
+        volume = float(mesh.volume)
+        triangles = mesh.triangles
+    with stage("estimate"):
+        estimate = estimate_print(_chunks(triangles, SLICE_CHUNK), mesh.bounds)
+    if checks:
+        with stage("checks"):
+            checks = check_printability(triangles, mesh.bounds)
+    with stage("fingerprint"):
+        signature = fingerprint.compute_signature(triangles)
+    return _inspection(
+        volume=volume,
+        area=float(area_faces.sum()),
+        bounds=mesh.bounds.tolist(),
+        triangle_count=len(mesh.faces),
+        is_watertight=bool(is_watertight),
+        is_winding_consistent=bool(is_winding_consistent),
+        degenerate_count=int((area_faces < stl.DEGENERATE_AREA).sum()),
+        estimate=estimate,
+        checks=checks,
+        signature=signature
+    )
+
+
+def estimate_print(triangle_chunks, bounds) -> dict:
+    """
+    Slice once and evaluate the configured material × layer height ×
+    infill matrix. The default profile's numbers are read from the matrix,
+    whose axes always include the defaults.
+    """
+    materials = _with_default(settings.ESTIMATE_MATERIALS, settings.MATERIAL_PROFILE)
+    heights = _with_default(settings.ESTIMATE_LAYER_HEIGHTS, settings.LAYER_HEIGHT)
+    infill = _with_default(settings.ESTIMATE_INFILL_DENSITIES, settings.INFILL_DENSITY)
+
+    z_min, z_max = float(bounds[0][2]), float(bounds[1][2])
+    slices = slicing.slice_layers(
+        triangle_chunks, z_min, z_max, slicing.base_layer_height(heights)
+    )
+    matrix = slicing.estimate_matrix(
+        slices,
+        z_max,
+        profiles.get_printer(settings.PRINTER_PROFILE),
+        [profiles.get_material(name) for name in materials],
+        heights,
+        infill
+    )
+
+    default = (
+        materials.index(settings.MATERIAL_PROFILE),
+        heights.index(settings.LAYER_HEIGHT),
+        infill.index(settings.INFILL_DENSITY)
+    )
+    return {
+        "print_time": float(matrix["print_time"][default]),
+        "material": float(matrix["material"][default]),
+        "matrix": {
+            "printer": settings.PRINTER_PROFILE,
+            "materials": materials,
+            "layerHeights": heights,
+            "infillDensities": infill,
+            "printTime": np.round(matrix["print_time"], 3).tolist(),
+            "material": np.round(matrix["material"], 2).tolist()
+        }
+    }
+
+
+def check_printability(triangles, bounds) -> dict:
+    """
+    Overhang and wall thickness checks, together limited to
+    ``PRINTABILITY_TIME_BUDGET`` seconds.
+    """
+    deadline = time.monotonic() + settings.PRINTABILITY_TIME_BUDGET
+    min_thickness = settings.MIN_WALL_THICKNESS
+    if min_thickness is None:
+        min_thickness = profiles.get_printer(settings.PRINTER_PROFILE).line_width
+    return {
+        "overhangs": printability.check_overhangs(
+            triangles, float(bounds[0][2]), settings.OVERHANG_ANGLE, deadline
+        ),
+        "thinWalls": printability.check_thin_walls(triangles, min_thickness, deadline)
+    }
+
+
+def checks_complete(checks: dict) -> bool:
+    """Whether every check covered the whole mesh, so its verdict can be cached."""
+    return all(check["complete"] for check in checks.values())
+
+
+def printability_path(path: str, file_ext: str) -> dict:
+    """Only the printability checks of a model whose inspection is cached."""
+    triangles = load_triangles(path, file_ext)
+    if len(triangles) == 0:
+        raise EmptyModelError("Empty model")
+    flat = triangles.reshape(-1, 3)
+    bounds = np.vstack([flat.min(axis=0), flat.max(axis=0)])
+    with stage("checks"):
+        return check_printability(triangles, bounds)
+
+
+def settings_digest() -> str:
+    """
+    Short hash of the settings and resolved profiles analysis results depend
+    on: the estimate axes and defaults, the printer and material profiles
+    (including PRINT_PROFILES_FILE overrides) and the printability limits.
+    Cache keys include it so a configuration change stops old entries from
+    matching.
+    """
+    materials = _with_default(settings.ESTIMATE_MATERIALS, settings.MATERIAL_PROFILE)
+    config = {
+        "printer": asdict(profiles.get_printer(settings.PRINTER_PROFILE)),
+        "materials": [asdict(profiles.get_material(name)) for name in materials],
+        "layerHeights": _with_default(settings.ESTIMATE_LAYER_HEIGHTS, settings.LAYER_HEIGHT),
+        "infillDensities": _with_default(settings.ESTIMATE_INFILL_DENSITIES, settings.INFILL_DENSITY),
+        "defaults": [settings.MATERIAL_PROFILE, settings.LAYER_HEIGHT, settings.INFILL_DENSITY],
+        "printability": [
+            settings.OVERHANG_ANGLE, settings.MIN_WALL_THICKNESS, settings.PRINTABILITY_TIME_BUDGET
+        ]
+    }
+    encoded = json.dumps(config, sort_keys=True, default=list).encode()
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def _with_default(values, default) -> list:
+    values = list(values)
+    return values if default in values else values + [default]
+
+
+def _chunks(array, size: int):
+    for start in range(0, len(array), size):
+        yield array[start:start + size]
+
+
+def fingerprint_path(path: str, file_ext: str) -> str:
+    """Encoded shape signature of a model, without the rest of the analysis."""
+    if file_ext == ".stl":
+        try:
+            with open(path, "rb") as f, stl.map_upload(f) as buf:
+                triangles = stl.load_triangles(buf)
+                if len(triangles) == 0:
+                    raise EmptyModelError("Empty model")
+                signature = fingerprint.compute_signature(triangles)
+                del triangles
+                return fingerprint.encode(signature)
+        except stl.STLFormatError:
+            pass
+    return fingerprint.encode(fingerprint.compute_signature(load_mesh(path).triangles))
+
+
+def reuse_analysis(path: str, file_ext: str, similar: dict) -> dict:
+    """
+    ``inspect_path``'s analysis of a model, given the cached analysis of a
+    near duplicate (which matches up to re-triangulation, translation and
+    rotation). Volume, area and watertightness do not change with those
+    and are taken from ``similar``; bounds, triangle count and the print
+    estimates depend on the model's own placement and are computed here.
+    Skips the edge topology pass, the costly part of a full inspection.
+    """
+    triangles = load_triangles(path, file_ext)
+    if len(triangles) == 0:
+        raise EmptyModelError("Empty model")
+    flat = triangles.reshape(-1, 3)
+    bounds = np.vstack([flat.min(axis=0), flat.max(axis=0)]).astype(np.float64)
+    with stage("estimate"):
+        estimate = estimate_print(_chunks(triangles, SLICE_CHUNK), bounds)
+    return {
+        "volume": similar["volume"],
+        "area": similar["area"],
+        "bounds": bounds.tolist(),
+        "triangle_count": len(triangles),
+        "is_watertight": similar["is_watertight"],
+        "print_time": estimate["print_time"],
+        "material": estimate["material"],
+        "estimates": estimate["matrix"],
+    }
+
+
+def analyze_path(path: str, file_ext: str) -> dict:
+    """Volume, area, bounds, triangle count and watertightness of a model."""
+    return inspect_path(path, file_ext)["analysis"]
+
+
+def validate_path(path: str, file_ext: str) -> dict:
+    """Topology and printability verdict for a model file."""
+    inspection = inspect_path(path, file_ext, checks=True)
+    return with_checks(inspection, inspection.pop("checks"))["validation"]
+
+
+def with_checks(inspection: dict, checks: dict) -> dict:
+    """
+    ``inspection`` (without checks) with the printability ``checks`` added
+    to its validation: thin walls are issues, overhangs and checks that ran
+    out of time are warnings.
+    """
+    validation = inspection["validation"]
+    issues = list(validation["issues"])
+    warnings = list(validation["warnings"])
+
+    thin = checks["thinWalls"]
+    if thin["faceCount"]:
+        issues.append(
+            f"{thin['faceCount']} faces are in walls thinner than {thin['minThickness']:g}mm"
+            f" (thinnest {thin['thinnest']:.2f}mm)"
+        )
+
+    overhangs = checks["overhangs"]
+    if overhangs["faceCount"]:
+        warnings.append(
+            f"{overhangs['faceCount']} faces overhang more than {overhangs['angle']:g}°"
+            f" and need support ({overhangs['area']:.0f}mm²)"
+        )
+
+    for name, check in checks.items():
+        if not check["complete"]:
+            warnings.append(
+                f"{name} check stopped after {check['checkedFaces']} of"
+                f" {validation['triangleCount']} faces ({check['checkedFraction']:.0%});"
+                " its results are a sample"
+            )
+
+    return {
+        **inspection,
+        "validation": {
+            **validation,
+            "valid": len(issues) == 0,
+            "issues": issues,
+            "warnings": warnings,
+            "checks": checks
+        }
+    }
+
+
+def _inspection(
+    volume, area, bounds, triangle_count, is_watertight,
+    is_winding_consistent, degenerate_count, estimate, checks, signature
+) -> dict:
+    issues = []
+    warnings = []
+
+    if not is_watertight:
+        issues.append("Model is not watertight (has holes)")
+
+    if not is_winding_consistent:
+        issues.append("Inconsistent face winding")
+
+    if triangle_count < 4:
+        issues.append("Too few faces for a valid 3D model")
+
+    if degenerate_count:
+        issues.append(f"Contains {degenerate_count} degenerate faces")
+
+    result = {
+        "analysis": {
+            "volume": volume,
+            "area": area,
+            "bounds": bounds,
+            "triangle_count": triangle_count,
+            "is_watertight": is_watertight,
+            "print_time": estimate["print_time"],
+            "material": estimate["material"],
+            "estimates": estimate["matrix"],
+        },
+        "validation": {
+            "valid": len(issues) == 0,
+            "issues": issues,
+            "warnings": warnings,
+            "triangleCount": triangle_count,
+            "isWatertight": is_watertight,
+            "checks": None
+        },
+        "fingerprint": fingerprint.encode(signature)
+    }
+    if checks:
+        result["checks"] = checks
+    return result
@@ -0,0 +1,143 @@
+"""
+Batch analysis of many parts.
+
+Parts come either from several uploaded files or from the members of one
+ZIP archive. They are spooled to disk one at a time, analyzed concurrently
+in the geometry pool, and reported as NDJSON lines in completion order,
+followed by a single aggregate line.
+"""
+from dataclasses import dataclass
+from typing import Optional
+import asyncio
+import json
+import os
+import zipfile
+
+from .spool import spool_to_disk, SpoolLimitExceeded
+
+
+@dataclass
+class BatchPart:
+    index: int
+    filename: str
+    file_ext: str
+    path: Optional[str] = None
+    digest: Optional[str] = None
+    error: Optional[str] = None
+
+
+def iter_archive_parts(archive_path: str, allowed_extensions, max_parts: int, max_bytes: int):
+    """
+    Yield a spooled BatchPart for each model in a ZIP archive.
+
+    Directories, hidden files and macOS resource forks are skipped. The
+    uncompressed total is capped at ``max_bytes`` using the bytes actually
+    read, not the sizes the archive claims.
+    """
+    remaining = max_bytes
+    index = 0
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+
+            if index >= max_parts:
+                raise SpoolLimitExceeded(f"Archive contains more than {max_parts} parts")
+
+            file_ext = os.path.splitext(base)[1].lower()
+            part = BatchPart(index=index, filename=name, file_ext=file_ext)
+            index += 1
+
+            if file_ext not in allowed_extensions:
+                part.error = "Unsupported file type"
+                yield part
+                continue
+
+            with archive.open(info) as member:
+                part.path, part.digest = spool_to_disk(member, file_ext, max_bytes=remaining)
+            remaining -= os.path.getsize(part.path)
+            yield part
+
+
+async def stream_batch(parts, analyze, concurrency: int):
+    """
+    Analyze ``parts`` (a sync iterator of BatchPart, advanced in a thread)
+    with at most ``concurrency`` parts spooled or running at once.
+
+    ``analyze(part)`` must return a ModelAnalysis-shaped dict. Yields NDJSON
+    lines as bytes. Spooled files are removed once their part is reported.
+    """
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(part: BatchPart):
+        try:
+            if part.error is None:
+                try:
+                    line = {"index": part.index, "filename": part.filename, "analysis": await analyze(part)}
+                except Exception as e:
+                    line = {"index": part.index, "filename": part.filename, "error": str(e)}
+            else:
+                line = {"index": part.index, "filename": part.filename, "error": part.error}
+            await results.put(line)
+        finally:
+            if part.path:
+                os.unlink(part.path)
+            slots.release()
+
+    async def produce():
+        tasks = []
+        try:
+            while True:
+                await slots.acquire()
+                part = await asyncio.to_thread(next, parts, None)
+                if part is None:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(run(part)))
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        except Exception as e:
+            await results.put({"error": str(e)})
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    totals = {
+        "parts": 0,
+        "failed": 0,
+        "volume": 0.0,
+        "triangleCount": 0,
+        "estimatedPrintTime": 0.0,
+        "estimatedMaterial": 0.0
+    }
+    try:
+        while (line := await results.get()) is not None:
+            if "index" in line:
+                totals["parts"] += 1
+                if "analysis" in line:
+                    part = line["analysis"]
+                    totals["volume"] += part["volume"]
+                    totals["triangleCount"] += part["triangleCount"]
+                    totals["estimatedPrintTime"] += part["estimatedPrintTime"] or 0.0
+                    totals["estimatedMaterial"] += part["estimatedMaterial"] or 0.0
+                else:
+                    totals["failed"] += 1
+            yield (json.dumps(line) + "\n").encode()
+
+        yield (json.dumps({"total": totals}) + "\n").encode()
+    finally:
+        # Client went away or we finished: stop spooling further parts
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        try:
+            parts.close()
+        except (AttributeError, ValueError):
+            # Not a generator, or still being advanced in a worker thread;
+            # it is closed when collected
+            pass
@@ -0,0 +1,109 @@
+"""
+Content-addressed cache for geometry results.
+
+Results are keyed by the SHA-256 of the uploaded bytes plus the analysis
+version and a digest of the estimation settings, so re-uploading the same
+file skips parsing entirely while a change to the analysis code, the print
+profiles or the estimate axes invalidates every old entry. Lookups go to an
+in-process LRU first and then to Redis; Redis being down only costs the
+second tier.
+"""
+from collections import OrderedDict
+import json
+import threading
+import time
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from ...core.config import settings
+from .analysis import ANALYSIS_VERSION, settings_digest
+
+# After a Redis error, skip the Redis tier for this long (seconds)
+REDIS_RETRY_DELAY = 30
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int, redis_url: str = None, ttl: int = 0):
+        self.max_entries = max_entries
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+    @staticmethod
+    def key(kind: str, digest: str, file_ext: str) -> str:
+        version = f"v{ANALYSIS_VERSION}-{settings_digest()}"
+        return f"geometry:{kind}:{version}:{file_ext.lstrip('.')}:{digest}"
+
+    async def get(self, key: str):
+        """Return ``(value, tier)``; ``(None, None)`` on a miss."""
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                return self._local[key], "memory"
+
+        client = self.client()
+        if client is None:
+            return None, None
+        try:
+            raw = await client.get(key)
+        except RedisError:
+            self.redis_failed()
+            return None, None
+        if raw is None:
+            return None, None
+
+        value = json.loads(raw)
+        self._remember(key, value)
+        return value, "redis"
+
+    async def set(self, key: str, value):
+        self._remember(key, value)
+
+        client = self.client()
+        if client is None:
+            return
+        try:
+            await client.set(key, json.dumps(value), ex=self.ttl or None)
+        except RedisError:
+            self.redis_failed()
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def client(self):
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                self.redis_url,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5
+            )
+        return self._redis
+
+    def redis_failed(self):
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_DELAY
+
+
+analysis_cache = AnalysisCache(
+    max_entries=settings.ANALYSIS_CACHE_SIZE,
+    redis_url=settings.REDIS_URL if settings.ANALYSIS_CACHE_REDIS else None,
+    ttl=settings.ANALYSIS_CACHE_TTL
+)
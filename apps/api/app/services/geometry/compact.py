@@ -0,0 +1,164 @@
+"""
+Compact stored form of models.
+
+Uploads arrive as whatever the customer exported: ASCII STL, OBJ with
+comments and normals, or binary STL that repeats every vertex about six
+times. On ingest each model is also stored in one canonical form. It has
+deduplicated vertices and indexed faces, each block compressed with zlib.
+
+- Vertices are welded by exact position (the same 64-bit vertex hash the
+  STL topology check uses). They are numbered in order of first use, so
+  consecutive faces have nearby indices.
+- Face indices are stored as deltas; vertex coordinates axis by axis. Both
+  are byte-shuffled first, so zlib sees long runs of similar high bytes.
+- With ``MESH_QUANTIZATION_STEP``, coordinates are snapped to that grid
+  (mm) and stored as uint16 or uint32 offsets. Each moves by at most half
+  a step, and near-coincident vertices merge. Such copies are stored
+  under a key naming the step, and only serve previews. Without it the
+  float32 coordinates are kept exactly, so analysis of the compact form
+  matches the original's.
+
+Loading is two ``zlib.decompress`` calls and a few array operations, far
+faster than parsing text formats.
+
+Layout: header (``_HEADER``), then the vertex block and the face block,
+each an unsigned 64-bit length followed by zlib data.
+"""
+import struct
+import zlib
+
+import numpy as np
+
+from ..storage import content_name
+from . import stl
+
+COMPACT_EXT = ".akmesh"
+MAGIC = b"AKMESH"
+VERSION = 1
+
+# magic, version, vertex dtype code, vertex count, face count, origin xyz, step
+_HEADER = struct.Struct("<6sHBxII3dd")
+_BLOCK_LENGTH = struct.Struct("<Q")
+_VERTEX_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<u2"), 2: np.dtype("<u4")}
+
+
+class CompactFormatError(ValueError):
+    """Raised for data that is not a compact mesh this version can read."""
+
+
+def compact_key(digest: str, step: float = None) -> str:
+    """
+    Where the compact form of the model with SHA-256 ``digest``, quantized
+    to ``step`` mm if given, is stored. Every form of a model starts with
+    ``compact_prefix(digest)``.
+    """
+    if step:
+        return f"{compact_prefix(digest)}.q{step:g}{COMPACT_EXT}"
+    return f"{compact_prefix(digest)}{COMPACT_EXT}"
+
+
+def compact_prefix(digest: str) -> str:
+    # Keyed like the model's blob, not by the digest previews publish
+    return f"compact/{content_name(digest)}"
+
+
+def index_triangles(triangles: np.ndarray, step: float = None):
+    """
+    Weld an (n, 3, 3) triangle array into ``(vertices, faces, origin)``.
+    With ``step``, ``vertices`` are integer grid coordinates relative to
+    ``origin``; otherwise float32 positions.
+    """
+    flat = np.asarray(triangles, dtype=np.float32).reshape(-1, 3)
+    origin = flat.min(axis=0).astype(np.float64) if len(flat) else np.zeros(3)
+    if step:
+        grid = np.rint((flat - origin) / step).astype(np.int64)
+        positions = (origin + grid * step).astype(np.float32)
+    else:
+        grid = None
+        positions = flat
+
+    keys = stl._vertex_keys(positions.reshape(-1, 1, 3)).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    # Renumber by first use
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    faces = rank[inverse.ravel()].reshape(-1, 3).astype(np.uint32)
+    source = grid if grid is not None else flat
+    vertices = source[first[order]]
+    return vertices, faces, origin
+
+
+def encode(triangles: np.ndarray, step: float = None, level: int = 6) -> bytes:
+    """
+    Compact form of a triangle array (see the module docstring), quantized
+    to ``step`` mm if given, compressed at zlib ``level``.
+    """
+    vertices, faces, origin = index_triangles(triangles, step)
+
+    if step:
+        span = int(vertices.max(initial=0))
+        code = 1 if span < 1 << 16 else 2
+    else:
+        code = 0
+    vertex_data = _shuffle(np.ascontiguousarray(vertices.T, dtype=_VERTEX_DTYPES[code]))
+    deltas = np.diff(faces.ravel().astype(np.int64), prepend=0).astype("<i4")
+    face_data = _shuffle(deltas)
+
+    out = bytearray(_HEADER.pack(
+        MAGIC, VERSION, code, len(vertices), len(faces), *origin, float(step or 0.0)
+    ))
+    for block in (vertex_data, face_data):
+        compressed = zlib.compress(block, level)
+        out += _BLOCK_LENGTH.pack(len(compressed))
+        out += compressed
+    return bytes(out)
+
+
+def decode(data) -> tuple:
+    """``(vertices, faces)`` of a compact mesh: float32 (v, 3) and uint32 (f, 3)."""
+    data = memoryview(data)
+    if len(data) < _HEADER.size:
+        raise CompactFormatError("Truncated compact mesh")
+    magic, version, code, vertex_count, face_count, ox, oy, oz, step = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or code not in _VERTEX_DTYPES:
+        raise CompactFormatError("Not a compact mesh this version can read")
+
+    offset = _HEADER.size
+    blocks = []
+    for _ in range(2):
+        (length,) = _BLOCK_LENGTH.unpack_from(data, offset)
+        offset += _BLOCK_LENGTH.size
+        try:
+            blocks.append(zlib.decompress(data[offset:offset + length]))
+        except zlib.error as e:
+            raise CompactFormatError(f"Corrupt compact mesh: {e}")
+        offset += length
+
+    dtype = _VERTEX_DTYPES[code]
+    axes = _unshuffle(blocks[0], dtype, 3 * vertex_count).reshape(3, vertex_count)
+    if code:
+        vertices = (np.array([ox, oy, oz]) + axes.T * step).astype(np.float32)
+    else:
+        vertices = np.ascontiguousarray(axes.T)
+    deltas = _unshuffle(blocks[1], np.dtype("<i4"), 3 * face_count)
+    faces = np.cumsum(deltas, dtype=np.int64).astype(np.uint32).reshape(face_count, 3)
+    return vertices, faces
+
+
+def load_triangles(data) -> np.ndarray:
+    """All triangles of a compact mesh as a float32 (n, 3, 3) array."""
+    vertices, faces = decode(data)
+    return vertices[faces]
+
+
+def _shuffle(array: np.ndarray) -> bytes:
+    """Bytes of ``array`` grouped by byte position within each element."""
+    return array.view(np.uint8).reshape(-1, array.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype, count: int) -> np.ndarray:
+    if len(data) != count * dtype.itemsize:
+        raise CompactFormatError("Compact mesh block has the wrong size")
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(raw.T).view(dtype).ravel()
@@ -0,0 +1,128 @@
+"""
+Shape fingerprints for finding the same part under a different file.
+
+Byte hashes miss re-exports: the same part saved by another tool has a
+different triangulation and different bytes. A fingerprint instead
+describes the surface itself, so it survives re-triangulation, translation
+and rotation:
+
+* enclosed volume and surface area,
+* the three principal radii of gyration of the surface,
+* a D2 shape distribution: the distribution of distances between random
+  surface points, in units of the RMS radius, stored as a 32-bin CDF.
+
+A signature packs into 52 bytes. Signatures are computed in geometry
+workers; the lookup index lives in ``similarity``.
+"""
+import base64
+
+import numpy as np
+
+# Bump when signatures change; the Redis index is namespaced on it
+FINGERPRINT_VERSION = 1
+
+# Triangles per chunk in the moment pass
+FINGERPRINT_CHUNK = 1 << 18
+# Random surface point pairs for the D2 distribution
+D2_PAIRS = 1 << 14
+D2_BINS = 32
+# Distances beyond this many RMS radii land in the last bin
+D2_RANGE = 4.0
+# Keeps logs finite for open meshes with zero volume
+LOG_FLOOR = 1e-6
+
+# log cbrt(volume), log sqrt(area), log radii of gyration (largest first)
+SCALAR_COUNT = 5
+AREA_SCALAR = 1
+
+SIGNATURE = np.dtype([("scalars", "<f4", (SCALAR_COUNT,)), ("d2", "u1", (D2_BINS,))])
+
+
+def compute_signature(triangles, seed: int = 0) -> np.ndarray:
+    """
+    Signature of a triangle array of shape (n, 3, 3). The array may be a
+    zero-copy view over a memory-mapped STL; it is read in chunks.
+    """
+    n = len(triangles)
+    areas = np.empty(n)
+    volume = 0.0
+    first = np.zeros(3)
+    second = np.zeros((3, 3))
+    # Volume is only translation-invariant for closed meshes; measuring
+    # from a point on the surface keeps open ones stable too
+    origin = np.asarray(triangles[0][0], dtype=np.float64) if n else np.zeros(3)
+
+    for start in range(0, n, FINGERPRINT_CHUNK):
+        tri = np.asarray(triangles[start:start + FINGERPRINT_CHUNK], dtype=np.float64)
+        cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+        area = 0.5 * np.sqrt((cross * cross).sum(axis=1))
+        areas[start:start + len(tri)] = area
+        rel = tri - origin
+        volume += float((rel[:, 0] * np.cross(rel[:, 1], rel[:, 2])).sum()) / 6.0
+
+        # Exact surface integrals of x and x xᵀ over each triangle
+        s = tri.sum(axis=1)
+        first += (area[:, None] * s).sum(axis=0) / 3.0
+        weighted = tri * area[:, None, None]
+        second += (
+            weighted.reshape(-1, 3).T @ tri.reshape(-1, 3)
+            + (s * area[:, None]).T @ s
+        ) / 12.0
+
+    total_area = float(areas.sum())
+    signature = np.zeros((), dtype=SIGNATURE)
+    if total_area <= 0:
+        return signature
+
+    centroid = first / total_area
+    covariance = second / total_area - np.outer(centroid, centroid)
+    eigenvalues = np.clip(np.linalg.eigvalsh(covariance)[::-1], 0.0, None)
+    radii = np.sqrt(eigenvalues)
+    rms = float(np.sqrt(eigenvalues.sum()))
+
+    signature["scalars"] = np.log(np.maximum(
+        [abs(volume) ** (1 / 3), np.sqrt(total_area), *radii], LOG_FLOOR
+    ))
+    signature["d2"] = _d2_cdf(triangles, areas, rms, np.random.default_rng(seed))
+    return signature
+
+
+def _d2_cdf(triangles, areas: np.ndarray, rms: float, rng) -> np.ndarray:
+    cumulative = np.cumsum(areas)
+    picks = np.searchsorted(cumulative, rng.random(2 * D2_PAIRS) * cumulative[-1], side="right")
+    tri = np.asarray(triangles[np.minimum(picks, len(areas) - 1)], dtype=np.float64)
+
+    # Uniform points on each picked triangle
+    u, v = rng.random((2, len(tri)))
+    flip = u + v > 1
+    u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+    points = tri[:, 0] + u[:, None] * (tri[:, 1] - tri[:, 0]) + v[:, None] * (tri[:, 2] - tri[:, 0])
+
+    distance = np.linalg.norm(points[:D2_PAIRS] - points[D2_PAIRS:], axis=1) / max(rms, LOG_FLOOR)
+    counts = np.bincount(
+        np.minimum((distance / D2_RANGE * D2_BINS).astype(np.int64), D2_BINS - 1),
+        minlength=D2_BINS
+    )
+    return np.round(np.cumsum(counts) / D2_PAIRS * 255).astype(np.uint8)
+
+
+def encode(signature: np.ndarray) -> str:
+    return base64.b64encode(signature.tobytes()).decode("ascii")
+
+
+def decode(value) -> np.ndarray:
+    if isinstance(value, str):
+        value = base64.b64decode(value)
+    return np.frombuffer(value, dtype=SIGNATURE, count=1)[0]
+
+
+def distance(a, b, scalar_tolerance: float, shape_tolerance: float) -> np.ndarray:
+    """
+    Distance between signature ``a`` and one or many signatures ``b``, in
+    units of the tolerances: at most 1 means a near duplicate.
+    """
+    scalars = np.abs(b["scalars"] - a["scalars"]).max(axis=-1) / scalar_tolerance
+    shape = np.abs(
+        b["d2"].astype(np.int16) - a["d2"].astype(np.int16)
+    ).max(axis=-1) / 255.0 / shape_tolerance
+    return np.maximum(scalars, shape)
@@ -0,0 +1,211 @@
+"""
+Build-plate nesting: how many plates a set of parts needs and where each
+instance goes.
+
+Parts are packed by their footprint (the x/y extent of their bounding box,
+optionally turned 90°) with a skyline bottom-left heuristic. Each plate
+keeps its skyline as a short list of segments, so placing a part is a scan
+over a few dozen segments rather than over every part already placed.
+Plates are filled first-fit in order of decreasing part size, and each
+plate remembers the smallest footprint that no longer fits so later parts
+skip full plates without scanning them.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .profiles import PrinterProfile
+
+
+class NestingError(ValueError):
+    """Raised when a part cannot be placed on any plate of the printer."""
+
+
+@dataclass(frozen=True)
+class PartFootprint:
+    id: str
+    width: float  # x, mm
+    depth: float  # y
+    height: float  # z
+    quantity: int = 1
+
+
+class _Plate:
+    """Skyline of one plate: segments ``[x, top, width]`` covering [0, W]."""
+
+    def __init__(self, width: float, depth: float):
+        self.width = width
+        self.depth = depth
+        self.segments = [[0.0, 0.0, width]]
+        self.free_area = width * depth
+        # A footprint known not to fit; anything at least as large is skipped
+        self.rejected = None
+
+    def find(self, w: float, d: float):
+        """Lowest, then leftmost, position for a w × d box, or None."""
+        segments = self.segments
+        best = None
+        for i, (x, _, _) in enumerate(segments):
+            if x + w > self.width + 1e-9:
+                break
+            top = 0.0
+            right = x + w - 1e-9
+            j = i
+            while j < len(segments) and segments[j][0] < right:
+                top = max(top, segments[j][1])
+                if top + d > self.depth + 1e-9 or (best is not None and top >= best[0]):
+                    break
+                j += 1
+            else:
+                best = (top, x)
+        return best
+
+    def place(self, x: float, y: float, w: float, d: float):
+        segments = self.segments
+        right = x + w
+        updated = []
+        for sx, top, sw in segments:
+            end = sx + sw
+            if end <= x or sx >= right:
+                updated.append([sx, top, sw])
+                continue
+            if sx < x:
+                updated.append([sx, top, x - sx])
+            if end > right:
+                updated.append([right, top, end - right])
+        updated.append([x, y + d, w])
+        updated.sort(key=lambda s: s[0])
+
+        # Merge neighbours at the same height to keep the skyline short
+        merged = [updated[0]]
+        for segment in updated[1:]:
+            last = merged[-1]
+            if abs(last[1] - segment[1]) < 1e-9:
+                last[2] += segment[2]
+            else:
+                merged.append(segment)
+        self.segments = merged
+        self.free_area -= w * d
+
+
+def nest(
+    parts: List[PartFootprint],
+    printer: PrinterProfile,
+    spacing: float = 2.0,
+    margin: Optional[float] = None,
+    allow_rotation: bool = True
+) -> dict:
+    """
+    Pack every instance of ``parts`` onto as few plates of ``printer`` as
+    the heuristic finds. Returns plate count, per-plate and overall
+    footprint utilization, and one placement per instance.
+    """
+    plate_w, plate_d, plate_h = printer.build_volume
+    if margin is None:
+        margin = printer.bed_margin
+    # Every part carries half the gap on each side; the outer half-gaps
+    # sit in the margin
+    usable_w = plate_w - 2 * margin + spacing
+    usable_d = plate_d - 2 * margin + spacing
+
+    for part in parts:
+        check_fit(part, printer, spacing, margin, allow_rotation)
+
+    # Big parts first; instances of one part stay together
+    order = sorted(
+        parts,
+        key=lambda p: (max(p.width, p.depth), p.width * p.depth),
+        reverse=True
+    )
+
+    plates: List[_Plate] = []
+    placements = []
+    part_area = []
+    for part in order:
+        w, d = part.width + spacing, part.depth + spacing
+        # Size key for the per-plate rejection cache; with rotation either
+        # side can lie along x
+        size = (min(w, d), max(w, d)) if allow_rotation else (w, d)
+        orientations = [(w, d, False)]
+        if allow_rotation and w != d:
+            orientations.append((d, w, True))
+
+        for instance in range(part.quantity):
+            placed = None
+            for index, plate in enumerate(plates):
+                if plate.free_area < w * d:
+                    continue
+                if plate.rejected is not None and _covers(size, plate.rejected):
+                    continue
+                placed = _best_fit(plate, orientations)
+                if placed is not None:
+                    break
+                if plate.rejected is None or _covers(plate.rejected, size):
+                    plate.rejected = size
+            else:
+                plate = _Plate(usable_w, usable_d)
+                plates.append(plate)
+                part_area.append(0.0)
+                index = len(plates) - 1
+                placed = _best_fit(plate, orientations)
+
+            y, x, pw, pd, rotated = placed
+            plate.place(x, y, pw, pd)
+            part_area[index] += part.width * part.depth
+            # Min corner on the plate and the footprint as placed, in mm
+            placements.append({
+                "id": part.id,
+                "instance": instance,
+                "plate": index,
+                "x": margin + x,
+                "y": margin + y,
+                "width": pw - spacing,
+                "depth": pd - spacing,
+                "rotated": rotated
+            })
+
+    plate_area = plate_w * plate_d
+    return {
+        "printer": printer.name,
+        "plateCount": len(plates),
+        "plateSize": [plate_w, plate_d, plate_h],
+        "utilization": sum(part_area) / (plate_area * len(plates)) if plates else 0.0,
+        "plateUtilization": [area / plate_area for area in part_area],
+        "placements": placements
+    }
+
+
+def check_fit(
+    part: PartFootprint,
+    printer: PrinterProfile,
+    spacing: float = 2.0,
+    margin: Optional[float] = None,
+    allow_rotation: bool = True
+):
+    """Raise NestingError if ``part`` cannot go on a plate of ``printer`` at all."""
+    plate_w, plate_d, plate_h = printer.build_volume
+    if margin is None:
+        margin = printer.bed_margin
+    usable_w = plate_w - 2 * margin + spacing
+    usable_d = plate_d - 2 * margin + spacing
+
+    if part.height > plate_h:
+        raise NestingError(f"Part {part.id} is taller than the {printer.name} build volume")
+    w, d = part.width + spacing, part.depth + spacing
+    fits = w <= usable_w and d <= usable_d
+    if allow_rotation:
+        fits = fits or (d <= usable_w and w <= usable_d)
+    if not fits:
+        raise NestingError(f"Part {part.id} does not fit on the {printer.name} plate")
+
+
+def _covers(size, smaller) -> bool:
+    return size[0] >= smaller[0] and size[1] >= smaller[1]
+
+
+def _best_fit(plate: _Plate, orientations):
+    best = None
+    for w, d, rotated in orientations:
+        spot = plate.find(w, d)
+        if spot is not None and (best is None or spot < best[:2]):
+            best = (spot[0], spot[1], w, d, rotated)
+    return best
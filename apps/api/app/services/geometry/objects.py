@@ -0,0 +1,96 @@
+"""
+Geometry jobs on models already stored in S3.
+
+The model is streamed from the bucket with ranged reads straight into the
+parser (see ``analysis.inspect_stream``) rather than being uploaded again
+or copied to a temp file. The SHA-256 of the bytes is computed on the way
+so results are cached under the same key as a direct upload of the file.
+
+When the digest is already known and the model's lossless compact form
+(see ``compact``) was stored on ingest, that is read instead of the
+original. A quantized compact form would change the results cached under
+the original's digest, so it is never analysed.
+"""
+import hashlib
+
+from ...core.config import settings
+from .. import storage
+from . import analysis, compact
+
+
+def inspect_object(
+    key: str, file_ext: str, size: int, etag: str = None, progress=None,
+    record_digest: bool = False, digest: str = None
+) -> dict:
+    """
+    Inspect a stored model. Returns ``{"digest", "fileExt", "inspection"}``,
+    the same shape as the Celery inspection task. With ``record_digest``,
+    the digest is also stored on the object (see ``storage.record_digest``).
+    ``digest``, if the caller knows it, lets the lossless compact form be
+    used.
+    """
+    client = storage.get_s3_client()
+    if client is None:
+        raise RuntimeError("S3 is not configured")
+
+    if digest is not None:
+        data = _get_compact(client, digest)
+        if data is not None:
+            try:
+                inspection = analysis.inspect_compact(data, progress)
+                return {"digest": digest, "fileExt": file_ext, "inspection": inspection}
+            except compact.CompactFormatError:
+                # Written by another version; the original is still there
+                pass
+
+    digest = hashlib.sha256()
+
+    def chunks():
+        for chunk in storage.iter_object(client, settings.AWS_S3_BUCKET, key, size, etag):
+            digest.update(chunk)
+            yield chunk
+
+    inspection = analysis.inspect_stream(chunks(), size, file_ext, progress)
+    if record_digest:
+        storage.record_digest(client, settings.AWS_S3_BUCKET, key, digest.hexdigest(), etag)
+    return {"digest": digest.hexdigest(), "fileExt": file_ext, "inspection": inspection}
+
+
+def store_compact(path: str, file_ext: str, digest: str):
+    """
+    Store the compact form of a spooled model unless it already is.
+    Returns the encoded bytes if they were stored now, otherwise None.
+    """
+    client = storage.get_s3_client()
+    if client is None:
+        raise RuntimeError("S3 is not configured")
+    key = compact.compact_key(digest, settings.MESH_QUANTIZATION_STEP)
+    try:
+        client.head_object(Bucket=settings.AWS_S3_BUCKET, Key=key)
+        return None
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+            raise
+
+    data = compact.encode(
+        analysis.load_triangles(path, file_ext),
+        settings.MESH_QUANTIZATION_STEP,
+        settings.MESH_COMPRESSION_LEVEL
+    )
+    client.put_object(
+        Bucket=settings.AWS_S3_BUCKET,
+        Key=key,
+        Body=data,
+        ContentType="application/octet-stream",
+        # The original's format and the grid step
+        Metadata={"source": file_ext, "step": f"{settings.MESH_QUANTIZATION_STEP or 0:g}"}
+    )
+    return data
+
+
+def _get_compact(client, digest: str):
+    try:
+        response = client.get_object(Bucket=settings.AWS_S3_BUCKET, Key=compact.compact_key(digest))
+    except client.exceptions.NoSuchKey:
+        return None
+    return response["Body"].read()
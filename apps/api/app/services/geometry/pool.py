@@ -0,0 +1,113 @@
+"""
+Process pool for CPU-bound geometry work.
+
+Mesh loading and analysis hold the GIL for seconds on large models, so they
+run in a separate process pool instead of on the event loop. The pool is
+bounded: once every worker is busy and the backlog reaches
+GEOMETRY_MAX_QUEUE, new jobs are rejected so callers can answer 503 instead
+of piling up requests. Workers are replaced after
+GEOMETRY_WORKER_MAX_JOBS jobs to cap trimesh memory growth.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import threading
+
+from ...core.config import settings
+
+
+class GeometryPoolFull(Exception):
+    """Raised when the pool's queue is at capacity."""
+
+
+class GeometryJobTimeout(Exception):
+    """Raised when a job does not finish within its time limit."""
+
+
+class GeometryPool:
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        job_timeout: float,
+        max_jobs_per_worker: int = 0
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        """Running plus queued jobs allowed at once."""
+        return self.workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # Worker recycling requires a non-fork start method
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=self.max_jobs_per_worker or None
+                )
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def run(self, fn, *args, timeout: float = None):
+        """
+        Run ``fn(*args)`` in a worker process and await its result.
+
+        A job that times out while still queued is cancelled. One that is
+        already running cannot be interrupted; it keeps its slot until it
+        finishes so the capacity limit stays accurate.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise GeometryPoolFull("Geometry workers are busy")
+            self._in_flight += 1
+
+        try:
+            self.start()
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout or self.job_timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise GeometryJobTimeout("Geometry job timed out")
+        except BrokenProcessPool:
+            # A worker died (usually out of memory); start fresh next time
+            self.shutdown(wait=False)
+            raise
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+
+geometry_pool = GeometryPool(
+    workers=settings.GEOMETRY_WORKERS,
+    max_queue=settings.GEOMETRY_MAX_QUEUE,
+    job_timeout=settings.GEOMETRY_JOB_TIMEOUT,
+    max_jobs_per_worker=settings.GEOMETRY_WORKER_MAX_JOBS
+)
@@ -0,0 +1,287 @@
+"""
+Level-of-detail previews for the storefront viewer.
+
+Each model gets a few decimated versions (``PREVIEW_LOD_FACES``) written as
+quantized GLB files, smallest first, so the viewer can show something
+within a few hundred KB and refine as larger levels arrive.
+
+Decimation is vertex clustering: corners are snapped to a uniform grid and
+merged per cell, and faces that collapse are dropped. It works directly on
+triangle soup (no welding pass) and is a handful of vectorized NumPy
+operations, so even multi-million-face models decimate in seconds. The grid
+size for a face budget is estimated from the surface area and refined in
+a few steps.
+
+A shaded thumbnail image (see ``thumbnails``) is rendered from the same
+triangles first, for listing pages that only need a picture.
+
+Files are stored content-addressed under ``PREVIEW_DIR/<sha256>/`` with a
+``manifest.json`` describing them; identical uploads share them. Only
+stored models get previews, and ``model_store`` removes them with the last
+blob of that content.
+"""
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from PIL import features
+
+from ...core.config import settings
+from . import analysis, stl, thumbnails
+
+# Attempts at refining the grid size towards a face budget
+CLUSTER_STEPS = 4
+# A pending marker older than this (seconds) is assumed to be a lost job
+PENDING_TIMEOUT = 3600
+
+GLB_MAGIC = 0x46546C67
+GLB_JSON = 0x4E4F534A
+GLB_BIN = 0x004E4942
+QUANTIZATION_LEVELS = 65535
+
+# glTF is Y-up; models are printed Z-up
+Z_UP_TO_Y_UP = np.array([
+    [1.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0],
+    [0.0, -1.0, 0.0]
+])
+
+
+def preview_root() -> str:
+    return settings.PREVIEW_DIR or os.path.join(tempfile.gettempdir(), "akaar-previews")
+
+
+def preview_dir(digest: str) -> str:
+    return os.path.join(preview_root(), digest)
+
+
+def thumbnail_format() -> str:
+    return "webp" if features.check("webp") else "png"
+
+
+def load_manifest(digest: str):
+    """The manifest of a model's previews, or None if not built yet."""
+    try:
+        with open(os.path.join(preview_dir(digest), "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def claim(digest: str) -> bool:
+    """
+    Mark previews for ``digest`` as being built. False if they exist or
+    another job is already building them.
+    """
+    directory = preview_dir(digest)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        return False
+
+    marker = os.path.join(directory, "pending")
+    try:
+        if time.time() - os.path.getmtime(marker) > PENDING_TIMEOUT:
+            os.unlink(marker)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def release(digest: str):
+    try:
+        os.unlink(os.path.join(preview_dir(digest), "pending"))
+    except FileNotFoundError:
+        pass
+
+
+def remove(digest: str):
+    """Delete a model's previews and thumbnail, built or half-built."""
+    shutil.rmtree(preview_dir(digest), ignore_errors=True)
+
+
+def build_previews(path: str, file_ext: str, digest: str) -> dict:
+    """
+    Render the thumbnail, decimate the model into every configured LOD,
+    write the files and finally the manifest that marks them ready.
+    """
+    triangles = analysis.load_triangles(path, file_ext)
+    if len(triangles) == 0:
+        raise ValueError("Empty model")
+
+    lo = triangles.reshape(-1, 3).min(axis=0)
+    hi = triangles.reshape(-1, 3).max(axis=0)
+    area = _surface_area(triangles)
+    directory = preview_dir(digest)
+    os.makedirs(directory, exist_ok=True)
+
+    image = thumbnails.render_thumbnail(triangles, settings.THUMBNAIL_SIZE, bounds=(lo, hi))
+    image_format = thumbnail_format()
+    encoded = io.BytesIO()
+    image.save(encoded, format=image_format.upper(), quality=85, method=4)
+    thumbnail = f"thumbnail.{image_format}"
+    _write_atomic(os.path.join(directory, thumbnail), encoded.getvalue())
+
+    levels = []
+    for target in sorted(settings.PREVIEW_LOD_FACES):
+        vertices, faces = decimate(triangles, lo, hi, area, target)
+        name = f"lod{len(levels)}.glb"
+        _write_atomic(os.path.join(directory, name), encode_glb(vertices, faces))
+        levels.append({
+            "name": name,
+            "faces": int(len(faces)),
+            "bytes": os.path.getsize(os.path.join(directory, name))
+        })
+        # This level is already full detail; larger ones would repeat it
+        if len(triangles) <= target:
+            break
+
+    manifest = {"digest": digest, "thumbnail": thumbnail, "levels": levels}
+    _write_atomic(os.path.join(directory, "manifest.json"), json.dumps(manifest).encode())
+    return manifest
+
+
+def _surface_area(triangles: np.ndarray) -> float:
+    total = 0.0
+    for start in range(0, len(triangles), stl.CHUNK_TRIANGLES):
+        tri = np.asarray(triangles[start:start + stl.CHUNK_TRIANGLES], dtype=np.float64)
+        cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+        total += 0.5 * float(np.sqrt((cross * cross).sum(axis=1)).sum())
+    return total
+
+
+def decimate(triangles: np.ndarray, lo, hi, area: float, target: int):
+    """
+    Cluster ``triangles`` down to at most about ``target`` faces. Returns
+    ``(vertices, faces)``; the finest grid is the GLB quantization grid,
+    so a model under budget comes back at full detail.
+    """
+    extent = max(float((hi - lo).max()), 1e-9)
+    finest = extent / QUANTIZATION_LEVELS
+    # A surface meshed at grid spacing c has about 2A/c² faces
+    cell = max(np.sqrt(2.0 * area / max(target, 1)), finest)
+    if len(triangles) <= target:
+        cell = finest
+
+    for _ in range(CLUSTER_STEPS):
+        vertices, faces = _cluster(triangles, lo, cell)
+        if len(faces) <= target * 1.05:
+            break
+        cell *= np.sqrt(len(faces) / target) * 1.05
+    return vertices, faces
+
+
+def _cluster(triangles: np.ndarray, lo, cell: float):
+    corners = triangles.reshape(-1, 3)
+    cells = np.floor((corners - lo) / cell).astype(np.int64)
+    span = cells.max(axis=0) + 1
+    keys = cells[:, 0] + span[0] * (cells[:, 1] + span[1] * cells[:, 2])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+
+    # Each cluster's vertex is the mean of the corners that fell into it
+    counts = np.bincount(inverse, minlength=len(unique))
+    vertices = np.stack(
+        [np.bincount(inverse, corners[:, axis], minlength=len(unique)) / counts for axis in range(3)],
+        axis=1
+    )
+
+    faces = inverse.reshape(-1, 3)
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    faces = faces[keep]
+    # Collapsed neighbourhoods often leave the same face twice
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+
+    # Drop vertices only used by removed faces
+    used, faces = np.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3)
+
+
+def encode_glb(vertices: np.ndarray, faces: np.ndarray) -> bytes:
+    """
+    Binary glTF with KHR_mesh_quantization: positions as uint16 on a grid
+    over the bounding box, scaled back and turned Z-up → Y-up by the node
+    matrix. No normals; viewers shade flat, which suits decimated parts.
+    """
+    lo = vertices.min(axis=0)
+    step = np.maximum(vertices.max(axis=0) - lo, 1e-9) / QUANTIZATION_LEVELS
+    quantized = np.rint((vertices - lo) / step).astype(np.uint16)
+
+    # Vertex attributes must be 4-byte aligned: pad xyz to xyzw
+    positions = np.zeros((len(quantized), 4), dtype=np.uint16)
+    positions[:, :3] = quantized
+    index_type, index_dtype = (5123, np.uint16) if len(vertices) < 0xFFFF else (5125, np.uint32)
+    indices = faces.astype(index_dtype).ravel()
+
+    position_bytes = positions.tobytes()
+    index_bytes = indices.tobytes()
+    index_bytes += b"\0" * (-len(index_bytes) % 4)
+    binary = position_bytes + index_bytes
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = Z_UP_TO_Y_UP @ np.diag(step)
+    matrix[:3, 3] = Z_UP_TO_Y_UP @ lo
+
+    document = {
+        "asset": {"version": "2.0", "generator": "akaar-api"},
+        "extensionsUsed": ["KHR_mesh_quantization"],
+        "extensionsRequired": ["KHR_mesh_quantization"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "matrix": matrix.T.ravel().tolist()}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1, "material": 0}]}],
+        "materials": [{
+            "pbrMetallicRoughness": {
+                "baseColorFactor": [0.8, 0.8, 0.8, 1.0],
+                "metallicFactor": 0.0,
+                "roughnessFactor": 0.6
+            }
+        }],
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": len(position_bytes), "byteStride": 8, "target": 34962},
+            {"buffer": 0, "byteOffset": len(position_bytes), "byteLength": indices.nbytes, "target": 34963}
+        ],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5123,
+                "count": len(positions),
+                "type": "VEC3",
+                "min": quantized.min(axis=0).tolist(),
+                "max": quantized.max(axis=0).tolist()
+            },
+            {
+                "bufferView": 1,
+                "componentType": index_type,
+                "count": len(indices),
+                "type": "SCALAR"
+            }
+        ]
+    }
+
+    json_bytes = json.dumps(document, separators=(",", ":")).encode()
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    length = 12 + 8 + len(json_bytes) + 8 + len(binary)
+    return b"".join([
+        struct.pack("<III", GLB_MAGIC, 2, length),
+        struct.pack("<II", len(json_bytes), GLB_JSON), json_bytes,
+        struct.pack("<II", len(binary), GLB_BIN), binary
+    ])
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
@@ -0,0 +1,311 @@
+"""
+Printability checks beyond mesh topology: unsupported overhangs and walls
+thinner than the printer can lay down.
+
+Both checks work on a triangle array of shape (n, 3, 3), which may be a
+zero-copy view over a memory-mapped STL, and only copy bounded batches.
+Each check stops at a ``time.monotonic()`` deadline, tested before every
+batch and before the wall thickness grid is built; a caller running both
+checks passes them the same deadline. A check that runs out returns its
+partial result with ``complete: False`` and the number and fraction of
+faces checked, and should be read as a sample.
+
+Wall thickness is measured by casting a short ray from each face along its
+inward normal and looking for the opposite wall. Rays never need to travel
+further than the minimum thickness, so candidates come from a uniform grid
+whose cells are at least one ray long: each ray touches at most 2x2x2
+cells. Faces are cast cell by cell, so the rays of a batch share their
+cells and triangles, with the cells in a fixed random order: a partial
+result is a random sample of regions spread over the whole mesh.
+"""
+import time
+
+import numpy as np
+
+# Faces per batch for the overhang scan
+OVERHANG_CHUNK = 1 << 18
+# Rays per batch and cap on (ray, triangle) pairs tested at once
+RAY_BATCH = 1 << 15
+MAX_PAIRS = 1 << 21
+# Faces whose top is this close to the bed rest on it and need no support
+BED_TOLERANCE = 1e-3
+# Regions reported per check
+MAX_REGIONS = 10
+# Average grid cells per triangle before the grid is coarsened
+MAX_CELLS_PER_TRIANGLE = 16
+
+
+def check_overhangs(triangles, z_min: float, angle: float, deadline: float) -> dict:
+    """
+    Faces tilted more than ``angle`` degrees past vertical, facing down,
+    that do not rest on the bed.
+    """
+    threshold = -np.sin(np.radians(angle))
+    n = len(triangles)
+    flagged = []
+    area = 0.0
+    checked = 0
+
+    for start in range(0, n, OVERHANG_CHUNK):
+        if time.monotonic() > deadline:
+            break
+        tri = np.asarray(triangles[start:start + OVERHANG_CHUNK], dtype=np.float64)
+        normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+        double_area = np.sqrt((normals * normals).sum(axis=1))
+        nz = np.divide(normals[:, 2], double_area, out=np.zeros(len(tri)), where=double_area > 0)
+        on_bed = tri[:, :, 2].max(axis=1) <= z_min + BED_TOLERANCE
+
+        mask = (nz < threshold) & ~on_bed
+        flagged.append(np.flatnonzero(mask) + start)
+        area += 0.5 * float(double_area[mask].sum())
+        checked = start + len(tri)
+
+    faces = np.concatenate(flagged) if flagged else np.zeros(0, dtype=np.int64)
+    return {
+        "faceCount": int(len(faces)),
+        "area": area,
+        "angle": angle,
+        "checkedFaces": checked,
+        "checkedFraction": checked / n if n else 1.0,
+        "complete": checked == n,
+        "regions": face_regions(triangles, faces)
+    }
+
+
+def check_thin_walls(triangles, min_thickness: float, deadline: float, seed: int = 0) -> dict:
+    """
+    Faces whose opposite wall is closer than ``min_thickness`` along the
+    inward normal.
+    """
+    n = len(triangles)
+    flagged = []
+    thinnest = np.inf
+    checked = 0
+    # Building the grid is a large share of the work on big meshes
+    if time.monotonic() <= deadline:
+        grid = _Grid(triangles, min_thickness)
+        order = grid.cell_order(np.random.default_rng(seed))
+
+        for start in range(0, n, RAY_BATCH):
+            if time.monotonic() > deadline:
+                break
+            faces = order[start:start + RAY_BATCH]
+            hits = _cast_inward(triangles, grid, faces, min_thickness)
+            thin = hits < min_thickness
+            flagged.append(faces[thin])
+            if thin.any():
+                thinnest = min(thinnest, float(hits[thin].min()))
+            checked = start + len(faces)
+
+    faces = np.sort(np.concatenate(flagged)) if flagged else np.zeros(0, dtype=np.int64)
+    return {
+        "faceCount": int(len(faces)),
+        "minThickness": min_thickness,
+        "thinnest": None if np.isinf(thinnest) else thinnest,
+        "checkedFaces": checked,
+        "checkedFraction": checked / n if n else 1.0,
+        "complete": checked == n,
+        "regions": face_regions(triangles, faces)
+    }
+
+
+def face_regions(triangles, faces: np.ndarray) -> list:
+    """
+    Group flagged faces into coarse clusters (cells of 5% of the flagged
+    extent) and return the largest as bounding boxes with face counts.
+    """
+    if len(faces) == 0:
+        return []
+    tri = np.asarray(triangles[faces], dtype=np.float64)
+    lo = tri.min(axis=1)
+    hi = tri.max(axis=1)
+    centroids = tri.mean(axis=1)
+
+    extent = centroids.max(axis=0) - centroids.min(axis=0)
+    cell = max(float(np.linalg.norm(extent)) * 0.05, 1e-6)
+    keys = np.floor((centroids - centroids.min(axis=0)) / cell).astype(np.int64)
+    _, group = np.unique(keys, axis=0, return_inverse=True)
+    group = group.ravel()
+
+    order = np.argsort(group, kind="stable")
+    starts = np.flatnonzero(np.diff(group[order], prepend=-1))
+    counts = np.diff(np.append(starts, len(order)))
+    region_lo = np.minimum.reduceat(lo[order], starts)
+    region_hi = np.maximum.reduceat(hi[order], starts)
+
+    largest = np.argsort(-counts, kind="stable")[:MAX_REGIONS]
+    return [
+        {
+            "min": region_lo[i].tolist(),
+            "max": region_hi[i].tolist(),
+            "faceCount": int(counts[i])
+        }
+        for i in largest
+    ]
+
+
+class _Grid:
+    """Uniform grid of triangle bounding boxes stored as CSR cell lists."""
+
+    def __init__(self, triangles, min_cell: float):
+        n = len(triangles)
+        lo = np.empty((n, 3))
+        hi = np.empty((n, 3))
+        for start in range(0, n, OVERHANG_CHUNK):
+            tri = np.asarray(triangles[start:start + OVERHANG_CHUNK], dtype=np.float64)
+            # Pairwise rather than reducing over the short vertex axis
+            lo[start:start + len(tri)] = np.minimum(np.minimum(tri[:, 0], tri[:, 1]), tri[:, 2])
+            hi[start:start + len(tri)] = np.maximum(np.maximum(tri[:, 0], tri[:, 1]), tri[:, 2])
+        self.origin = lo.min(axis=0) if n else np.zeros(3)
+        # Kept axis by axis for a cheap box test before the exact ray test
+        self.lo = np.ascontiguousarray(lo.T, dtype=np.float32)
+        self.hi = np.ascontiguousarray(hi.T, dtype=np.float32)
+
+        # Start near the typical triangle size and coarsen until the
+        # cell lists stay proportional to the triangle count
+        cell = max(min_cell, float(np.median(hi - lo)) if n else min_cell)
+        while True:
+            first = np.floor((lo - self.origin) / cell).astype(np.int64)
+            spans = np.floor((hi - self.origin) / cell).astype(np.int64) - first + 1
+            per_triangle = spans.prod(axis=1)
+            if per_triangle.sum() <= MAX_CELLS_PER_TRIANGLE * max(n, 1):
+                break
+            cell *= 2.0
+        self.cell = cell
+        if n:
+            self.dims = np.floor((hi.max(axis=0) - self.origin) / cell).astype(np.int64) + 2
+        else:
+            self.dims = np.ones(3, dtype=np.int64)
+
+        # The cell each triangle's bounding box starts in
+        self.home = self._key(first)
+
+        # Expand each triangle into the cells its bounding box covers
+        tri_ids = np.repeat(np.arange(n), per_triangle)
+        local = np.arange(len(tri_ids)) - np.repeat(np.cumsum(per_triangle) - per_triangle, per_triangle)
+        s = spans[tri_ids]
+        offset = np.stack([local % s[:, 0], (local // s[:, 0]) % s[:, 1], local // (s[:, 0] * s[:, 1])], axis=1)
+        keys = self._key(first[tri_ids] + offset)
+
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self.triangles = tri_ids[order]
+        self.starts = np.flatnonzero(np.diff(keys, prepend=-1))
+        self.keys = keys[self.starts]
+        self.ends = np.append(self.starts[1:], len(keys))
+
+    def _key(self, cells: np.ndarray) -> np.ndarray:
+        return cells[:, 0] + self.dims[0] * (cells[:, 1] + self.dims[1] * cells[:, 2])
+
+    def cell_order(self, rng) -> np.ndarray:
+        """All triangles grouped by the cell they start in, cells shuffled."""
+        rank = rng.permutation(len(self.keys))
+        return np.argsort(rank[np.searchsorted(self.keys, self.home)], kind="stable")
+
+    def candidates(self, seg_lo: np.ndarray, seg_hi: np.ndarray):
+        """
+        ``(ray, triangle)`` index pairs for segments whose bounding boxes
+        span at most two cells per axis. May contain duplicates.
+        """
+        # Outside the grid there are no triangles; clamping only adds
+        # candidates the box test drops
+        first = np.clip(np.floor((seg_lo - self.origin) / self.cell).astype(np.int64), 0, self.dims - 1)
+        last = np.clip(np.floor((seg_hi - self.origin) / self.cell).astype(np.int64), 0, self.dims - 1)
+        crosses = [last[:, axis] > first[:, axis] for axis in range(3)]
+        base = self._key(first)
+        stride = (1, int(self.dims[0]), int(self.dims[0] * self.dims[1]))
+
+        rays, keys = [], []
+        for offset in np.ndindex(2, 2, 2):
+            # Only segments reaching into the next cell along each offset axis
+            inside = None
+            for axis in np.flatnonzero(offset):
+                inside = crosses[axis] if inside is None else inside & crosses[axis]
+            ray_ids = np.arange(len(base)) if inside is None else np.flatnonzero(inside)
+            rays.append(ray_ids)
+            keys.append(base[ray_ids] + sum(o * d for o, d in zip(offset, stride)))
+        rays = np.concatenate(rays)
+        keys = np.concatenate(keys)
+
+        slot = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[slot] == keys
+        rays, slot = rays[found], slot[found]
+        starts = self.starts[slot]
+        counts = self.ends[slot] - starts
+        pair_rays = np.repeat(rays, counts)
+        # Entry of each pair: its cell's start plus its place in the cell
+        shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        pair_triangles = self.triangles[np.arange(len(pair_rays)) + shift]
+
+        # Most neighbours in a shared cell are nowhere near the segment.
+        # Test one axis at a time on flat arrays and drop misses before
+        # the next, so later axes only see the few pairs left
+        seg_lo = seg_lo.T.astype(np.float32)
+        seg_hi = seg_hi.T.astype(np.float32)
+        for axis in range(3):
+            overlap = (
+                (self.lo[axis][pair_triangles] <= seg_hi[axis][pair_rays])
+                & (self.hi[axis][pair_triangles] >= seg_lo[axis][pair_rays])
+            )
+            pair_rays = pair_rays[overlap]
+            pair_triangles = pair_triangles[overlap]
+        return pair_rays, pair_triangles
+
+
+def _cast_inward(triangles, grid: _Grid, faces: np.ndarray, max_distance: float) -> np.ndarray:
+    """
+    Distance from each face's centroid, along its inward normal, to the
+    nearest wall facing away from it; ``inf`` when none is within
+    ``max_distance``.
+    """
+    tri = np.asarray(triangles[faces], dtype=np.float64)
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.sqrt((normals * normals).sum(axis=1))
+    usable = length > 0
+    direction = -np.divide(normals, length[:, None], out=np.zeros_like(normals), where=usable[:, None])
+
+    eps = max_distance * 1e-4
+    origin = (tri[:, 0] + tri[:, 1] + tri[:, 2]) / 3 + direction * eps
+    end = origin + direction * max_distance
+    seg_lo = np.minimum(origin, end)
+    seg_hi = np.maximum(origin, end)
+
+    distance = np.full(len(faces), np.inf)
+    ray_ids, tri_ids = grid.candidates(seg_lo, seg_hi)
+    keep = usable[ray_ids] & (tri_ids != faces[ray_ids])
+    ray_ids, tri_ids = ray_ids[keep], tri_ids[keep]
+
+    for start in range(0, len(ray_ids), MAX_PAIRS):
+        r = ray_ids[start:start + MAX_PAIRS]
+        t = _intersect(
+            origin[r], direction[r],
+            np.asarray(triangles[tri_ids[start:start + MAX_PAIRS]], dtype=np.float64),
+            max_distance
+        )
+        np.minimum.at(distance, r, t)
+    return distance
+
+
+def _intersect(origin, direction, tri, max_distance) -> np.ndarray:
+    """
+    Möller–Trumbore ray/triangle distance for each pair, counting only
+    triangles the ray leaves through (their normal faces along the ray).
+    Misses are ``inf``.
+    """
+    v0 = tri[:, 0]
+    e1 = tri[:, 1] - v0
+    e2 = tri[:, 2] - v0
+    p = np.cross(direction, e2)
+    det = (e1 * p).sum(axis=1)
+    # det < 0 means the triangle's normal points along the ray
+    exiting = det < -1e-12
+    inv = np.divide(1.0, det, out=np.zeros_like(det), where=exiting)
+
+    s = origin - v0
+    u = (s * p).sum(axis=1) * inv
+    q = np.cross(s, e1)
+    v = (direction * q).sum(axis=1) * inv
+    t = (e2 * q).sum(axis=1) * inv
+
+    hit = exiting & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0) & (t <= max_distance)
+    return np.where(hit, t, np.inf)
@@ -0,0 +1,113 @@
+"""
+Printer and material profiles used by the print estimator and the quote
+pricing engine.
+
+Speeds are slicer defaults scaled by ``speed_factor`` to account for
+acceleration, which on short moves keeps the head well below the nominal
+speed. Volumetric limits cap how fast a material can actually be extruded.
+
+The built-in profiles below can be extended or overridden with a JSON file
+named by PRINT_PROFILES_FILE::
+
+    {
+        "printers": {"bambu-x1c": {"build_volume": [256, 256, 256], ...}},
+        "materials": {"TPU": {"density": 1.21, "max_volumetric_speed": 3.6, "price_per_gram": 5.0}}
+    }
+"""
+from dataclasses import dataclass, fields, replace
+from typing import Optional
+import json
+
+from ...core.config import settings
+
+
+@dataclass(frozen=True)
+class PrinterProfile:
+    name: str
+    build_volume: tuple  # x, y, z in mm
+    bed_margin: float = 2.0  # mm kept clear around the plate edge when nesting
+    line_width: float = 0.42
+    wall_count: int = 2
+    top_shell_thickness: float = 0.8  # mm
+    bottom_shell_thickness: float = 0.6
+    wall_speed: float = 200.0  # mm/s
+    solid_infill_speed: float = 250.0
+    sparse_infill_speed: float = 270.0
+    speed_factor: float = 0.6
+    layer_overhead: float = 2.0  # seconds per layer: layer change, travel, retracts
+    min_layer_time: float = 8.0  # seconds, cooling floor for small layers
+    hourly_rate: float = 150.0  # quoted machine time, per hour
+
+
+@dataclass(frozen=True)
+class MaterialProfile:
+    name: str
+    density: float  # g/cm³
+    # "fdm" is extruded along slicer paths; "sla" cures whole layers solid
+    process: str = "fdm"
+    max_volumetric_speed: Optional[float] = None  # mm³/s, FDM only
+    layer_time: float = 0.0  # seconds per layer (exposure and peel), SLA only
+    price_per_gram: float = 0.0  # quoted material, including waste and supports
+
+
+PRINTERS = {
+    "bambu-p1s": PrinterProfile(
+        name="bambu-p1s",
+        build_volume=(256.0, 256.0, 256.0)
+    ),
+    "bambu-a1": PrinterProfile(
+        name="bambu-a1",
+        build_volume=(256.0, 256.0, 256.0),
+        speed_factor=0.5
+    ),
+}
+
+MATERIALS = {
+    "PLA": MaterialProfile(name="PLA", density=1.24, max_volumetric_speed=21.0, price_per_gram=3.0),
+    "PETG": MaterialProfile(name="PETG", density=1.27, max_volumetric_speed=12.0, price_per_gram=3.5),
+    "ABS": MaterialProfile(name="ABS", density=1.04, max_volumetric_speed=16.0, price_per_gram=3.5),
+    "RESIN": MaterialProfile(
+        name="RESIN", density=1.10, process="sla", layer_time=9.0, price_per_gram=12.0
+    ),
+}
+
+
+def load_profiles(path: str):
+    """Merge printer and material definitions from a JSON file."""
+    with open(path) as f:
+        data = json.load(f)
+
+    for name, values in data.get("printers", {}).items():
+        PRINTERS[name] = _merge(PrinterProfile, PRINTERS.get(name), name, values)
+    for name, values in data.get("materials", {}).items():
+        MATERIALS[name] = _merge(MaterialProfile, MATERIALS.get(name), name, values)
+
+
+def _merge(cls, base, name: str, values: dict):
+    known = {f.name for f in fields(cls)}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"Unknown {cls.__name__} fields for {name}: {', '.join(sorted(unknown))}")
+    if "build_volume" in values:
+        values = {**values, "build_volume": tuple(values["build_volume"])}
+    if base is None:
+        return cls(name=name, **values)
+    return replace(base, **values)
+
+
+def get_printer(name: str) -> PrinterProfile:
+    try:
+        return PRINTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown printer profile: {name}")
+
+
+def get_material(name: str) -> MaterialProfile:
+    try:
+        return MATERIALS[name]
+    except KeyError:
+        raise ValueError(f"Unknown material profile: {name}")
+
+
+if settings.PRINT_PROFILES_FILE:
+    load_profiles(settings.PRINT_PROFILES_FILE)
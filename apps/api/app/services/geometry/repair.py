@@ -0,0 +1,375 @@
+"""
+Mesh repair for models that fail validation.
+
+``repair_triangles`` turns triangle soup into a cleaned indexed mesh:
+
+1. corners closer than ``REPAIR_MERGE_TOLERANCE`` are welded into shared
+   vertices,
+2. degenerate faces (repeated vertices or zero area) and duplicate faces
+   (the same three vertices, in either winding) are dropped,
+3. winding is made consistent within each connected part, found by a
+   union-find over shared edges that tracks each face's flip relative to
+   its root, and each part is turned so its signed volume is positive
+   (normals point out),
+4. boundary loops of up to ``REPAIR_MAX_HOLE_EDGES`` edges are closed with
+   a fan around their centroid.
+
+Every step is a sort or a few rounds of vectorized hooking over NumPy
+arrays; the only Python-level loop walks hole boundaries, which are short. The output is
+written to disk in chunks by the worker (binary STL or GLB) and streamed
+back to the client from there.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from ...core.config import settings
+from . import analysis, stl
+from .timing import stage
+from .previews import GLB_MAGIC, GLB_JSON, GLB_BIN, Z_UP_TO_Y_UP
+
+OUTPUT_FORMATS = {
+    "stl": "model/stl",
+    "glb": "model/gltf-binary",
+}
+
+STL_HEADER = b"AKAAR repaired mesh".ljust(80, b" ")
+
+
+def repair_path(path: str, file_ext: str, out_path: str, output_format: str = "stl") -> dict:
+    """
+    Repair a model file and write the result to ``out_path`` as binary STL
+    or GLB. Returns a report of what was changed.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    triangles = analysis.load_triangles(path, file_ext)
+    if len(triangles) == 0:
+        raise analysis.EmptyModelError("Empty model")
+
+    with stage("repair"):
+        vertices, faces, report = repair_triangles(
+            triangles, settings.REPAIR_MERGE_TOLERANCE, settings.REPAIR_MAX_HOLE_EDGES
+        )
+    report["inputTriangles"] = len(triangles)
+    del triangles
+    if len(faces) == 0:
+        raise analysis.EmptyModelError("No faces left after removing degenerate faces")
+
+    try:
+        with stage("write"), open(out_path, "wb") as f:
+            if output_format == "glb":
+                write_glb(f, vertices, faces)
+            else:
+                write_stl(f, vertices, faces)
+    except BaseException:
+        os.unlink(out_path)
+        raise
+
+    report["bytes"] = os.path.getsize(out_path)
+    if not os.path.exists(path):
+        # The caller stopped waiting (job timeout) and removed the input;
+        # nobody will collect the output
+        os.unlink(out_path)
+    return report
+
+
+def repair_triangles(triangles: np.ndarray, tolerance: float, max_hole_edges: int):
+    """
+    Repair an (n, 3, 3) triangle array. Returns ``(vertices, faces, report)``
+    with float32 vertices and int64 face indices.
+    """
+    corners = np.asarray(triangles, dtype=np.float32).reshape(-1, 3)
+    cells = np.rint(corners / max(tolerance, 1e-12)).astype(np.int64)
+    cells -= cells.min(axis=0)
+    corner_ids, first = _unique_rows(cells)
+    vertices = corners[first]
+    faces = corner_ids.reshape(-1, 3)
+
+    # Repeated indices and zero-area slivers
+    tri = vertices[faces].astype(np.float64)
+    cross = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    degenerate = (
+        (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+        | (0.5 * np.sqrt((cross * cross).sum(axis=1)) < stl.DEGENERATE_AREA)
+    )
+    faces = faces[~degenerate]
+
+    _, first = _unique_rows(np.sort(faces, axis=1))
+    duplicates = len(faces) - len(first)
+    faces = faces[np.sort(first)]
+
+    # Vertices only used by dropped faces
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces] = True
+    vertices = vertices[used]
+    faces = (np.cumsum(used) - 1)[faces]
+
+    flipped = _orient(vertices, faces)
+    faces[flipped] = faces[flipped][:, [0, 2, 1]]
+
+    vertices, faces, filled = _fill_holes(vertices, faces, max_hole_edges)
+    boundary_edges, is_watertight, is_winding_consistent = _topology(faces)
+
+    return vertices, faces, {
+        "triangleCount": int(len(faces)),
+        "vertexCount": int(len(vertices)),
+        "degenerateFaces": int(degenerate.sum()),
+        "duplicateFaces": int(duplicates),
+        "flippedFaces": int(flipped.sum()),
+        "filledHoles": filled,
+        "boundaryEdges": boundary_edges,
+        "isWatertight": is_watertight,
+        "isWindingConsistent": is_winding_consistent
+    }
+
+
+def _unique_rows(rows: np.ndarray):
+    """
+    Group identical rows of a non-negative integer array. Returns the group
+    id of every row and the index of each group's first row.
+    """
+    # One int64 key per row sorts far faster than a lexsort over columns;
+    # when the next column would overflow it, the key is first replaced by
+    # its dense rank
+    keys = rows[:, 0]
+    for column in rows.T[1:]:
+        span = int(column.max(initial=0)) + 1
+        if (int(keys.max(initial=0)) + 1) * span >= 2 ** 63:
+            keys = _group(keys)[0]
+        keys = keys * span + column
+    return _group(keys)
+
+
+def _group(keys: np.ndarray):
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    new = np.empty(len(keys), dtype=bool)
+    new[0] = True
+    new[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = np.cumsum(new) - 1
+    return ids, order[new]
+
+
+def _half_edges(faces: np.ndarray):
+    """
+    Directed edges of every face, grouped by undirected edge. Returns the
+    start and end vertex of each half-edge and, for the grouping, the sort
+    order, group starts and group sizes.
+    """
+    start = faces.ravel()
+    end = np.roll(faces, -1, axis=1).ravel()
+    keys = np.minimum(start, end) * (int(faces.max(initial=0)) + 1) + np.maximum(start, end)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    groups = np.flatnonzero(np.diff(sorted_keys, prepend=-1))
+    counts = np.diff(np.append(groups, len(keys)))
+    return start, end, order, groups, counts
+
+
+def _orient(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """
+    Which faces to flip so that each connected part has consistent winding
+    and positive volume.
+    """
+    n = len(faces)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    start, _, order, groups, counts = _half_edges(faces)
+
+    # Faces sharing a manifold edge must be flipped relative to each other
+    # when both traverse the edge in the same direction
+    pairs = groups[counts == 2]
+    h1, h2 = order[pairs], order[pairs + 1]
+    components, flip = _components(n, h1 // 3, h2 // 3, start[h1] == start[h2])
+
+    # Turn parts inside out when their volume comes out negative
+    tri = vertices[faces].astype(np.float64)
+    tri -= (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+    signed = (tri[:, 0] * np.cross(tri[:, 1], tri[:, 2])).sum(axis=1)
+    signed[flip] = -signed[flip]
+    volume = np.bincount(components, weights=signed, minlength=n)
+    return flip ^ (volume[components] < 0)
+
+
+def _components(n: int, a: np.ndarray, b: np.ndarray, odd: np.ndarray):
+    """
+    Union-find over faces joined by edges ``(a, b)``, tracking whether each
+    face is flipped relative to its root (``odd`` edges join faces of
+    opposite winding). Returns every face's root (the lowest face index in
+    its part) and whether it is flipped relative to the root.
+
+    Each round every root hooks onto the lowest root it shares an edge with
+    and all paths are then compressed, so a part of any shape takes a
+    handful of rounds rather than one per face along its diameter.
+    """
+    parent = np.arange(n)
+    flip = np.zeros(n, dtype=bool)
+    best = np.empty(n, dtype=np.int64)
+    while True:
+        ra, rb = parent[a], parent[b]
+        crossing = ra != rb
+        # Edges inside one tree stay there; drop them for later rounds
+        a, b, odd = a[crossing], b[crossing], odd[crossing]
+        if len(a) == 0:
+            return parent, flip
+        ra, rb = ra[crossing], rb[crossing]
+        relative = flip[a] ^ flip[b] ^ odd
+
+        # The higher root of each edge hooks onto the lowest candidate;
+        # keys carry the relative flip in their low bit
+        high = np.maximum(ra, rb)
+        best[high] = np.iinfo(np.int64).max
+        np.minimum.at(best, high, np.minimum(ra, rb) * 2 + relative)
+        hooked = np.unique(high)
+        parent[hooked] = best[hooked] >> 1
+        flip[hooked] = (best[hooked] & 1).astype(bool)
+
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            flip ^= flip[parent]
+            parent = grand
+
+
+def _fill_holes(vertices: np.ndarray, faces: np.ndarray, max_edges: int):
+    """
+    Close boundary loops of up to ``max_edges`` edges. Loops through a
+    vertex with more than one boundary edge leaving it are left alone.
+    """
+    if len(faces) == 0:
+        return vertices, faces, 0
+    start, end, order, groups, counts = _half_edges(faces)
+    boundary = order[groups[counts == 1]]
+    if len(boundary) == 0:
+        return vertices, faces, 0
+
+    outgoing = np.bincount(start[boundary], minlength=len(vertices))
+    following = dict(zip(start[boundary].tolist(), end[boundary].tolist()))
+    seen = set()
+    new_vertices = []
+    new_faces = []
+    filled = 0
+    for first in start[boundary].tolist():
+        if first in seen:
+            continue
+        loop = [first]
+        seen.add(first)
+        vertex = following.get(first)
+        while vertex is not None and vertex != first and vertex not in seen:
+            loop.append(vertex)
+            seen.add(vertex)
+            vertex = following.get(vertex)
+
+        closed = vertex == first and (outgoing[loop] == 1).all()
+        if not closed or len(loop) > max_edges:
+            continue
+        # Fill faces run each boundary edge the other way
+        if len(loop) == 3:
+            # A lone triangle is its own boundary; don't back it with a twin
+            if _has_face(faces, loop):
+                continue
+            new_faces.append([loop[0], loop[2], loop[1]])
+            filled += 1
+            continue
+        filled += 1
+        center = len(vertices) + len(new_vertices)
+        new_vertices.append(vertices[loop].astype(np.float64).mean(axis=0))
+        for i in range(len(loop)):
+            new_faces.append([loop[(i + 1) % len(loop)], loop[i], center])
+
+    if new_vertices:
+        vertices = np.concatenate([vertices, np.asarray(new_vertices, dtype=np.float32)])
+    if new_faces:
+        faces = np.concatenate([faces, np.asarray(new_faces, dtype=np.int64)])
+    return vertices, faces, filled
+
+
+def _has_face(faces: np.ndarray, corners) -> bool:
+    candidates = faces[(faces == corners[0]).any(axis=1)]
+    return bool((np.sort(candidates, axis=1) == sorted(corners)).all(axis=1).any())
+
+
+def _topology(faces: np.ndarray):
+    """Open boundary edges left, watertightness and winding consistency."""
+    if len(faces) == 0:
+        return 0, False, False
+    start, _, order, groups, counts = _half_edges(faces)
+    is_watertight = bool((counts == 2).all())
+    pairs = groups[counts == 2]
+    is_winding_consistent = bool((start[order[pairs]] != start[order[pairs + 1]]).all())
+    return int((counts == 1).sum()), is_watertight, is_winding_consistent
+
+
+def write_stl(f, vertices: np.ndarray, faces: np.ndarray):
+    """Write an indexed mesh as binary STL, a chunk of faces at a time."""
+    f.write(STL_HEADER)
+    f.write(struct.pack("<I", len(faces)))
+    for start in range(0, len(faces), stl.CHUNK_TRIANGLES):
+        tri = vertices[faces[start:start + stl.CHUNK_TRIANGLES]]
+        normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        records = np.zeros(len(tri), dtype=stl.BINARY_TRIANGLE)
+        records["normal"] = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+        records["vertices"] = tri
+        f.write(records.tobytes())
+
+
+def write_glb(f, vertices: np.ndarray, faces: np.ndarray):
+    """
+    Write an indexed mesh as binary glTF with float32 positions and uint32
+    indices, turned Z-up → Y-up by the node matrix. Buffers are written a
+    chunk at a time.
+    """
+    position_bytes = len(vertices) * 12
+    index_bytes = faces.size * 4
+    binary_length = position_bytes + index_bytes
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = Z_UP_TO_Y_UP
+    document = {
+        "asset": {"version": "2.0", "generator": "akaar-api"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "matrix": matrix.T.ravel().tolist()}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1}]}],
+        "buffers": [{"byteLength": binary_length}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": position_bytes, "target": 34962},
+            {"buffer": 0, "byteOffset": position_bytes, "byteLength": index_bytes, "target": 34963}
+        ],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5126,
+                "count": len(vertices),
+                "type": "VEC3",
+                "min": vertices.min(axis=0).tolist(),
+                "max": vertices.max(axis=0).tolist()
+            },
+            {
+                "bufferView": 1,
+                "componentType": 5125,
+                "count": int(faces.size),
+                "type": "SCALAR"
+            }
+        ]
+    }
+    json_bytes = json.dumps(document, separators=(",", ":")).encode()
+    json_bytes += b" " * (-len(json_bytes) % 4)
+
+    f.write(struct.pack("<III", GLB_MAGIC, 2, 12 + 8 + len(json_bytes) + 8 + binary_length))
+    f.write(struct.pack("<II", len(json_bytes), GLB_JSON))
+    f.write(json_bytes)
+    f.write(struct.pack("<II", binary_length, GLB_BIN))
+    for start in range(0, len(vertices), 3 * stl.CHUNK_TRIANGLES):
+        f.write(vertices[start:start + 3 * stl.CHUNK_TRIANGLES].astype("<f4").tobytes())
+    for start in range(0, len(faces), stl.CHUNK_TRIANGLES):
+        f.write(faces[start:start + stl.CHUNK_TRIANGLES].astype("<u4").tobytes())
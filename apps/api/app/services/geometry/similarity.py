@@ -0,0 +1,145 @@
+"""
+Nearest-neighbour index over shape fingerprints (see ``fingerprint``).
+
+The index keeps signatures sorted by surface area. Near duplicates have
+nearly equal areas, so a lookup binary-searches the tolerance window
+around the query's area and only compares the signatures inside it; the
+cost stays flat as the index grows to hundreds of thousands of models.
+"""
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from redis.exceptions import RedisError
+
+from ...core.config import settings
+from .cache import analysis_cache
+from .fingerprint import FINGERPRINT_VERSION, SIGNATURE, AREA_SCALAR, decode, distance
+
+# Pending inserts merged into the sorted arrays at once
+MERGE_BATCH = 1024
+
+
+class FingerprintIndex:
+    """
+    Signatures of every analyzed model, keyed by ``"<ext>:<digest>"``.
+
+    Each API process keeps the whole index in memory, loaded from a Redis
+    hash at startup; new signatures are written through to Redis so other
+    processes pick them up on their next start.
+    """
+
+    def __init__(self, cache, scalar_tolerance: float, shape_tolerance: float):
+        self.cache = cache
+        self.scalar_tolerance = scalar_tolerance
+        self.shape_tolerance = shape_tolerance
+        self._keys = np.zeros(0, dtype=object)
+        self._signatures = np.zeros(0, dtype=SIGNATURE)
+        self._known = set()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @property
+    def redis_key(self) -> str:
+        return f"geometry:fingerprints:v{FINGERPRINT_VERSION}"
+
+    def __len__(self):
+        return len(self._known)
+
+    async def load(self):
+        """Fill the index from Redis. Redis being down leaves it empty."""
+        client = self.cache.client()
+        if client is None:
+            return
+        started = time.monotonic()
+        try:
+            async for key, value in client.hscan_iter(self.redis_key, count=10000):
+                self._remember(key.decode(), decode(value), merge=False)
+        except RedisError:
+            self.cache.redis_failed()
+        with self._lock:
+            self._merge()
+        print(f"Loaded {len(self)} model fingerprints in {time.monotonic() - started:.1f}s")
+
+    async def add(self, digest: str, file_ext: str, signature: np.ndarray):
+        key = f"{file_ext.lstrip('.')}:{digest}"
+        if not self._remember(key, signature):
+            return
+        client = self.cache.client()
+        if client is None:
+            return
+        try:
+            await client.hset(self.redis_key, key, signature.tobytes())
+        except RedisError:
+            self.cache.redis_failed()
+
+    def nearest(self, signature: np.ndarray, limit: Optional[int] = 1, exclude: str = None) -> list:
+        """
+        Up to ``limit`` (None for all) near duplicates of ``signature``,
+        closest first, as ``(digest, file_ext, distance)``. ``exclude``
+        skips one digest, normally the query's own.
+        """
+        with self._lock:
+            self._merge()
+            keys, signatures = self._keys, self._signatures
+
+        # Near duplicates can only sit within the tolerance window on area
+        area = signatures["scalars"][:, AREA_SCALAR]
+        target = float(signature["scalars"][AREA_SCALAR])
+        lo = np.searchsorted(area, target - self.scalar_tolerance, side="left")
+        hi = np.searchsorted(area, target + self.scalar_tolerance, side="right")
+        if lo == hi:
+            return []
+
+        scores = distance(signature, signatures[lo:hi], self.scalar_tolerance, self.shape_tolerance)
+        matches = []
+        for i in np.argsort(scores, kind="stable"):
+            if scores[i] > 1 or len(matches) == limit:
+                break
+            ext, digest = keys[lo + i].split(":", 1)
+            if digest != exclude:
+                matches.append((digest, f".{ext}", float(scores[i])))
+        return matches
+
+    def clear(self):
+        with self._lock:
+            self._keys = np.zeros(0, dtype=object)
+            self._signatures = np.zeros(0, dtype=SIGNATURE)
+            self._known.clear()
+            self._pending.clear()
+
+    def _remember(self, key: str, signature: np.ndarray, merge: bool = True) -> bool:
+        with self._lock:
+            if key in self._known:
+                return False
+            self._known.add(key)
+            self._pending.append((key, signature))
+            if merge and len(self._pending) >= MERGE_BATCH:
+                self._merge()
+            return True
+
+    def _merge(self):
+        # Insert pending signatures into the area-sorted arrays in one pass
+        if not self._pending:
+            return
+        keys = np.empty(len(self._pending), dtype=object)
+        keys[:] = [key for key, _ in self._pending]
+        signatures = np.array([signature for _, signature in self._pending], dtype=SIGNATURE)
+        order = np.argsort(signatures["scalars"][:, AREA_SCALAR], kind="stable")
+        keys, signatures = keys[order], signatures[order]
+
+        at = np.searchsorted(
+            self._signatures["scalars"][:, AREA_SCALAR],
+            signatures["scalars"][:, AREA_SCALAR]
+        )
+        self._keys = np.insert(self._keys, at, keys)
+        self._signatures = np.insert(self._signatures, at, signatures)
+        self._pending.clear()
+
+
+fingerprint_index = FingerprintIndex(
+    analysis_cache,
+    scalar_tolerance=settings.SIMILARITY_SCALAR_TOLERANCE,
+    shape_tolerance=settings.SIMILARITY_SHAPE_TOLERANCE
+)
@@ -0,0 +1,47 @@
+"""
+Spooling uploads to disk for worker processes.
+"""
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SpoolLimitExceeded(ValueError):
+    """Raised when a stream is larger than the allowed size."""
+
+
+def spool_to_disk(
+    fileobj,
+    suffix: str,
+    max_bytes: int = None,
+    directory: str = None
+) -> tuple[str, str]:
+    """
+    Copy a file-like object into a named temp file without buffering it in
+    memory. Returns the temp path and the SHA-256 of the contents.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as tmp:
+        try:
+            while chunk := fileobj.read(CHUNK_SIZE):
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise SpoolLimitExceeded("File exceeds the allowed size")
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            _unlink(tmp.name)
+            raise
+        return tmp.name, digest.hexdigest()
+
+
+def _unlink(path: str):
+    import os
+
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
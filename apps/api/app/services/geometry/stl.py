@@ -0,0 +1,367 @@
+"""
+Native STL ingest.
+
+Reads binary and ASCII STL straight from the spooled upload without copying
+the whole file: the upload is memory-mapped (or its in-memory buffer is used
+directly) and triangles are processed in fixed-size chunks of ``np.frombuffer``
+views, so the vertex data is never held in memory as a whole.
+
+Memory still grows with the mesh: the watertightness and winding checks
+keep a 64-bit key and a direction flag for every edge (27 bytes per
+triangle) and sort them all at the end, peaking at about 180 bytes per
+triangle, three to four times the size of the binary STL file. The other
+metrics use bounded memory.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+import mmap
+import re
+
+import numpy as np
+
+BINARY_HEADER_SIZE = 84
+BINARY_TRIANGLE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+# Triangles processed per chunk (~13 MB of raw binary STL)
+CHUNK_TRIANGLES = 1 << 18
+# Bytes of ASCII STL scanned per chunk
+ASCII_CHUNK_BYTES = 16 << 20
+
+_ASCII_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+_ASCII_LOOP_END = b"endloop"
+
+_U64 = np.uint64
+
+# Faces smaller than this (mm²) count as degenerate
+DEGENERATE_AREA = 1e-8
+
+
+class STLFormatError(ValueError):
+    """Raised when the data is not an STL file this parser understands."""
+
+
+class EmptyMeshError(ValueError):
+    """Raised when a well-formed STL file contains no triangles."""
+
+
+@dataclass
+class MeshStats:
+    volume: float
+    area: float
+    bounds: np.ndarray
+    triangle_count: int
+    is_watertight: bool
+    is_winding_consistent: bool
+    degenerate_count: int
+
+
+@contextmanager
+def map_upload(fileobj):
+    """
+    Yield a read-only buffer over an uploaded file without reading it into
+    a new bytes object. Accepts a SpooledTemporaryFile, a real file or a
+    BytesIO.
+    """
+    raw = getattr(fileobj, "_file", fileobj)
+    if hasattr(raw, "getbuffer"):
+        view = raw.getbuffer()
+        try:
+            yield view
+        finally:
+            _release(view.release)
+        return
+
+    raw.flush()
+    raw.seek(0, 2)
+    if raw.tell() == 0:
+        yield memoryview(b"")
+        return
+
+    mapped = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield mapped
+    finally:
+        _release(mapped.close)
+
+
+def _release(close):
+    # Views created from the buffer may still be alive in a traceback; the
+    # buffer is freed with them in that case.
+    try:
+        close()
+    except BufferError:
+        pass
+
+
+def analyze_stl(fileobj, progress=None) -> MeshStats:
+    """
+    Compute volume, area, bounds, triangle count, watertightness, winding
+    consistency and degenerate face count in one pass.
+
+    ``progress``, if given, is called with the fraction of the file
+    processed after each chunk.
+    """
+    with map_upload(fileobj) as buf:
+        return analyze_stl_buffer(buf, progress)
+
+
+def analyze_stl_buffer(buf, progress=None) -> MeshStats:
+    count = _binary_count(buf)
+    if count is not None:
+        return _analyze_binary(buf, count, progress)
+
+    if _is_ascii(buf):
+        return _analyze_ascii(buf, progress)
+
+    raise STLFormatError("Not a binary or ASCII STL file")
+
+
+def analyze_triangles(triangles: np.ndarray) -> MeshStats:
+    """``analyze_stl`` for triangles already in memory, as an (n, 3, 3) array."""
+    acc = _Accumulator()
+    for start in range(0, len(triangles), CHUNK_TRIANGLES):
+        acc.add(triangles[start:start + CHUNK_TRIANGLES])
+    return acc.result()
+
+
+def iter_triangles(buf):
+    """Yield triangle chunks from a binary or ASCII STL buffer."""
+    count = _binary_count(buf)
+    if count is not None:
+        return iter_binary_triangles(buf, count)
+    if _is_ascii(buf):
+        return iter_ascii_triangles(buf)
+    raise STLFormatError("Not a binary or ASCII STL file")
+
+
+def load_triangles(buf) -> np.ndarray:
+    """
+    All triangles of an STL buffer as one (n, 3, 3) array. For binary STL
+    this is a zero-copy view over the buffer, so it must not outlive it.
+    """
+    count = _binary_count(buf)
+    if count is not None:
+        records = np.frombuffer(buf, dtype=BINARY_TRIANGLE, count=count, offset=BINARY_HEADER_SIZE)
+        return records["vertices"]
+    chunks = list(iter_triangles(buf))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 3, 3))
+
+
+def _binary_count(buf):
+    """Triangle count if ``buf`` is sized like a binary STL, else None."""
+    return binary_count(buf, len(buf))
+
+
+def binary_count(head, size: int):
+    """
+    Triangle count if a file of ``size`` bytes starting with ``head`` is
+    sized like a binary STL, else None.
+    """
+    if size >= BINARY_HEADER_SIZE and len(head) >= BINARY_HEADER_SIZE:
+        count = int(np.frombuffer(head, dtype="<u4", count=1, offset=80)[0])
+        if size == BINARY_HEADER_SIZE + count * BINARY_TRIANGLE.itemsize:
+            return count
+    return None
+
+
+def read_binary_stream(chunks, count: int, progress=None):
+    """
+    Parse a binary STL arriving as byte chunks split anywhere, header
+    included, for sources that cannot be memory-mapped. Returns
+    ``(stats, triangles)``; the (n, 3, 3) float32 triangle array is filled
+    as chunks arrive, so nothing but it and one chunk is held in memory.
+    """
+    record = BINARY_TRIANGLE.itemsize
+    triangles = np.empty((count, 3, 3), dtype=np.float32)
+    acc = _Accumulator()
+    pending = bytearray()
+    header = BINARY_HEADER_SIZE
+    for chunk in chunks:
+        if header:
+            skipped = min(header, len(chunk))
+            chunk = memoryview(chunk)[skipped:]
+            header -= skipped
+        pending += chunk
+        usable = len(pending) // record * record
+        if not usable:
+            continue
+        if acc.count + usable // record > count:
+            raise STLFormatError("Binary STL is longer than its header says")
+
+        block = triangles[acc.count:acc.count + usable // record]
+        block[:] = np.frombuffer(pending[:usable], dtype=BINARY_TRIANGLE)["vertices"]
+        del pending[:usable]
+        acc.add(block)
+        if progress is not None:
+            progress(acc.count / count)
+
+    if header or pending or acc.count != count:
+        raise STLFormatError("Binary STL ended early")
+    return acc.result(), triangles
+
+
+def _is_ascii(buf) -> bool:
+    return bytes(buf[:512]).lstrip().lower().startswith(b"solid")
+
+
+def iter_binary_triangles(buf, count: int):
+    """Yield (n, 3, 3) float32 views of binary STL triangles, chunk by chunk."""
+    records = np.frombuffer(buf, dtype=BINARY_TRIANGLE, count=count, offset=BINARY_HEADER_SIZE)
+    for start in range(0, count, CHUNK_TRIANGLES):
+        yield records["vertices"][start:start + CHUNK_TRIANGLES]
+
+
+def iter_ascii_triangles(buf, progress=None):
+    """Yield (n, 3, 3) float64 triangle arrays from an ASCII STL buffer."""
+    size = len(buf)
+    start = 0
+    while start < size:
+        end = min(start + ASCII_CHUNK_BYTES, size)
+        chunk = bytes(buf[start:end])
+        if end < size:
+            # Cut after the last complete facet loop so no triangle is split
+            cut = chunk.rfind(_ASCII_LOOP_END)
+            if cut == -1:
+                raise STLFormatError("ASCII STL facet exceeds chunk size")
+            cut += len(_ASCII_LOOP_END)
+            chunk = chunk[:cut]
+            end = start + cut
+        start = end
+        if progress is not None:
+            progress(start / size)
+
+        matches = _ASCII_VERTEX.findall(chunk)
+        if not matches:
+            continue
+        if len(matches) % 3:
+            raise STLFormatError("ASCII STL facet does not have three vertices")
+        try:
+            vertices = np.array(matches, dtype=np.float64)
+        except ValueError:
+            raise STLFormatError("Invalid vertex coordinates in ASCII STL")
+        yield vertices.reshape(-1, 3, 3)
+
+
+def _analyze_binary(buf, count: int, progress=None) -> MeshStats:
+    acc = _Accumulator()
+    for triangles in iter_binary_triangles(buf, count):
+        acc.add(triangles)
+        if progress is not None:
+            progress(acc.count / count)
+    return acc.result()
+
+
+def _analyze_ascii(buf, progress=None) -> MeshStats:
+    acc = _Accumulator()
+    for triangles in iter_ascii_triangles(buf, progress):
+        acc.add(triangles)
+    return acc.result()
+
+
+class _Accumulator:
+    """Running totals over triangle chunks."""
+
+    def __init__(self):
+        self.volume = 0.0
+        self.area = 0.0
+        self.lower = np.full(3, np.inf)
+        self.upper = np.full(3, -np.inf)
+        self.count = 0
+        self.degenerate = 0
+        self.edge_keys = []
+        self.edge_flips = []
+
+    def add(self, triangles: np.ndarray):
+        if len(triangles) == 0:
+            return
+        tri = triangles.astype(np.float64)
+        v0, v1, v2 = tri[:, 0], tri[:, 1], tri[:, 2]
+
+        cross = np.cross(v1 - v0, v2 - v0)
+        face_areas = 0.5 * np.sqrt((cross * cross).sum(axis=1))
+        self.area += float(face_areas.sum())
+        self.degenerate += int((face_areas < DEGENERATE_AREA).sum())
+        # Signed volume of the tetrahedra formed with the origin
+        self.volume += float(np.einsum("ij,ij->", v0, np.cross(v1, v2))) / 6.0
+
+        flat = tri.reshape(-1, 3)
+        np.minimum(self.lower, flat.min(axis=0), out=self.lower)
+        np.maximum(self.upper, flat.max(axis=0), out=self.upper)
+
+        self.count += len(tri)
+        keys, flips = _edge_keys(triangles)
+        self.edge_keys.append(keys)
+        self.edge_flips.append(flips)
+
+    def result(self) -> MeshStats:
+        if self.count == 0:
+            raise EmptyMeshError("STL file contains no triangles")
+        is_watertight, is_winding_consistent = _edge_topology(
+            np.concatenate(self.edge_keys), np.concatenate(self.edge_flips)
+        )
+        return MeshStats(
+            volume=self.volume,
+            area=self.area,
+            bounds=np.vstack([self.lower, self.upper]),
+            triangle_count=self.count,
+            is_watertight=is_watertight,
+            is_winding_consistent=is_winding_consistent,
+            degenerate_count=self.degenerate,
+        )
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer; uint64 arithmetic wraps by design."""
+    with np.errstate(over="ignore"):
+        x = x + _U64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> _U64(30))) * _U64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> _U64(27))) * _U64(0x94D049BB133111EB)
+        return x ^ (x >> _U64(31))
+
+
+def _vertex_keys(triangles: np.ndarray) -> np.ndarray:
+    """64-bit hash of each vertex position, shape (n, 3)."""
+    # Adding 0.0 folds -0.0 into +0.0 so both hash the same
+    coords = triangles.astype(np.float32) + np.float32(0.0)
+    bits = coords.view(np.uint32).astype(_U64)
+    key = _mix(bits[..., 0])
+    key = _mix(key ^ bits[..., 1])
+    return _mix(key ^ bits[..., 2])
+
+
+def _edge_keys(triangles: np.ndarray):
+    """
+    Order-independent 64-bit hash of every triangle edge, plus whether the
+    face traverses that edge from the higher to the lower vertex key.
+    """
+    a = _vertex_keys(triangles)
+    b = np.roll(a, -1, axis=1)
+    lo = np.minimum(a, b)
+    hi = np.maximum(a, b)
+    return _mix(lo ^ _mix(hi)).ravel(), (a > b).ravel()
+
+
+def _edge_topology(edge_keys: np.ndarray, edge_flips: np.ndarray):
+    """
+    Return ``(is_watertight, is_winding_consistent)`` matching trimesh's
+    definitions on vertex-merged meshes: watertight when every edge is
+    shared by exactly two faces, consistent when every such pair of faces
+    traverses the edge in opposite directions.
+    """
+    if len(edge_keys) == 0:
+        return False, False
+    order = np.argsort(edge_keys, kind="stable")
+    keys = edge_keys[order]
+    flips = edge_flips[order]
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    counts = np.diff(np.append(starts, len(keys)))
+    is_watertight = bool((counts == 2).all())
+
+    pairs = starts[counts == 2]
+    is_winding_consistent = bool((flips[pairs] != flips[pairs + 1]).all())
+    return is_watertight, is_winding_consistent
@@ -0,0 +1,138 @@
+"""
+Celery tasks for geometry work that should not run inside an HTTP request.
+"""
+import os
+import tempfile
+import time
+
+from ...core.celery_app import celery_app
+from ...core.config import settings
+from . import analysis, compact, objects, previews
+
+# Minimum seconds between progress updates written to the result backend
+PROGRESS_INTERVAL = 0.5
+
+# Formats the preview builder can load
+PREVIEW_EXTENSIONS = {".stl", ".obj", ".ply", ".off", ".gltf", ".glb"}
+
+
+@celery_app.task(bind=True, name="geometry.inspect")
+def inspect_task(self, path: str, file_ext: str, digest: str, checks: bool = False) -> dict:
+    """
+    Inspect a spooled model file and delete it afterwards. The result
+    carries the digest so the API can populate the analysis cache. With
+    ``checks``, the printability checks run too.
+    """
+    last_update = 0.0
+
+    def progress(fraction: float):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update >= PROGRESS_INTERVAL:
+            last_update = now
+            self.update_state(state="PROGRESS", meta={"progress": round(fraction, 3)})
+
+    try:
+        inspection = analysis.inspect_path(path, file_ext, progress, checks)
+    finally:
+        os.unlink(path)
+
+    return {"digest": digest, "fileExt": file_ext, "inspection": inspection}
+
+
+@celery_app.task(bind=True, name="geometry.inspect_object")
+def inspect_object_task(
+    self, key: str, file_ext: str, size: int, etag: str = None, record_digest: bool = False,
+    digest: str = None
+) -> dict:
+    """
+    Inspect a model already stored in S3, streamed with ranged reads. With
+    ``record_digest`` (direct uploads), its SHA-256 is stored on the object.
+    A known ``digest`` lets its compact form be read instead.
+    """
+    last_update = 0.0
+
+    def progress(fraction: float):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update >= PROGRESS_INTERVAL:
+            last_update = now
+            self.update_state(state="PROGRESS", meta={"progress": round(fraction, 3)})
+
+    return objects.inspect_object(key, file_ext, size, etag, progress, record_digest, digest)
+
+
+@celery_app.task(name="geometry.previews", ignore_result=True)
+def previews_task(path: str, file_ext: str, digest: str) -> dict:
+    """Build LOD previews for a spooled model file and delete it afterwards."""
+    try:
+        return previews.build_previews(path, file_ext, digest)
+    finally:
+        previews.release(digest)
+        os.unlink(path)
+
+
+@celery_app.task(name="geometry.ingest", ignore_result=True)
+def ingest_task(path: str, file_ext: str, digest: str, build_previews: bool):
+    """
+    Store the compact form of a spooled model uploaded to S3 and, with
+    ``build_previews``, build its previews from that; then delete the file.
+    """
+    compact_path = None
+    try:
+        try:
+            data = objects.store_compact(path, file_ext, digest)
+        except Exception as e:
+            # Readers fall back to the original
+            print(f"Could not store the compact form of {digest}: {e}")
+            data = None
+        if build_previews:
+            source, source_ext = path, file_ext
+            if data is not None:
+                # Loading the compact form is much faster than parsing text formats
+                with tempfile.NamedTemporaryFile(
+                    delete=False, suffix=compact.COMPACT_EXT, dir=settings.GEOMETRY_JOB_DIR
+                ) as tmp:
+                    tmp.write(data)
+                compact_path = source = tmp.name
+                source_ext = compact.COMPACT_EXT
+            previews.build_previews(source, source_ext, digest)
+    finally:
+        if build_previews:
+            previews.release(digest)
+        if compact_path is not None:
+            os.unlink(compact_path)
+        os.unlink(path)
+
+
+def queue_ingest(path: str, file_ext: str, digest: str) -> bool:
+    """
+    Hand a spooled model that was stored in S3 to a worker, to store its
+    compact form and build previews if it has none. True if the task now
+    owns ``path``.
+    """
+    if file_ext not in PREVIEW_EXTENSIONS:
+        return False
+    build_previews = previews.claim(digest)
+    try:
+        ingest_task.apply_async((path, file_ext, digest, build_previews))
+    except Exception:
+        if build_previews:
+            previews.release(digest)
+        raise
+    return True
+
+
+def queue_previews(path: str, file_ext: str, digest: str) -> bool:
+    """
+    Hand a spooled model to a worker for preview generation unless its
+    previews exist or are being built. True if the task now owns ``path``.
+    """
+    if file_ext not in PREVIEW_EXTENSIONS or not previews.claim(digest):
+        return False
+    try:
+        previews_task.apply_async((path, file_ext, digest))
+    except Exception:
+        previews.release(digest)
+        raise
+    return True
@@ -0,0 +1,170 @@
+"""
+CPU thumbnails of meshes, so listing pages can show a plain image instead
+of mounting a WebGL canvas per model.
+
+The renderer is a vectorized z-buffer: every triangle is expanded into the
+pixels of its screen bounding box, pixel centres inside the triangle get an
+interpolated depth, and one ``np.minimum.at`` over 64-bit keys (depth in
+the high half, face index in the low half) resolves visibility and records
+the visible face in a single pass. Faces are shaded flat with a headlight
+and fill light. The image is rendered at ``SUPERSAMPLE`` times the output
+size and downsampled for anti-aliasing.
+"""
+import numpy as np
+from PIL import Image
+
+# Triangles per chunk when projecting a memory-mapped mesh
+RENDER_CHUNK = 1 << 18
+# Cap on (triangle, pixel) pairs tested at once
+MAX_PAIRS = 1 << 23
+SUPERSAMPLE = 2
+# Fraction of the image left empty around the model
+MARGIN = 0.06
+
+BASE_COLOR = np.array([0.62, 0.66, 0.72])
+AMBIENT = 0.28
+# Light directions in camera space (x right, y up, z towards the viewer)
+KEY_LIGHT = np.array([-0.35, 0.55, 0.76])
+FILL_LIGHT = np.array([0.6, -0.2, 0.77])
+KEY_WEIGHT = 0.62
+FILL_WEIGHT = 0.2
+
+EMPTY = np.iinfo(np.uint64).max
+DEPTH_LEVELS = (1 << 32) - 2
+
+
+def view_rotation(azimuth: float = 45.0, elevation: float = 30.0) -> np.ndarray:
+    """
+    World → camera rotation for the canonical view: looking down at the
+    part from the front-right, with the print's Z axis pointing up.
+    """
+    a, e = np.radians(azimuth), np.radians(elevation)
+    # Turn the model about Z, then tilt it towards the camera
+    spin = np.array([[np.cos(a), -np.sin(a), 0], [np.sin(a), np.cos(a), 0], [0, 0, 1]])
+    z_up = np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]])
+    tilt = np.array([[1, 0, 0], [0, np.cos(e), -np.sin(e)], [0, np.sin(e), np.cos(e)]])
+    return tilt @ z_up @ spin
+
+
+def render_thumbnail(triangles, size: int = 256, bounds=None) -> Image.Image:
+    """
+    Render an (n, 3, 3) triangle array to a ``size`` × ``size`` RGBA image.
+    Pass ``bounds`` (min and max corners) if known to save a pass.
+    """
+    full = size * SUPERSAMPLE
+    n = len(triangles)
+    if n == 0:
+        return Image.new("RGBA", (size, size))
+
+    rotation = view_rotation()
+    lo, hi = bounds if bounds is not None else _bounds(triangles)
+    corners = np.array([[x, y, z] for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+    projected = corners @ rotation.T
+    view_lo, view_hi = projected.min(axis=0), projected.max(axis=0)
+    center = (view_lo + view_hi) / 2
+    scale = full * (1 - 2 * MARGIN) / max(float((view_hi - view_lo)[:2].max()), 1e-9)
+    depth_range = max(float(view_hi[2] - view_lo[2]), 1e-9)
+
+    zbuffer = np.full(full * full, EMPTY, dtype=np.uint64)
+    for start in range(0, n, RENDER_CHUNK):
+        chunk = np.asarray(triangles[start:start + RENDER_CHUNK], dtype=np.float64)
+        tri = (chunk.reshape(-1, 3) @ rotation.T).reshape(-1, 3, 3)
+        screen_x = (tri[:, :, 0] - center[0]) * scale + full / 2
+        screen_y = full / 2 - (tri[:, :, 1] - center[1]) * scale
+        # Nearer is smaller so the minimum wins
+        depth = (view_hi[2] - tri[:, :, 2]) / depth_range * DEPTH_LEVELS
+        _rasterize(zbuffer, full, screen_x, screen_y, depth, start)
+
+    covered = zbuffer != EMPTY
+    faces = (zbuffer[covered] & 0xFFFFFFFF).astype(np.int64)
+    unique_faces, inverse = np.unique(faces, return_inverse=True)
+    shade = _shade(np.asarray(triangles[unique_faces], dtype=np.float64) @ rotation.T)
+
+    pixels = np.zeros((full * full, 4), dtype=np.uint8)
+    pixels[covered, :3] = np.clip(shade[inverse.ravel()] * 255, 0, 255).astype(np.uint8)
+    pixels[covered, 3] = 255
+    image = Image.fromarray(pixels.reshape(full, full, 4), "RGBA")
+    return image.resize((size, size), Image.Resampling.BOX) if SUPERSAMPLE > 1 else image
+
+
+def _bounds(triangles):
+    lo = np.full(3, np.inf)
+    hi = np.full(3, -np.inf)
+    for start in range(0, len(triangles), RENDER_CHUNK):
+        corners = np.asarray(triangles[start:start + RENDER_CHUNK]).reshape(-1, 3)
+        lo = np.minimum(lo, corners.min(axis=0))
+        hi = np.maximum(hi, corners.max(axis=0))
+    return lo, hi
+
+
+def _rasterize(zbuffer, full: int, xs, ys, depth, face_offset: int):
+    # Range of pixels whose centres fall inside each face's bounding box.
+    # Element-wise min/max: reducing along an axis of length 3 is slow.
+    (ax, bx, cx), (ay, by, cy) = xs.T, ys.T
+    x0 = np.maximum(np.ceil(np.minimum(np.minimum(ax, bx), cx) - 0.5), 0).astype(np.int64)
+    x1 = np.minimum(np.floor(np.maximum(np.maximum(ax, bx), cx) - 0.5), full - 1).astype(np.int64)
+    y0 = np.maximum(np.ceil(np.minimum(np.minimum(ay, by), cy) - 0.5), 0).astype(np.int64)
+    y1 = np.minimum(np.floor(np.maximum(np.maximum(ay, by), cy) - 0.5), full - 1).astype(np.int64)
+    widths = x1 - x0 + 1
+    counts = np.maximum(widths, 0) * np.maximum(y1 - y0 + 1, 0)
+
+    # Twice the signed screen area; zero-area faces cover nothing, and
+    # faces between pixel centres are skipped too
+    area = (bx - ax) * (cy - ay) - (cx - ax) * (by - ay)
+    faces = np.flatnonzero((np.abs(area) > 1e-12) & (counts > 0))
+    ax, bx, cx, ay, by, cy, area = (v[faces] for v in (ax, bx, cx, ay, by, cy, area))
+    za, zb, zc = depth[faces].T
+
+    # Barycentrics and depth are affine in the pixel position, so each face
+    # reduces to three planes: value = u * px + v * py + w
+    planes = np.empty((len(faces), 9))
+    planes[:, 0:3] = np.stack([by - cy, cx - bx, bx * cy - cx * by], axis=1) / area[:, None]
+    planes[:, 3:6] = np.stack([cy - ay, ax - cx, cx * ay - ax * cy], axis=1) / area[:, None]
+    planes[:, 6:9] = (
+        planes[:, 0:3] * (za - zc)[:, None] + planes[:, 3:6] * (zb - zc)[:, None]
+    )
+    planes[:, 8] += zc
+
+    # Split into batches whose pixel expansion stays under MAX_PAIRS
+    counts, x0, y0, widths = counts[faces], x0[faces], y0[faces], widths[faces]
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(faces):
+        done = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, done + MAX_PAIRS, side="right")), start + 1)
+        batch = slice(start, end)
+        _fill(
+            zbuffer, full, counts[batch], x0[batch], y0[batch], widths[batch],
+            planes[batch], faces[batch] + face_offset
+        )
+        start = end
+
+
+def _fill(zbuffer, full, counts, x0, y0, widths, planes, face_ids):
+    pair = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = widths[pair]
+    px = x0[pair] + local % width
+    py = y0[pair] + local // width
+    cx, cy = px + 0.5, py + 0.5
+
+    p = planes[pair]
+    b0 = p[:, 0] * cx + p[:, 1] * cy + p[:, 2]
+    b1 = p[:, 3] * cx + p[:, 4] * cy + p[:, 5]
+    inside = (b0 >= 0) & (b1 >= 0) & (b0 + b1 <= 1)
+
+    p = p[inside]
+    z = p[:, 6] * cx[inside] + p[:, 7] * cy[inside] + p[:, 8]
+    keys = (np.clip(z, 0, DEPTH_LEVELS).astype(np.uint64) << np.uint64(32)) | face_ids[pair[inside]].astype(np.uint64)
+    np.minimum.at(zbuffer, py[inside] * full + px[inside], keys)
+
+
+def _shade(tri: np.ndarray) -> np.ndarray:
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    # Two-sided: meshes with flipped faces still shade sensibly
+    key = np.abs(normals @ (KEY_LIGHT / np.linalg.norm(KEY_LIGHT)))
+    fill = np.abs(normals @ (FILL_LIGHT / np.linalg.norm(FILL_LIGHT)))
+    intensity = AMBIENT + KEY_WEIGHT * key + FILL_WEIGHT * fill
+    return intensity[:, None] * BASE_COLOR
@@ -0,0 +1,202 @@
+"""
+Per-stage timing for the geometry pipeline.
+
+Every /geometry request gets a ``StageTimer`` (set up by the middleware in
+``main``). The API records its own stages (upload, spool, cache, queue) and
+pool jobs run under ``timed``, which records the stages the analysis code
+marks with ``stage`` together with the worker's peak RSS during each one.
+When the request finishes the stages go out as a ``Server-Timing`` header
+and into Prometheus histograms labelled by file type and triangle-count
+bucket.
+
+Peak RSS comes from the kernel's high-water mark, reset at the start of
+each stage through ``/proc/self/clear_refs``. Stages therefore must not
+nest. Where that file is unavailable no memory is reported.
+
+With DEBUG on, a request carrying ``X-Debug-Profile: 1`` also runs its pool
+job under cProfile and dumps the stats to ``GEOMETRY_PROFILE_DIR``. Only
+the job is profiled (parsing and analysis in the worker process); the
+API's own stages (upload, spool, cache, queue) appear in Server-Timing
+only.
+"""
+from contextlib import contextmanager, nullcontext
+import contextvars
+import cProfile
+import os
+import tempfile
+import time
+import uuid
+
+from prometheus_client import Histogram
+
+from ...core.config import settings
+
+STAGE_SECONDS = Histogram(
+    "geometry_stage_seconds",
+    "Time spent in each stage of a geometry request",
+    ["stage", "file_type", "triangles"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+STAGE_PEAK_BYTES = Histogram(
+    "geometry_stage_peak_bytes",
+    "Peak resident memory of the geometry worker during each stage",
+    ["stage", "file_type", "triangles"],
+    buckets=tuple(float(1 << shift) for shift in range(26, 36))  # 64 MiB .. 32 GiB
+)
+
+# Upper bounds of the triangle-count label buckets
+TRIANGLE_BUCKETS = [
+    (10_000, "<10k"),
+    (100_000, "10k-100k"),
+    (1_000_000, "100k-1M"),
+    (10_000_000, "1M-10M"),
+]
+
+# The timer of the request being handled (API side) and of the pool job
+# running under ``timed`` (worker side). Kept apart so code that happens to
+# run in the API process, e.g. eager Celery tasks, never records stages.
+_request = contextvars.ContextVar("geometry_request_timer", default=None)
+_job = contextvars.ContextVar("geometry_job_timer", default=None)
+
+
+class StageTimer:
+    """Durations (and worker peak RSS) of the stages of one request."""
+
+    def __init__(self, profile: bool = False):
+        self.started = time.perf_counter()
+        # (name, seconds, peak bytes or None)
+        self.stages = []
+        self.file_type = None
+        self.triangle_count = None
+        self.profile_path = None
+        if profile:
+            directory = settings.GEOMETRY_PROFILE_DIR or os.path.join(
+                tempfile.gettempdir(), "akaar-profiles"
+            )
+            os.makedirs(directory, exist_ok=True)
+            self.profile_path = os.path.join(directory, f"{int(time.time())}-{uuid.uuid4().hex[:8]}.prof")
+
+    @contextmanager
+    def stage(self, name: str, track_memory: bool = False):
+        tracking = track_memory and reset_peak_rss()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, peak_rss() if tracking else None)
+
+    def add(self, name: str, seconds: float, peak_bytes: int = None):
+        self.stages.append((name, seconds, peak_bytes))
+
+    def since_start(self, name: str):
+        """Record the time from the start of the request as one stage."""
+        self.add(name, time.perf_counter() - self.started)
+
+    def label(self, file_ext: str, triangle_count: int = None):
+        self.file_type = file_ext.lstrip(".")
+        self.triangle_count = triangle_count
+
+    def server_timing(self) -> str:
+        entries = []
+        for name, seconds, peak in self.stages:
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if peak is not None:
+                entry += f';desc="peak {peak / (1 << 20):.0f}MB"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+    def observe(self):
+        """Record every stage in the histograms; unlabelled requests are skipped."""
+        if self.file_type is None:
+            return
+        triangles = triangle_bucket(self.triangle_count)
+        for name, seconds, peak in self.stages:
+            STAGE_SECONDS.labels(name, self.file_type, triangles).observe(seconds)
+            if peak is not None:
+                STAGE_PEAK_BYTES.labels(name, self.file_type, triangles).observe(peak)
+
+
+def triangle_bucket(count) -> str:
+    if count is None:
+        return "unknown"
+    for limit, label in TRIANGLE_BUCKETS:
+        if count < limit:
+            return label
+    return ">=10M"
+
+
+def start_request(profile: bool = False) -> StageTimer:
+    timer = StageTimer(profile)
+    _request.set(timer)
+    return timer
+
+
+def request_timer() -> StageTimer:
+    """The timer of the current request; a throwaway one outside requests."""
+    timer = _request.get()
+    return timer if timer is not None else StageTimer()
+
+
+def stage(name: str):
+    """
+    Mark a stage inside pool job code. Only records when the job runs under
+    ``timed``; otherwise it costs nothing.
+    """
+    timer = _job.get()
+    return timer.stage(name, track_memory=True) if timer is not None else nullcontext()
+
+
+async def run_timed(pool, fn, *args, timeout: float = None):
+    """
+    ``pool.run(fn, *args)``, recording the time the job waited for a worker
+    and the stages it marked in the current request's timer.
+    """
+    timer = request_timer()
+    submitted = time.time()
+    outcome = await pool.run(timed, timer.profile_path, fn, *args, timeout=timeout)
+    timer.add("queue", max(outcome["started"] - submitted, 0.0))
+    timer.stages.extend(outcome["stages"])
+    return outcome["result"]
+
+
+def timed(profile_path, fn, *args) -> dict:
+    """
+    Run ``fn(*args)`` in a worker with a fresh timer. Returns the result,
+    the recorded stages and the wall-clock start time (for queue wait).
+    """
+    started = time.time()
+    timer = StageTimer()
+    token = _job.set(timer)
+    profiler = cProfile.Profile() if profile_path else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        result = fn(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        _job.reset(token)
+    return {"result": result, "stages": timer.stages, "started": started}
+
+
+def reset_peak_rss() -> bool:
+    """Reset this process's peak RSS to its current RSS; False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak RSS of this process in bytes since the last reset, or None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
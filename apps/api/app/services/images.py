@@ -0,0 +1,134 @@
+"""
+Responsive derivatives of uploaded images.
+
+Each upload is resized to the configured widths (never upscaled) and
+encoded as AVIF (when this Pillow build can write it) and WebP, or JPEG
+if neither is available. EXIF orientation is applied and then all
+metadata except the ICC colour profile is dropped.
+
+Camera JPEGs are decoded with ``Image.draft``, which has libjpeg scale the
+image down by up to 8x while decoding, so a 24-megapixel photo never
+exists in memory at full size. Smaller widths are resized from the
+largest one with a ``reducing_gap``, which box-reduces by an integer
+factor before resampling.
+
+Runs in the geometry worker pool; derivatives come back as bytes for the
+API to store next to the original.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+from ..core.config import settings
+
+# Preferred first; each is written when this Pillow build supports it
+DERIVATIVE_FORMATS = [("AVIF", "avif", "image/avif"), ("WEBP", "webp", "image/webp")]
+FALLBACK_FORMAT = ("JPEG", "jpg", "image/jpeg")
+# Resample from at least this many times the target size after box reduction
+REDUCING_GAP = 2.0
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+def derivative_formats() -> list:
+    Image.init()
+    formats = [entry for entry in DERIVATIVE_FORMATS if entry[0] in Image.SAVE]
+    return formats or [FALLBACK_FORMAT]
+
+
+def build_derivatives(path: str) -> dict:
+    """
+    Decode the image at ``path`` and encode every derivative. Returns
+    ``{"width", "height", "derivatives"}`` where each derivative is
+    ``{"name", "width", "height", "format", "contentType", "data"}``.
+    """
+    Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+    try:
+        image = Image.open(path)
+        width, height = _oriented_size(image)
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise InvalidImageError(f"Images are limited to {settings.IMAGE_MAX_PIXELS} pixels")
+        widths = _target_widths(width)
+        # Only JPEG implements draft; it picks the smallest DCT scale that
+        # still covers the requested size
+        image.draft("RGB", _draft_size(image, widths[0], width))
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError:
+        # Raised by open() itself past twice the limit
+        raise InvalidImageError(f"Images are limited to {settings.IMAGE_MAX_PIXELS} pixels")
+    except (OSError, SyntaxError):
+        raise InvalidImageError("File is not a readable image")
+
+    icc_profile = image.info.get("icc_profile")
+    image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+
+    derivatives = []
+    for target in widths:
+        size = (target, max(1, round(height * target / width)))
+        resized = image if image.size == size else image.resize(
+            size, Image.LANCZOS, reducing_gap=REDUCING_GAP
+        )
+        # Later (smaller) widths resize from this one
+        image = resized
+        for pil_format, extension, content_type in derivative_formats():
+            encoded = io.BytesIO()
+            frame = resized.convert("RGB") if pil_format == "JPEG" and resized.mode == "RGBA" else resized
+            options = {"quality": settings.IMAGE_DERIVATIVE_QUALITY}
+            if icc_profile:
+                options["icc_profile"] = icc_profile
+            if pil_format == "JPEG":
+                options.update(optimize=True, progressive=True)
+            elif pil_format == "WEBP":
+                options["method"] = 4
+            frame.save(encoded, format=pil_format, **options)
+            derivatives.append({
+                "name": f"{target}w.{extension}",
+                "width": size[0],
+                "height": size[1],
+                "format": extension,
+                "contentType": content_type,
+                "data": encoded.getvalue()
+            })
+    return {"width": width, "height": height, "derivatives": derivatives}
+
+
+def srcset(derivatives: list, urls: dict) -> dict:
+    """``srcset`` strings by content type, for ``<source type=...>``."""
+    sets = {}
+    for derivative in derivatives:
+        sets.setdefault(derivative["contentType"], []).append(
+            f"{urls[derivative['name']]} {derivative['width']}w"
+        )
+    return {content_type: ", ".join(entries) for content_type, entries in sets.items()}
+
+
+def _target_widths(width: int) -> list:
+    """Widths to produce for an image ``width`` wide, largest first; never upscaled."""
+    configured = settings.IMAGE_DERIVATIVE_WIDTHS
+    widths = {w for w in configured if w <= width}
+    if not configured or width < max(configured):
+        # Narrower than the largest width: the largest derivative is full size
+        widths.add(width)
+    return sorted(widths, reverse=True)
+
+
+def _oriented_size(image) -> tuple:
+    """Size after EXIF rotation, read from the header without decoding."""
+    orientation = image.getexif().get(0x0112, 1)
+    width, height = image.size
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def _draft_size(image, target_width: int, oriented_width: int) -> tuple:
+    """Stored (pre-rotation) size to ask ``draft`` for, covering ``target_width``."""
+    scale = target_width / oriented_width
+    width, height = image.size
+    return (max(1, int(width * scale)), max(1, int(height * scale)))
+
+
+def _has_alpha(image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
@@ -0,0 +1,302 @@
+"""
+Content-addressed storage of uploaded models.
+
+Each distinct model is stored once, as a blob keyed by its SHA-256
+(``blobs/<name><ext>``, the name an HMAC of the digest; see
+``storage.content_name``). What a user owns is a reference: the
+``models/<user_id>/<uuid><ext>`` key /upload/model returns, a row in
+"ModelReference" pointing at the blob. "ModelBlob" counts each blob's
+references, and the blob is deleted from S3 with its last one, along with
+the compact copy made on ingest and the previews, unless another blob
+(the same bytes under another extension) still shares them.
+
+A blob's count only changes with its row locked, and the S3 object is
+only deleted, or found missing and uploaded again, under that lock. An
+upload of the same file racing a delete of its last reference therefore
+never ends up pointing at a removed blob.
+
+Claiming a stored blob without uploading it takes more than its digest,
+which previews make public: the client must hash byte ranges of the file
+chosen at random by the server (``new_challenge``), signed into a
+short-lived token so any API process can check the answer.
+
+Keys without a reference row are ordinary objects (stored before
+deduplication, or uploaded directly with a presigned POST); they resolve
+to themselves.
+
+Blocking (database and S3 calls); run through ``storage.call``.
+"""
+from datetime import datetime, timedelta, timezone
+import hashlib
+import hmac
+import os
+import secrets
+
+from botocore.exceptions import ClientError
+from jose import JWTError, jwt
+from sqlalchemy import bindparam, text
+
+from ..core.config import settings
+from .geometry import previews
+from .geometry.compact import compact_prefix
+from .storage import content_name, owns_key, upload_stream
+
+BLOB_PREFIX = "blobs/"
+CHALLENGE_TOKEN_TYPE = "model-claim"
+
+
+class ChallengeInvalid(LookupError):
+    """Raised for an unknown, expired or someone else's claim challenge."""
+
+
+def blob_key(digest: str, file_ext: str) -> str:
+    return f"{BLOB_PREFIX}{content_name(digest)}{file_ext}"
+
+
+def store(
+    db, client, bucket: str, user_id: str, key: str, filename: str,
+    digest: str, file_ext: str, path: str, content_type: str
+) -> bool:
+    """
+    Make ``key`` a reference to the blob holding the file at ``path``
+    (SHA-256 ``digest``), uploading it only if it is not stored yet.
+    Returns True if the blob was already stored.
+    """
+    blob = blob_key(digest, file_ext)
+    stored = _exists(client, bucket, blob)
+    if not stored:
+        _upload(client, bucket, blob, path, digest, content_type)
+    try:
+        # Locks the blob's row until commit; a delete of its last
+        # reference either finished before this or waits for it
+        db.execute(
+            text("""
+                INSERT INTO "ModelBlob" (key, digest, size, "refCount", "createdAt")
+                VALUES (:key, :digest, :size, 1, NOW())
+                ON CONFLICT (key) DO UPDATE SET "refCount" = "ModelBlob"."refCount" + 1
+            """),
+            {"key": blob, "digest": digest, "size": os.path.getsize(path)}
+        )
+        if not _exists(client, bucket, blob):
+            # Deleted with its last reference since the check above
+            _upload(client, bucket, blob, path, digest, content_type)
+            stored = False
+        _add_reference(db, key, user_id, blob, filename)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return stored
+
+
+def is_stored(db, digest: str, file_ext: str, size: int) -> bool:
+    """Whether a blob with this SHA-256 and size is stored (for a claim to be worth trying)."""
+    row = db.execute(
+        text('SELECT size FROM "ModelBlob" WHERE key = :key'),
+        {"key": blob_key(digest, file_ext)}
+    ).fetchone()
+    return row is not None and row.size == size
+
+
+def new_challenge(user_id: str, digest: str, file_ext: str, size: int) -> dict:
+    """
+    Random byte ranges, as ``[offset, length]``, of a ``size`` byte file
+    and a random nonce. A claim proves it has the file with the SHA-256 of
+    the nonce's bytes followed by each range; the nonce keeps that from
+    being the file's own digest when a range covers the whole file.
+    """
+    length = min(settings.CLAIM_PROOF_BYTES, size)
+    expires = datetime.now(timezone.utc) + timedelta(seconds=settings.CLAIM_CHALLENGE_TTL)
+    return {
+        "typ": CHALLENGE_TOKEN_TYPE,
+        "uid": user_id,
+        "sha256": digest,
+        "ext": file_ext,
+        "size": size,
+        "nonce": secrets.token_hex(16),
+        "ranges": [
+            [secrets.randbelow(size - length + 1), length] for _ in range(settings.CLAIM_PROOF_RANGES)
+        ],
+        "exp": int(expires.timestamp())
+    }
+
+
+def encode_challenge(challenge: dict) -> str:
+    return jwt.encode(challenge, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def decode_challenge(token: str, user_id: str) -> dict:
+    try:
+        challenge = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise ChallengeInvalid("Claim challenge not found or expired")
+    if challenge.get("typ") != CHALLENGE_TOKEN_TYPE or challenge.get("uid") != user_id:
+        raise ChallengeInvalid("Claim challenge not found or expired")
+    return challenge
+
+
+def claim(
+    db, client, bucket: str, user_id: str, key: str, filename: str,
+    challenge: dict, proofs: list
+) -> bool:
+    """
+    Make ``key`` a reference to the already stored blob a ``challenge``
+    was issued for, without the file being sent. ``proofs`` are the hex
+    answers to the challenge's byte ranges (see ``proof``). Returns False,
+    changing nothing, if there is no such blob or a proof is wrong.
+    """
+    blob = blob_key(challenge["sha256"], challenge["ext"])
+    try:
+        row = db.execute(
+            text('SELECT size FROM "ModelBlob" WHERE key = :key FOR UPDATE'),
+            {"key": blob}
+        ).fetchone()
+        if (
+            row is None
+            or row.size != challenge["size"]
+            or not _exists(client, bucket, blob)
+            or not _proves_possession(client, bucket, blob, challenge, proofs)
+        ):
+            db.rollback()
+            return False
+        db.execute(
+            text('UPDATE "ModelBlob" SET "refCount" = "refCount" + 1 WHERE key = :key'),
+            {"key": blob}
+        )
+        _add_reference(db, key, user_id, blob, filename)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return True
+
+
+def release(db, client, bucket: str, user_id: str, key: str) -> bool:
+    """
+    Remove the reference ``key``, deleting its blob if no other reference
+    remains. Returns False if ``key`` is not one of ``user_id``'s
+    references.
+    """
+    try:
+        reference = db.execute(
+            text("""
+                DELETE FROM "ModelReference"
+                WHERE key = :key AND "userId" = :userId
+                RETURNING "blobKey"
+            """),
+            {"key": key, "userId": user_id}
+        ).fetchone()
+        if reference is None:
+            db.rollback()
+            return False
+
+        blob = db.execute(
+            text("""
+                UPDATE "ModelBlob" SET "refCount" = "refCount" - 1
+                WHERE key = :key
+                RETURNING "refCount", digest
+            """),
+            {"key": reference.blobKey}
+        ).fetchone()
+        removed = None
+        if blob is not None and blob.refCount <= 0:
+            # Still holding the row lock, so no upload can reuse the blob meanwhile
+            client.delete_object(Bucket=bucket, Key=reference.blobKey)
+            db.execute(text('DELETE FROM "ModelBlob" WHERE key = :key'), {"key": reference.blobKey})
+            # Compact copies and previews are keyed by content alone
+            shared = db.execute(
+                text('SELECT 1 FROM "ModelBlob" WHERE digest = :digest LIMIT 1'),
+                {"digest": blob.digest}
+            ).fetchone()
+            if shared is None:
+                _delete_compact(client, bucket, blob.digest)
+                removed = blob.digest
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if removed is not None:
+        previews.remove(removed)
+    return True
+
+
+def readable_keys(db, user_id: str, keys) -> dict:
+    """
+    Map each of ``keys`` to the S3 key its content is read from, or None
+    if ``user_id`` may not read it. References resolve to their blob; a
+    blob key (from a returned URL) is readable by users referencing it;
+    other keys are ordinary objects, readable by their owner.
+    """
+    keys = list(dict.fromkeys(keys))
+    rows = db.execute(
+        text("""
+            SELECT key, "blobKey" FROM "ModelReference"
+            WHERE "userId" = :userId AND (key IN :keys OR "blobKey" IN :keys)
+        """).bindparams(bindparam("keys", expanding=True)),
+        {"userId": user_id, "keys": keys}
+    ).fetchall() if keys else []
+    references = {row.key: row.blobKey for row in rows}
+    blobs = set(references.values())
+
+    readable = {}
+    for key in keys:
+        if key in references:
+            readable[key] = references[key]
+        elif key in blobs:
+            readable[key] = key
+        elif not key.startswith(BLOB_PREFIX) and owns_key(user_id, key):
+            readable[key] = key
+        else:
+            readable[key] = None
+    return readable
+
+
+def _add_reference(db, key: str, user_id: str, blob: str, filename: str):
+    db.execute(
+        text("""
+            INSERT INTO "ModelReference" (key, "userId", "blobKey", filename, "createdAt")
+            VALUES (:key, :userId, :blobKey, :filename, NOW())
+        """),
+        {"key": key, "userId": user_id, "blobKey": blob, "filename": filename}
+    )
+
+
+def proof(challenge: dict, data: bytes) -> str:
+    """What a claim sends for one of the challenge's ranges, given its bytes."""
+    return hashlib.sha256(bytes.fromhex(challenge["nonce"]) + data).hexdigest()
+
+
+def _proves_possession(client, bucket: str, blob: str, challenge: dict, proofs: list) -> bool:
+    """Whether ``proofs`` answer the challenge for the blob's bytes."""
+    if len(proofs) != len(challenge["ranges"]):
+        return False
+    for (offset, length), sent in zip(challenge["ranges"], proofs):
+        body = client.get_object(
+            Bucket=bucket, Key=blob, Range=f"bytes={offset}-{offset + length - 1}"
+        )["Body"].read()
+        if not hmac.compare_digest(proof(challenge, body), str(sent).lower()):
+            return False
+    return True
+
+
+def _delete_compact(client, bucket: str, digest: str):
+    """Delete every compact form of a model, whatever step it was stored at."""
+    listing = client.list_objects_v2(Bucket=bucket, Prefix=compact_prefix(digest))
+    for obj in listing.get("Contents", []):
+        client.delete_object(Bucket=bucket, Key=obj["Key"])
+
+
+def _upload(client, bucket: str, blob: str, path: str, digest: str, content_type: str):
+    with open(path, "rb") as body:
+        # sha256 lets /geometry/analyze answer from cache by key
+        upload_stream(client, body, bucket, blob, content_type, {"sha256": digest})
+
+
+def _exists(client, bucket: str, key: str) -> bool:
+    try:
+        client.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
@@ -0,0 +1,267 @@
+"""
+Automatic quote pricing from geometry analysis.
+
+Every quote item that references a model stored by /upload/model is priced
+from the model's analysis (read from the shared blob if the upload was
+deduplicated). Uploads record the content SHA-256 on the
+object, so a model analyzed before (or uploaded twice) is found in the
+analysis cache with a HEAD request and never read. Other models are
+inspected in the geometry pool, streamed from S3, and cached and
+fingerprinted like any other analysis. Items sharing a model share one
+inspection.
+
+Pricing is then a handful of array operations over all items at once:
+per-unit print time and material come from each analysis' estimate
+matrix, costs from the material and printer rate tables in ``profiles``,
+quantity discounts from a ``searchsorted`` over the quantity breaks, and
+the plate count from nesting each material's parts together.
+
+Items that cannot be priced (no model, unknown material, a part too big
+for the printer, ...) are returned with an ``error`` and left for manual
+pricing; the rest of the quote is still estimated.
+"""
+import asyncio
+import math
+import os
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from ..core.config import settings
+from . import model_store, storage
+from .geometry import fingerprint, nesting, objects, profiles
+from .geometry.analysis import EmptyModelError
+from .geometry.cache import analysis_cache
+from .geometry.pool import geometry_pool, GeometryPoolFull, GeometryJobTimeout
+from .geometry.similarity import fingerprint_index
+
+MODEL_EXTENSIONS = [".stl", ".obj", ".ply", ".off", ".gltf", ".glb"]
+
+
+class QuoteItemError(ValueError):
+    """Raised when an item cannot be priced automatically."""
+
+
+async def price_quote(items, user_id: str, printer_name: str, db) -> dict:
+    """
+    Estimate a quote. ``items`` are ``QuoteItemCreate``; raises ValueError
+    for an unknown printer. Returns a dict shaped like ``QuoteEstimate``.
+    """
+    printer = profiles.get_printer(printer_name or settings.PRINTER_PROFILE)
+    s3 = storage.get_s3_client()
+    keys = [item.fileKey or storage.key_from_url(item.fileUrl) for item in items]
+    readable = model_store.readable_keys(db, user_id, [key for key in keys if key])
+    # Misses wait for a worker here rather than overflowing the pool queue
+    slots = asyncio.Semaphore(geometry_pool.workers)
+    inspections = {}
+
+    async def price_item(index, item, key):
+        material = item.material or settings.MATERIAL_PROFILE
+        row = {"index": index, "quantity": item.quantity, "material": material, "analysis": None}
+        try:
+            if item.quantity < 1:
+                raise QuoteItemError("Quantity must be at least 1")
+            if key is None:
+                raise QuoteItemError("No stored model to price")
+            file_ext = os.path.splitext(key)[1].lower()
+            if file_ext not in MODEL_EXTENSIONS:
+                raise QuoteItemError(f"Cannot price {file_ext or 'extensionless'} files automatically")
+            key = readable[key]
+            if key is None:
+                raise QuoteItemError("Not authorized to use this file")
+            if s3 is None:
+                raise QuoteItemError("File storage is not configured")
+
+            if key not in inspections:
+                inspections[key] = asyncio.ensure_future(_inspect_stored(s3, key, file_ext, slots))
+            row["analysis"] = (await inspections[key])["analysis"]
+            row["error"] = None
+        except QuoteItemError as e:
+            row["error"] = str(e)
+        return row
+
+    rows = await asyncio.gather(*(price_item(i, item, key) for i, (item, key) in enumerate(zip(items, keys))))
+    return await asyncio.to_thread(price_items, rows, printer)
+
+
+_digest_jobs = {}
+
+
+async def _inspect_stored(s3, key: str, file_ext: str, slots: asyncio.Semaphore) -> dict:
+    """Cached inspection of a stored model, inspecting it on a miss."""
+    try:
+        head = await storage.call(s3.head_object, Bucket=settings.AWS_S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise QuoteItemError("Model not found")
+        raise QuoteItemError(f"Storage error: {str(e)}")
+
+    digest = head.get("Metadata", {}).get("sha256")
+    if digest:
+        cached, _ = await analysis_cache.get(analysis_cache.key("inspect", digest, file_ext))
+        if cached is not None:
+            return cached
+        # Another item (or quote) may already be inspecting the same bytes
+        job = _digest_jobs.get((digest, file_ext))
+        if job is not None:
+            return await asyncio.shield(job)
+
+    job = asyncio.ensure_future(_inspect_object(key, file_ext, head, digest, slots))
+    if digest:
+        _digest_jobs[(digest, file_ext)] = job
+        job.add_done_callback(lambda _: _digest_jobs.pop((digest, file_ext), None))
+    return await asyncio.shield(job)
+
+
+async def _inspect_object(
+    key: str, file_ext: str, head: dict, digest: str, slots: asyncio.Semaphore
+) -> dict:
+    args = (key, file_ext, head["ContentLength"], head.get("ETag"), None, False, digest)
+    try:
+        async with slots:
+            result = await geometry_pool.run(objects.inspect_object, *args)
+    except EmptyModelError:
+        raise QuoteItemError("Empty model")
+    except GeometryPoolFull:
+        raise QuoteItemError("Geometry service is busy")
+    except GeometryJobTimeout:
+        raise QuoteItemError("Model analysis timed out")
+    except Exception as e:
+        raise QuoteItemError(f"Error analyzing model: {str(e)}")
+
+    inspection = result["inspection"]
+    await analysis_cache.set(analysis_cache.key("inspect", result["digest"], file_ext), inspection)
+    await fingerprint_index.add(
+        result["digest"], file_ext, fingerprint.decode(inspection["fingerprint"])
+    )
+    return inspection
+
+
+def price_items(rows: list, printer: profiles.PrinterProfile) -> dict:
+    """
+    Price rows of ``{"index", "quantity", "material", "analysis", "error"}``
+    on ``printer``. Rows with an error are passed through unpriced.
+    """
+    spacing = settings.NESTING_PART_SPACING
+    for row in rows:
+        if row["error"] is not None:
+            continue
+        try:
+            row["printTime"], row["materialUsed"] = _unit_estimate(row["analysis"], row["material"])
+            row["pricePerGram"] = profiles.get_material(row["material"]).price_per_gram
+            nesting.check_fit(_footprint(row), printer, spacing)
+        except ValueError as e:
+            row["error"] = str(e)
+
+    priced = [row for row in rows if row["error"] is None]
+    quantity = np.array([row["quantity"] for row in priced], dtype=np.float64)
+    hours = np.array([row["printTime"] for row in priced], dtype=np.float64)
+    grams = np.array([row["materialUsed"] for row in priced], dtype=np.float64)
+    price_per_gram = np.array([row["pricePerGram"] for row in priced], dtype=np.float64)
+
+    unit_material = grams * price_per_gram
+    unit_machine = hours * printer.hourly_rate
+    unit_price = unit_material + unit_machine
+    # Discount of the highest break at or below each quantity
+    discounts = np.concatenate([[0.0], settings.QUOTE_QUANTITY_DISCOUNTS])
+    discount = discounts[np.searchsorted(settings.QUOTE_QUANTITY_BREAKS, quantity, side="right")]
+    line_total = unit_price * quantity * (1.0 - discount)
+
+    plate_count = sum(
+        _plate_count([row for row in priced if row["material"] == material], printer)
+        for material in sorted({row["material"] for row in priced})
+    )
+
+    estimates = [
+        {
+            "index": row["index"],
+            "quantity": row["quantity"],
+            "material": row["material"],
+            "error": row["error"]
+        }
+        for row in rows
+    ]
+    for position, row in enumerate(priced):
+        estimates[row["index"]].update({
+            "printTime": round(float(hours[position]), 3),
+            "materialUsed": round(float(grams[position]), 2),
+            "unitPrice": round(float(unit_price[position]), 2),
+            "discount": float(discount[position]),
+            "totalPrice": round(float(line_total[position]), 2)
+        })
+
+    material_cost = float((unit_material * quantity).sum())
+    machine_cost = float((unit_machine * quantity).sum())
+    discount_total = float((unit_price * quantity * discount).sum())
+    plate_cost = plate_count * settings.QUOTE_PLATE_FEE
+    total = material_cost + machine_cost - discount_total + plate_cost
+    if priced:
+        total = max(total, settings.QUOTE_MINIMUM)
+
+    return {
+        "currency": settings.QUOTE_CURRENCY,
+        "printer": printer.name,
+        "items": estimates,
+        "plateCount": plate_count,
+        "machineTime": round(float((hours * quantity).sum()), 3),
+        "materialUsed": round(float((grams * quantity).sum()), 2),
+        "materialCost": round(material_cost, 2),
+        "machineCost": round(machine_cost, 2),
+        "plateCost": round(plate_cost, 2),
+        "discount": round(discount_total, 2),
+        "total": round(total, 2),
+        "complete": len(priced) == len(rows)
+    }
+
+
+def _unit_estimate(analysis: dict, material: str):
+    """Print hours and grams of one unit in ``material`` at the default settings."""
+    matrix = analysis["estimates"]
+    if material not in matrix["materials"]:
+        raise QuoteItemError(f"No estimate for material {material}")
+    try:
+        index = (
+            matrix["materials"].index(material),
+            matrix["layerHeights"].index(settings.LAYER_HEIGHT),
+            matrix["infillDensities"].index(settings.INFILL_DENSITY)
+        )
+    except ValueError:
+        raise QuoteItemError("Model analysis is out of date")
+    return (
+        float(np.asarray(matrix["printTime"])[index]),
+        float(np.asarray(matrix["material"])[index])
+    )
+
+
+def _footprint(row: dict) -> nesting.PartFootprint:
+    lo, hi = row["analysis"]["bounds"]
+    return nesting.PartFootprint(
+        id=str(row["index"]),
+        width=float(hi[0] - lo[0]),
+        depth=float(hi[1] - lo[1]),
+        height=float(hi[2] - lo[2]),
+        quantity=row["quantity"]
+    )
+
+
+def _plate_count(rows: list, printer: profiles.PrinterProfile) -> int:
+    """
+    Plates needed for ``rows`` (one material). Past NESTING_MAX_INSTANCES
+    the count is estimated from the footprint area at the utilization
+    nesting reaches on a sample instead.
+    """
+    spacing = settings.NESTING_PART_SPACING
+    parts = [_footprint(row) for row in rows]
+    instances = sum(part.quantity for part in parts)
+    if instances <= settings.NESTING_MAX_INSTANCES:
+        return nesting.nest(parts, printer, spacing)["plateCount"]
+
+    scale = settings.NESTING_MAX_INSTANCES / instances
+    sample = [
+        nesting.PartFootprint(part.id, part.width, part.depth, part.height, max(1, int(part.quantity * scale)))
+        for part in parts
+    ]
+    nested = nesting.nest(sample, printer, spacing)
+    area = sum((part.width + spacing) * (part.depth + spacing) * part.quantity for part in parts)
+    sample_area = sum((part.width + spacing) * (part.depth + spacing) * part.quantity for part in sample)
+    return max(nested["plateCount"], math.ceil(nested["plateCount"] * area / sample_area))
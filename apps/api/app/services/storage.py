@@ -0,0 +1,238 @@
+"""
+S3 access shared by the upload and geometry code.
+
+Each process shares one S3 client (boto3 clients are thread-safe) with a
+connection pool of ``S3_MAX_POOL_CONNECTIONS``; the API creates it at
+startup and runs blocking S3 calls through ``call``, on a thread pool of
+its own, so slow transfers neither stall the event loop nor starve the
+default executor other requests use.
+
+Uploaded files live under ``<kind>/<user_id>/<file>``. They are streamed in
+with multipart uploads, a few parts in flight at once, so memory use does
+not grow with the file. Geometry workers read models back with ranged
+GETs, a few ranges ahead of the parser, so a model that is already stored
+never has to be uploaded again for analysis.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+import asyncio
+import functools
+import hashlib
+import hmac
+import threading
+
+import boto3
+from botocore.config import Config
+
+from ..core.config import settings
+
+# Smallest part S3 accepts in a multipart upload, except the last
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+_client = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_s3_client():
+    """The process's S3 client, created on first use; None if S3 is not configured."""
+    global _client
+    if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
+        return None
+
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS)
+                )
+    return _client
+
+
+def start():
+    """Create the client and executor up front (API lifespan)."""
+    global _executor
+    get_s3_client()
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3"
+            )
+
+
+def close():
+    global _client, _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def call(fn, *args, **kwargs):
+    """Run a blocking S3 call (or function making them) on the S3 thread pool."""
+    if _executor is None:
+        start()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def owns_key(user_id: str, key: str) -> bool:
+    """Whether a stored file belongs to ``user_id``."""
+    return f"/{user_id}/" in key
+
+
+def object_url(key: str) -> str:
+    return f"https://{settings.AWS_S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+
+
+def presigned_url(client, key: str) -> str:
+    """Short-lived GET URL for a private object (MODEL_URL_EXPIRES)."""
+    return client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": settings.AWS_S3_BUCKET, "Key": key},
+        ExpiresIn=settings.MODEL_URL_EXPIRES
+    )
+
+
+def key_from_url(url: str):
+    """
+    The key of a file in our bucket from its ``object_url`` or a presigned
+    URL for it, or None.
+    """
+    if not url:
+        return None
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith(f"{settings.AWS_S3_BUCKET}.s3.") and host.endswith(".amazonaws.com"):
+        return unquote(parts.path.lstrip("/")) or None
+    return None
+
+
+def content_name(digest: str) -> str:
+    """
+    Name content with SHA-256 ``digest`` is stored under: keyed with
+    MODEL_BLOB_KEY_SECRET, so it cannot be derived from the digest alone.
+    """
+    secret = (settings.MODEL_BLOB_KEY_SECRET or settings.SECRET_KEY).encode()
+    return hmac.new(secret, digest.encode(), hashlib.sha256).hexdigest()
+
+
+def upload_stream(
+    client, fileobj, bucket: str, key: str, content_type: str = None, metadata: dict = None
+) -> int:
+    """
+    Upload ``fileobj`` from its current position to ``key``. Files larger
+    than one part go up as a multipart upload with up to
+    ``S3_MULTIPART_CONCURRENCY`` parts in flight; if anything fails the
+    upload is aborted so no orphaned parts are left behind. Blocking;
+    returns the number of bytes uploaded.
+    """
+    part_size = max(settings.S3_MULTIPART_CHUNK_BYTES, MIN_PART_SIZE)
+    extra = {}
+    if content_type:
+        extra["ContentType"] = content_type
+    if metadata:
+        extra["Metadata"] = metadata
+
+    chunk = fileobj.read(part_size)
+    if len(chunk) < part_size:
+        client.put_object(Bucket=bucket, Key=key, Body=chunk, **extra)
+        return len(chunk)
+
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **extra)["UploadId"]
+    concurrency = max(settings.S3_MULTIPART_CONCURRENCY, 1)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+    parts = []
+    size = 0
+    try:
+        while chunk:
+            size += len(chunk)
+            pending.append(executor.submit(
+                _upload_part, client, bucket, key, upload_id, len(pending) + len(parts) + 1, chunk
+            ))
+            if len(pending) >= concurrency:
+                parts.append(pending.popleft().result())
+            chunk = fileobj.read(part_size)
+        while pending:
+            parts.append(pending.popleft().result())
+
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+        return size
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            print(f"Could not abort multipart upload of {key}: {e}")
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def _upload_part(client, bucket: str, key: str, upload_id: str, number: int, body: bytes) -> dict:
+    response = client.upload_part(
+        Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+    )
+    return {"PartNumber": number, "ETag": response["ETag"]}
+
+
+def record_digest(client, bucket: str, key: str, digest: str, etag: str = None):
+    """
+    Store the content SHA-256 as object metadata, as /upload/model does
+    for files it receives, on an object uploaded directly by a client.
+    The object is copied onto itself server-side; with ``etag``, it is
+    left alone if it changed in the meantime.
+    """
+    head = client.head_object(Bucket=bucket, Key=key)
+    extra = {"CopySourceIfMatch": etag} if etag else {}
+    client.copy_object(
+        Bucket=bucket,
+        Key=key,
+        CopySource={"Bucket": bucket, "Key": key},
+        Metadata={**head.get("Metadata", {}), "sha256": digest},
+        MetadataDirective="REPLACE",
+        ContentType=head.get("ContentType", "binary/octet-stream"),
+        **extra
+    )
+
+
+def iter_object(client, bucket: str, key: str, size: int, etag: str = None):
+    """
+    Yield the bytes of an S3 object in ranged GETs of
+    ``S3_RANGE_CHUNK_BYTES``, keeping up to ``S3_RANGE_PREFETCH`` ranges in
+    flight ahead of the consumer. With ``etag``, a concurrent overwrite
+    fails the read instead of mixing two versions.
+    """
+    chunk_size = settings.S3_RANGE_CHUNK_BYTES
+    prefetch = max(settings.S3_RANGE_PREFETCH, 1)
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+    try:
+        for start in range(0, size, chunk_size):
+            end = min(start + chunk_size, size) - 1
+            pending.append(executor.submit(_get_range, client, bucket, key, start, end, etag))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _get_range(client, bucket: str, key: str, start: int, end: int, etag: str = None) -> bytes:
+    extra = {"IfMatch": etag} if etag else {}
+    response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", **extra)
+    return response["Body"].read()
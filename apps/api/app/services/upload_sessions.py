@@ -0,0 +1,197 @@
+"""
+Resumable chunked uploads.
+
+A session is an S3 multipart upload to the model's final key, one
+chunk per part. The session id is a signed token carrying everything
+needed to reach the upload (owner, key, upload id, size, chunk size),
+so any API process can serve any chunk and nothing is stored on our
+side. What has been received is whatever parts S3 holds.
+
+Chunks start at multiples of the chunk size and are sent in any order,
+in parallel, and again after a failure. Each is passed to S3 as its own
+part; the file is never assembled here. Abandoned sessions expire with
+their token, and the sweeper aborts their multipart uploads so the
+parts stop being billed.
+"""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import math
+
+from jose import JWTError, jwt
+
+from ..core.config import settings
+from . import storage
+from .storage import MIN_PART_SIZE
+
+# S3's limit on parts per multipart upload
+MAX_PARTS = 10000
+SESSION_TOKEN_TYPE = "upload-session"
+
+
+class SessionNotFound(LookupError):
+    """Raised for an unknown, expired or someone else's session."""
+
+
+class ChunkError(ValueError):
+    """Raised for a chunk at a bad offset or of the wrong size."""
+
+
+class IncompleteUpload(ValueError):
+    """Raised when completing a session that is missing chunks."""
+
+    def __init__(self, missing: list):
+        super().__init__(f"{len(missing)} chunks have not been uploaded")
+        self.missing = missing
+
+
+def chunk_size_for(size: int) -> int:
+    """Configured chunk size, raised (in whole MiB) so ``size`` fits in MAX_PARTS."""
+    chunk_size = max(settings.UPLOAD_CHUNK_BYTES, MIN_PART_SIZE)
+    if size > chunk_size * MAX_PARTS:
+        chunk_size = math.ceil(size / MAX_PARTS / (1 << 20)) << 20
+    return chunk_size
+
+
+def create(client, bucket: str, user_id: str, key: str, filename: str, size: int, content_type: str) -> dict:
+    """Start the multipart upload for a new session. Blocking."""
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+    expires = datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    return {
+        "typ": SESSION_TOKEN_TYPE,
+        "uid": user_id,
+        "key": key,
+        "filename": filename,
+        "uploadId": upload_id,
+        "size": size,
+        "chunkSize": chunk_size_for(size),
+        "exp": int(expires.timestamp())
+    }
+
+
+def encode(session: dict) -> str:
+    return jwt.encode(session, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def decode(token: str, user_id: str) -> dict:
+    try:
+        session = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise SessionNotFound("Upload session not found or expired")
+    if session.get("typ") != SESSION_TOKEN_TYPE or session.get("uid") != user_id:
+        raise SessionNotFound("Upload session not found or expired")
+    return session
+
+
+def chunk_length(session: dict, offset: int) -> int:
+    """Bytes the chunk at ``offset`` must have."""
+    if offset < 0 or offset >= session["size"] or offset % session["chunkSize"]:
+        raise ChunkError(f"Chunks start at multiples of {session['chunkSize']} below {session['size']}")
+    return min(session["chunkSize"], session["size"] - offset)
+
+
+def upload_chunk(client, bucket: str, session: dict, offset: int, body: bytes, content_md5: str = None):
+    """Store one chunk as its part; resending a chunk replaces it. Blocking."""
+    if len(body) != chunk_length(session, offset):
+        raise ChunkError(f"The chunk at {offset} must be {chunk_length(session, offset)} bytes")
+    extra = {"ContentMD5": content_md5} if content_md5 else {}
+    client.upload_part(
+        Bucket=bucket,
+        Key=session["key"],
+        UploadId=session["uploadId"],
+        PartNumber=offset // session["chunkSize"] + 1,
+        Body=body,
+        **extra
+    )
+
+
+def received(client, bucket: str, session: dict) -> list:
+    """Parts S3 holds for the session, by part number. Blocking."""
+    parts = []
+    marker = 0
+    while True:
+        try:
+            page = client.list_parts(
+                Bucket=bucket, Key=session["key"], UploadId=session["uploadId"], PartNumberMarker=marker
+            )
+        except client.exceptions.NoSuchUpload:
+            raise SessionNotFound("Upload session not found or expired")
+        parts.extend(page.get("Parts", []))
+        if not page.get("IsTruncated"):
+            return sorted(parts, key=lambda part: part["PartNumber"])
+        marker = page["NextPartNumberMarker"]
+
+
+def missing_offsets(session: dict, parts: list) -> list:
+    have = {part["PartNumber"] for part in parts}
+    return [
+        offset for offset in range(0, session["size"], session["chunkSize"])
+        if offset // session["chunkSize"] + 1 not in have
+    ]
+
+
+def complete(client, bucket: str, session: dict):
+    """Assemble the uploaded parts into the final object. Blocking."""
+    parts = received(client, bucket, session)
+    missing = missing_offsets(session, parts)
+    if missing:
+        raise IncompleteUpload(missing)
+    client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=session["key"],
+        UploadId=session["uploadId"],
+        MultipartUpload={"Parts": [
+            {"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in parts
+        ]}
+    )
+
+
+def abort(client, bucket: str, session: dict):
+    try:
+        client.abort_multipart_upload(Bucket=bucket, Key=session["key"], UploadId=session["uploadId"])
+    except client.exceptions.NoSuchUpload:
+        raise SessionNotFound("Upload session not found or expired")
+
+
+def sweep(client, bucket: str) -> int:
+    """Abort multipart uploads of models older than a session lives. Blocking."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    aborted = 0
+    paginator = client.get_paginator("list_multipart_uploads")
+    for page in paginator.paginate(Bucket=bucket, Prefix="models/"):
+        for upload in page.get("Uploads", []):
+            if upload["Initiated"] < cutoff:
+                client.abort_multipart_upload(Bucket=bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+                aborted += 1
+    return aborted
+
+
+_sweeper = None
+
+
+def start():
+    """Sweep expired sessions every UPLOAD_SESSION_SWEEP_INTERVAL (API lifespan)."""
+    global _sweeper
+    if _sweeper is None and storage.get_s3_client() is not None:
+        _sweeper = asyncio.create_task(_sweep_periodically())
+
+
+async def close():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
+
+
+async def _sweep_periodically():
+    while True:
+        try:
+            aborted = await storage.call(sweep, storage.get_s3_client(), settings.AWS_S3_BUCKET)
+            if aborted:
+                print(f"Aborted {aborted} expired upload sessions")
+        except Exception as e:
+            print(f"Could not sweep upload sessions: {e}")
+        await asyncio.sleep(settings.UPLOAD_SESSION_SWEEP_INTERVAL)
@@ -0,0 +1,333 @@
+"""
+Benchmarks for the geometry analysis code paths.
+
+Generates synthetic meshes (a torus tessellated to the requested triangle
+count, written as binary STL, OBJ and binary PLY) plus deliberately broken
+variants, and runs the code behind ``/geometry/analyze`` and
+``/geometry/validate`` (``analysis.analyze_path`` / ``validate_path``)
+in-process on each. For every case it records latency percentiles,
+throughput and the peak RSS increase, and compares them with a stored
+baseline.
+
+Run from ``apps/api``::
+
+    python -m benchmarks.geometry                     # compare with the baseline
+    python -m benchmarks.geometry --save-baseline     # record a new baseline
+    python -m benchmarks.geometry --sizes 1k,100k --formats stl --repeat 5
+
+Baselines are machine specific; record one on the machine that runs the
+comparison (e.g. the CI runner) before and after a dependency upgrade.
+The exit status is 1 when any case regressed.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from app.services.geometry import analysis, timing
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000, "5M": 5_000_000}
+FORMATS = ["stl", "obj", "ply"]
+PATHS = {"analyze": analysis.analyze_path, "validate": analysis.validate_path}
+# Broken variants are generated at this size only
+BROKEN_SIZE = "100k"
+BROKEN_KINDS = ["holes", "flipped", "degenerate", "intersecting", "truncated"]
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# A case regresses when it is this much slower / larger than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and the difference is above the noise floor
+MIN_LATENCY_DIFF = 0.005  # seconds
+MIN_MEMORY_DIFF = 16 << 20  # bytes
+
+TORUS_RADIUS = 20.0
+TUBE_RADIUS = 8.0
+
+
+def torus(triangle_count: int):
+    """A closed, consistently wound torus with about ``triangle_count`` faces."""
+    # The tube is stepped about 2.5x as finely as it is long, keeping faces
+    # roughly square
+    rings = max(3, int(round(np.sqrt(triangle_count / 2 / 2.5))))
+    segments = max(3, int(np.ceil(triangle_count / 2 / rings)))
+    u = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    v = np.linspace(0, 2 * np.pi, rings, endpoint=False)
+    uu, vv = np.meshgrid(u, v, indexing="ij")
+    radius = TORUS_RADIUS + TUBE_RADIUS * np.cos(vv)
+    vertices = np.stack([
+        radius * np.cos(uu), radius * np.sin(uu), TUBE_RADIUS * np.sin(vv) + TUBE_RADIUS
+    ], axis=-1).reshape(-1, 3)
+
+    i, j = np.meshgrid(np.arange(segments), np.arange(rings), indexing="ij")
+    a = i * rings + j
+    b = ((i + 1) % segments) * rings + j
+    c = ((i + 1) % segments) * rings + (j + 1) % rings
+    d = i * rings + (j + 1) % rings
+    faces = np.concatenate([
+        np.stack([a, b, c], axis=-1).reshape(-1, 3),
+        np.stack([a, c, d], axis=-1).reshape(-1, 3)
+    ])
+    return vertices, faces
+
+
+def broken(kind: str, vertices: np.ndarray, faces: np.ndarray):
+    """A damaged copy of a mesh; see ``BROKEN_KINDS``."""
+    rng = np.random.default_rng(0)
+    faces = faces.copy()
+    if kind == "holes":
+        faces = faces[rng.random(len(faces)) >= 0.01]
+    elif kind == "flipped":
+        flip = rng.random(len(faces)) < 0.1
+        faces[flip] = faces[flip][:, ::-1]
+    elif kind == "degenerate":
+        picked = rng.choice(len(faces), len(faces) // 50, replace=False)
+        collapsed = faces[picked].copy()
+        collapsed[:, 2] = collapsed[:, 1]
+        faces = np.concatenate([faces, faces[picked], collapsed])
+    elif kind == "intersecting":
+        # A second copy pushed halfway into the first
+        shifted = vertices + [TORUS_RADIUS, 0.0, 0.0]
+        faces = np.concatenate([faces, faces + len(vertices)])
+        vertices = np.concatenate([vertices, shifted])
+    return vertices, faces
+
+
+def write_mesh(path: str, file_format: str, vertices: np.ndarray, faces: np.ndarray):
+    vertices = vertices.astype(np.float32)
+    if file_format == "stl":
+        records = np.zeros(len(faces), dtype=[("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")])
+        records["vertices"] = vertices[faces]
+        with open(path, "wb") as f:
+            f.write(b"akaar benchmark".ljust(80, b" "))
+            f.write(np.uint32(len(faces)).tobytes())
+            f.write(records.tobytes())
+    elif file_format == "obj":
+        with open(path, "w") as f:
+            np.savetxt(f, vertices, fmt="v %.6f %.6f %.6f")
+            np.savetxt(f, faces + 1, fmt="f %d %d %d")
+    elif file_format == "ply":
+        records = np.zeros(len(faces), dtype=[("n", "u1"), ("indices", "<i4", (3,))])
+        records["n"] = 3
+        records["indices"] = faces
+        header = (
+            "ply\nformat binary_little_endian 1.0\n"
+            f"element vertex {len(vertices)}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            f"element face {len(faces)}\n"
+            "property list uchar int vertex_indices\nend_header\n"
+        )
+        with open(path, "wb") as f:
+            f.write(header.encode())
+            f.write(vertices.astype("<f4").tobytes())
+            f.write(records.tobytes())
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def generate_cases(mesh_dir: str, sizes: list, formats: list, with_broken: bool) -> list:
+    """
+    Write the benchmark meshes to ``mesh_dir`` (reusing ones already there;
+    generation is deterministic) and return ``(name, path, file_ext)`` cases.
+    """
+    os.makedirs(mesh_dir, exist_ok=True)
+    meshes = [(f"torus-{size}", size, None) for size in sizes]
+    if with_broken:
+        meshes += [(f"{kind}-{BROKEN_SIZE}", BROKEN_SIZE, kind) for kind in BROKEN_KINDS]
+
+    cases = []
+    for name, size, kind in meshes:
+        # A truncated file is only meaningful for binary STL
+        for file_format in (["stl"] if kind == "truncated" else formats):
+            path = os.path.join(mesh_dir, f"{name}.{file_format}")
+            if not os.path.exists(path):
+                print(f"Generating {os.path.basename(path)}")
+                vertices, faces = torus(SIZES[size])
+                if kind:
+                    vertices, faces = broken(kind, vertices, faces)
+                write_mesh(f"{path}.tmp", file_format, vertices, faces)
+                if kind == "truncated":
+                    with open(f"{path}.tmp", "r+b") as f:
+                        f.truncate(os.path.getsize(f"{path}.tmp") * 2 // 3 + 7)
+                os.replace(f"{path}.tmp", path)
+            cases.append((f"{file_format}/{name}", path, f".{file_format}"))
+    return cases
+
+
+def measure(fn, path: str, file_ext: str, repeat: int, max_seconds: float) -> dict:
+    """
+    Run ``fn(path, file_ext)`` up to ``repeat`` times (at least once, and
+    no more once ``max_seconds`` have been spent) and summarize the runs.
+    """
+    _release_memory()
+    tracking = timing.reset_peak_rss()
+    start_rss = timing.peak_rss() if tracking else None
+
+    latencies = []
+    error = None
+    result = None
+    spent = 0.0
+    while len(latencies) < repeat and (not latencies or spent < max_seconds):
+        started = time.perf_counter()
+        try:
+            result = fn(path, file_ext)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latencies.append(time.perf_counter() - started)
+        spent += latencies[-1]
+
+    p50, p95 = np.percentile(latencies, [50, 95])
+    size = os.path.getsize(path)
+    triangles = None
+    if isinstance(result, dict):
+        triangles = result.get("triangle_count", result.get("triangleCount"))
+    peak = timing.peak_rss() if tracking else None
+    return {
+        "runs": len(latencies),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": float(max(latencies)),
+        "triangles": triangles,
+        "bytes": size,
+        "trianglesPerSecond": triangles / p50 if triangles and p50 > 0 else None,
+        "bytesPerSecond": size / p50 if p50 > 0 else None,
+        "peakRss": peak,
+        "peakRssIncrease": peak - start_rss if peak is not None else None,
+        "error": error
+    }
+
+
+def _release_memory():
+    """
+    Return freed memory to the OS so each case's peak RSS increase is not
+    hidden by heap the previous case left behind (glibc only).
+    """
+    gc.collect()
+    libc = ctypes.util.find_library("c")
+    if libc:
+        try:
+            ctypes.CDLL(libc).malloc_trim(0)
+        except AttributeError:
+            pass
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "trimesh": trimesh.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Descriptions of the cases that got slower or bigger than the baseline."""
+    regressions = []
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        if bool(current["error"]) != bool(previous["error"]):
+            regressions.append(f"{name}: error changed from {previous['error']!r} to {current['error']!r}")
+        if (
+            current["p50"] > previous["p50"] * (1 + tolerance)
+            and current["p50"] - previous["p50"] > MIN_LATENCY_DIFF
+        ):
+            regressions.append(
+                f"{name}: p50 {previous['p50'] * 1000:.1f}ms -> {current['p50'] * 1000:.1f}ms"
+            )
+        before, after = previous.get("peakRssIncrease"), current.get("peakRssIncrease")
+        if (
+            before is not None and after is not None
+            and after > before * (1 + tolerance) and after - before > MIN_MEMORY_DIFF
+        ):
+            regressions.append(f"{name}: peak RSS +{before >> 20}MB -> +{after >> 20}MB")
+    return regressions
+
+
+def _format_row(name: str, case: dict) -> str:
+    throughput = case["trianglesPerSecond"]
+    memory = case["peakRssIncrease"]
+    return "  ".join([
+        f"{name:<36}",
+        f"{case['runs']:>4}",
+        f"{case['p50'] * 1000:>10.1f}",
+        f"{case['p95'] * 1000:>10.1f}",
+        f"{throughput / 1e6:>8.2f}" if throughput else f"{'-':>8}",
+        f"{memory >> 20:>8}" if memory is not None else f"{'-':>8}",
+        case["error"] or ""
+    ])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated, from " + ", ".join(SIZES))
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--no-broken", action="store_true", help="skip the broken meshes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="stop repeating a case after this long")
+    parser.add_argument("--mesh-dir", default=os.path.join(tempfile.gettempdir(), "akaar-benchmark-meshes"))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(",")
+    formats = args.formats.split(",")
+    paths = args.paths.split(",")
+    for value, known in [(sizes, SIZES), (formats, FORMATS), (paths, PATHS)]:
+        unknown = set(value) - set(known)
+        if unknown:
+            parser.error(f"unknown value(s): {', '.join(sorted(unknown))}")
+
+    cases = generate_cases(args.mesh_dir, sizes, formats, not args.no_broken)
+    results = {"environment": environment(), "cases": {}}
+    print(f"{'case':<36}  {'runs':>4}  {'p50 ms':>10}  {'p95 ms':>10}  {'Mtri/s':>8}  {'+RSS MB':>8}")
+    for name, path, file_ext in cases:
+        for path_name in paths:
+            case_name = f"{name}/{path_name}"
+            case = measure(PATHS[path_name], path, file_ext, args.repeat, args.max_seconds)
+            results["cases"][case_name] = case
+            print(_format_row(case_name, case))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the baseline from {baseline['environment']['timestamp']}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against the baseline from {baseline['environment']['timestamp']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
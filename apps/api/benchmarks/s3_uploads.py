@@ -0,0 +1,129 @@
+"""
+Concurrent S3 upload throughput, per-request clients vs the shared client.
+
+Starts a local moto S3 server and uploads the same payload from many
+concurrent coroutines, the way concurrent /upload requests would:
+
+- ``per-request``: a new boto3 client for every upload and a blocking
+  ``put_object`` on the event loop (how uploads used to work)
+- ``shared``: ``storage.get_s3_client()`` with calls dispatched through
+  ``storage.call``
+
+For each it reports uploads/s, MB/s and the longest the event loop went
+without running a ticker coroutine (how long other requests would have
+been stalled). Needs ``moto[server]``, which is not an API dependency::
+
+    pip install "moto[server]"
+    python -m benchmarks.s3_uploads --uploads 200 --concurrency 32 --size 1MiB
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+
+import boto3
+
+PORT = 5123
+BUCKET = "akaar-benchmark"
+UNITS = {"kib": 1 << 10, "mib": 1 << 20}
+
+os.environ.update(
+    AWS_ACCESS_KEY_ID="benchmark",
+    AWS_SECRET_ACCESS_KEY="benchmark",
+    AWS_REGION="us-east-1",
+    AWS_S3_BUCKET=BUCKET,
+    AWS_S3_ENDPOINT_URL=f"http://127.0.0.1:{PORT}"
+)
+
+from app.core.config import settings  # noqa: E402  (reads the environment above)
+from app.services import storage  # noqa: E402
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    for unit, factor in UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+async def upload_per_request(key: str, payload: bytes):
+    client = boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL
+    )
+    client.put_object(Bucket=BUCKET, Key=key, Body=payload)
+
+
+async def upload_shared(key: str, payload: bytes):
+    await storage.call(
+        storage.upload_stream, storage.get_s3_client(), io.BytesIO(payload), BUCKET, key
+    )
+
+
+async def run(upload, uploads: int, concurrency: int, payload: bytes) -> dict:
+    """Time ``uploads`` uploads, ``concurrency`` at a time, and the event loop's longest stall."""
+    slots = asyncio.Semaphore(concurrency)
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stall = max(stall, time.perf_counter() - started - 0.001)
+
+    async def one(index: int):
+        async with slots:
+            await upload(f"benchmark/{index}", payload)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(uploads)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await ticking
+    return {
+        "seconds": elapsed,
+        "uploadsPerSecond": uploads / elapsed,
+        "bytesPerSecond": uploads * len(payload) / elapsed,
+        "maxStall": stall
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--size", default="1MiB", help="payload per upload, e.g. 256KiB or 4MiB")
+    args = parser.parse_args(argv)
+
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=PORT, verbose=False)
+    server.start()
+    try:
+        storage.start()
+        storage.get_s3_client().create_bucket(Bucket=BUCKET)
+        payload = os.urandom(parse_size(args.size))
+
+        print(f"{args.uploads} uploads of {len(payload)} bytes, {args.concurrency} at a time")
+        print(f"{'mode':<12}  {'seconds':>8}  {'uploads/s':>10}  {'MB/s':>8}  {'max stall ms':>12}")
+        for name, upload in [("per-request", upload_per_request), ("shared", upload_shared)]:
+            result = asyncio.run(run(upload, args.uploads, args.concurrency, payload))
+            print(
+                f"{name:<12}  {result['seconds']:>8.2f}  {result['uploadsPerSecond']:>10.1f}"
+                f"  {result['bytesPerSecond'] / 1e6:>8.1f}  {result['maxStall'] * 1000:>12.1f}"
+            )
+    finally:
+        storage.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
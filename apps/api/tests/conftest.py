@@ -0,0 +1,132 @@
+"""
+Shared fixtures. S3 is moto's in-process mock, Celery runs tasks eagerly,
+and the database is SQLite standing in for Postgres, with the model tables
+created from their Prisma migration. No services need to be running.
+"""
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+# Settings are read when app.core.config is imported
+_scratch = tempfile.mkdtemp(prefix="akaar-tests-")
+os.environ.update(
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+    AWS_REGION="us-east-1",
+    AWS_S3_BUCKET="akaar-test",
+    SECRET_KEY="test-secret",
+    CELERY_TASK_ALWAYS_EAGER="true",
+    ANALYSIS_CACHE_REDIS="false",
+    GEOMETRY_WORKERS="1",
+    GEOMETRY_JOB_DIR=os.path.join(_scratch, "jobs"),
+    PREVIEW_DIR=os.path.join(_scratch, "previews")
+)
+os.environ.pop("AWS_S3_ENDPOINT_URL", None)
+os.makedirs(os.environ["GEOMETRY_JOB_DIR"], exist_ok=True)
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from moto import mock_aws  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import storage  # noqa: E402
+from app.services.geometry.cache import analysis_cache  # noqa: E402
+from app.services.geometry.pool import geometry_pool  # noqa: E402
+
+MIGRATIONS = Path(__file__).resolve().parents[3] / "packages" / "db" / "prisma" / "migrations"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    geometry_pool.shutdown()
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    analysis_cache.clear()
+    yield
+    analysis_cache.clear()
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        storage.close()  # drop any client made outside the mock
+        client = storage.get_s3_client()
+        client.create_bucket(Bucket=settings.AWS_S3_BUCKET)
+        yield client
+        storage.close()
+
+
+@pytest.fixture
+def bucket():
+    return settings.AWS_S3_BUCKET
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    @event.listens_for(engine, "connect")
+    def _functions(connection, record):
+        connection.create_function("NOW", 0, lambda: "now")
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _row_locks(conn, cursor, statement, parameters, context, executemany):
+        # SQLite serializes writers already
+        return statement.replace(" FOR UPDATE", ""), parameters
+
+    with engine.begin() as connection:
+        for statement in _migration("add_model_blobs"):
+            connection.exec_driver_sql(statement)
+
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def client(db):
+    """API client without the lifespan (S3, if needed, comes from the ``s3`` fixture)."""
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def auth(user_id: str) -> dict:
+    token = create_access_token({"sub": user_id, "email": f"{user_id}@example.com"})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _migration(name: str) -> list:
+    """Statements of a Prisma migration that SQLite can run (it has no ALTER TABLE ... ADD CONSTRAINT)."""
+    (path,) = MIGRATIONS.glob(f"*_{name}/migration.sql")
+    sql = re.sub(r"--[^\n]*", "", path.read_text())
+    return [
+        statement for statement in (s.strip() for s in sql.split(";"))
+        if statement and "ADD CONSTRAINT" not in statement
+    ]
+
+
+def box_triangles(size=(20.0, 10.0, 5.0)) -> np.ndarray:
+    """Closed, outward-facing box with one corner at the origin: (12, 3, 3)."""
+    x, y, z = size
+    v = np.array([
+        [0, 0, 0], [x, 0, 0], [x, y, 0], [0, y, 0],
+        [0, 0, z], [x, 0, z], [x, y, z], [0, y, z]
+    ], dtype=np.float64)
+    faces = [
+        (0, 2, 1), (0, 3, 2), (4, 5, 6), (4, 6, 7),
+        (0, 1, 5), (0, 5, 4), (1, 2, 6), (1, 6, 5),
+        (2, 3, 7), (2, 7, 6), (3, 0, 4), (3, 4, 7)
+    ]
+    return v[np.array(faces)]
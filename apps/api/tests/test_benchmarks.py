@@ -0,0 +1,150 @@
+"""The geometry benchmark suite: synthetic meshes, measurements and baselines."""
+import json
+import os
+
+import numpy as np
+import pytest
+import trimesh
+
+from benchmarks import geometry
+
+
+def _case(p50=0.1, peak=100 << 20, error=None):
+    return {"p50": p50, "peakRssIncrease": peak, "error": error}
+
+
+def test_torus_is_closed_and_near_the_requested_size():
+    vertices, faces = geometry.torus(1_000)
+    mesh = trimesh.Trimesh(vertices, faces, process=False)
+
+    assert len(faces) == pytest.approx(1_000, rel=0.05)
+    assert mesh.is_watertight and mesh.is_winding_consistent
+    assert mesh.volume > 0
+    # Sitting just above the plate
+    assert 0.0 <= mesh.bounds[0][2] < 0.5
+
+
+@pytest.mark.parametrize("kind", ["holes", "flipped", "degenerate", "intersecting"])
+def test_broken_variants_are_damaged(kind):
+    vertices, faces = geometry.torus(10_000)
+
+    damaged = trimesh.Trimesh(*geometry.broken(kind, vertices, faces), process=False)
+
+    if kind == "holes":
+        assert not damaged.is_watertight
+    elif kind == "flipped":
+        assert not damaged.is_winding_consistent
+    elif kind == "degenerate":
+        assert (damaged.area_faces == 0).any()
+    else:
+        assert len(damaged.faces) == 2 * len(faces)
+        assert damaged.bounds[1][0] > vertices[:, 0].max()
+
+
+@pytest.mark.parametrize("file_format", geometry.FORMATS)
+def test_written_meshes_load_back(tmp_path, file_format):
+    vertices, faces = geometry.torus(1_000)
+    path = str(tmp_path / f"torus.{file_format}")
+
+    geometry.write_mesh(path, file_format, vertices, faces)
+
+    loaded = trimesh.load(path, file_type=file_format, force="mesh")
+    assert len(loaded.faces) == len(faces)
+    assert np.allclose(loaded.bounds, trimesh.Trimesh(vertices, faces).bounds, atol=1e-4)
+
+
+def test_cases_are_generated_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(geometry, "SIZES", {"1k": 1_000})
+    monkeypatch.setattr(geometry, "BROKEN_SIZE", "1k")
+
+    cases = geometry.generate_cases(str(tmp_path), ["1k"], ["stl", "obj"], True)
+    written = {name: os.path.getmtime(path) for name, path, _ in cases}
+    again = geometry.generate_cases(str(tmp_path), ["1k"], ["stl", "obj"], True)
+
+    names = [name for name, _, _ in cases]
+    assert names[:2] == ["stl/torus-1k", "obj/torus-1k"]
+    # Truncation only applies to binary STL
+    assert "stl/truncated-1k" in names and "obj/truncated-1k" not in names
+    assert len(names) == 2 + 2 * 4 + 1
+    assert {name: os.path.getmtime(path) for name, path, _ in again} == written
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize("path_name", list(geometry.PATHS))
+def test_measure_summarizes_runs(tmp_path, path_name):
+    path = str(tmp_path / "torus.stl")
+    geometry.write_mesh(path, "stl", *geometry.torus(1_000))
+
+    case = geometry.measure(geometry.PATHS[path_name], path, ".stl", repeat=3, max_seconds=60.0)
+
+    assert case["runs"] == 3
+    assert case["error"] is None
+    assert case["triangles"] == 1_008
+    assert case["bytes"] == 84 + 50 * 1_008
+    assert 0 < case["p50"] <= case["p95"] <= case["max"]
+
+
+def test_measure_records_errors_and_respects_the_time_limit(tmp_path):
+    path = tmp_path / "model.stl"
+    path.write_bytes(b"x")
+    calls = []
+
+    def failing(path, file_ext):
+        calls.append(path)
+        raise ValueError("bad mesh")
+
+    case = geometry.measure(failing, str(path), ".stl", repeat=5, max_seconds=0.0)
+
+    assert len(calls) == case["runs"] == 1
+    assert case["error"] == "ValueError: bad mesh"
+    assert case["triangles"] is None
+
+
+def test_compare_ignores_noise_and_new_cases():
+    baseline = {"cases": {
+        "slower": _case(), "noise": _case(p50=0.001), "bigger": _case(), "broke": _case(), "same": _case()
+    }}
+    results = {"cases": {
+        "slower": _case(p50=0.2),
+        # 3x slower, but only by 2 ms
+        "noise": _case(p50=0.003),
+        "bigger": _case(peak=200 << 20),
+        "broke": _case(error="ValueError: bad mesh"),
+        "same": _case(p50=0.11),
+        "new": _case(p50=10.0),
+    }}
+
+    regressions = geometry.compare(results, baseline, 0.25)
+
+    assert [r.split(":")[0] for r in regressions] == ["slower", "bigger", "broke"]
+
+
+def test_main_saves_then_compares_with_a_baseline(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    args = [
+        "--sizes", "1k", "--formats", "stl", "--no-broken", "--repeat", "1",
+        "--mesh-dir", str(tmp_path / "meshes"), "--baseline", str(baseline),
+        # Single runs of a tiny mesh are too noisy to compare timings
+        "--tolerance", "1000"
+    ]
+
+    assert geometry.main(args) == 0
+    assert "No baseline" in capsys.readouterr().out
+    assert geometry.main(args + ["--save-baseline"]) == 0
+    saved = json.loads(baseline.read_text())
+    assert set(saved["cases"]) == {"stl/torus-1k/analyze", "stl/torus-1k/validate"}
+
+    assert geometry.main(args) == 0
+    assert "No regressions" in capsys.readouterr().out
+
+    # Cases that used to fail and now pass count as changed too
+    for case in saved["cases"].values():
+        case["error"] = "ValueError: bad mesh"
+    baseline.write_text(json.dumps(saved))
+    assert geometry.main(args) == 1
+    assert "2 regression(s)" in capsys.readouterr().out
+
+
+def test_main_rejects_unknown_options(tmp_path):
+    with pytest.raises(SystemExit):
+        geometry.main(["--sizes", "2k", "--mesh-dir", str(tmp_path)])
@@ -0,0 +1,79 @@
+"""Compact stored form: lossless round trip, quantization, and the copies made on ingest."""
+import hashlib
+
+import numpy as np
+import pytest
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import analysis, compact, objects, tasks
+
+
+def _triangles() -> np.ndarray:
+    mesh = trimesh.creation.icosphere(subdivisions=3, radius=12.5)
+    mesh.apply_translation([3.25, -7.5, 40.0])
+    return np.asarray(mesh.triangles, dtype=np.float32)
+
+
+def test_lossless_round_trip():
+    triangles = _triangles()
+
+    data = compact.encode(triangles)
+
+    np.testing.assert_array_equal(compact.load_triangles(data), triangles)
+    # Welded and compressed: well under a binary STL's 50 bytes per face
+    assert len(data) < 50 * len(triangles) / 2
+
+
+def test_quantized_copy_moves_vertices_at_most_half_a_step():
+    triangles = _triangles()
+
+    decoded = compact.load_triangles(compact.encode(triangles, step=0.01))
+
+    assert decoded.shape == triangles.shape
+    assert np.abs(decoded - triangles).max() <= 0.005 + 1e-5
+
+
+def test_rejects_other_data():
+    with pytest.raises(compact.CompactFormatError):
+        compact.decode(b"AKMESH")
+    data = bytearray(compact.encode(_triangles()))
+    data[-10:] = b"\0" * 10
+    with pytest.raises(compact.CompactFormatError):
+        compact.decode(bytes(data))
+
+
+def _stl() -> bytes:
+    return trimesh.exchange.stl.export_stl(trimesh.creation.icosphere(subdivisions=3, radius=9.0))
+
+
+def test_compact_analysis_matches_the_original(tmp_path):
+    path = tmp_path / "ball.stl"
+    path.write_bytes(_stl())
+    original = analysis.inspect_path(str(path), ".stl")
+
+    inspected = analysis.inspect_compact(compact.encode(analysis.load_triangles(str(path), ".stl")))
+
+    assert inspected["analysis"] == original["analysis"]
+
+
+def test_ingest_stores_the_compact_copy_under_its_step(s3, bucket, tmp_path, monkeypatch):
+    data = _stl()
+    digest = hashlib.sha256(data).hexdigest()
+    path = tmp_path / "ball.stl"
+
+    for step in (None, 0.05):
+        monkeypatch.setattr(settings, "MESH_QUANTIZATION_STEP", step)
+        path.write_bytes(data)
+        tasks.ingest_task.apply(args=(str(path), ".stl", digest, False))
+        assert not path.exists()
+
+    listing = s3.list_objects_v2(Bucket=bucket, Prefix=compact.compact_prefix(digest))
+    assert {obj["Key"] for obj in listing["Contents"]} == {
+        compact.compact_key(digest), compact.compact_key(digest, 0.05)
+    }
+    # Analysis only ever reads the lossless copy
+    path.write_bytes(data)
+    np.testing.assert_array_equal(
+        compact.load_triangles(objects._get_compact(s3, digest)), analysis.load_triangles(str(path), ".stl")
+    )
@@ -0,0 +1,31 @@
+"""Settings that are checked when the app starts."""
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+
+
+def test_default_quantity_discounts_are_valid():
+    settings = Settings()
+
+    assert len(settings.QUOTE_QUANTITY_BREAKS) == len(settings.QUOTE_QUANTITY_DISCOUNTS)
+
+
+@pytest.mark.parametrize("breaks, discounts, message", [
+    ([10, 50], [0.05, 0.1, 0.15], "has 2 entries"),
+    ([10, 50, 200], [0.05], "has 3 entries"),
+    ([50, 10], [0.05, 0.1], "strictly increasing"),
+    ([10, 10], [0.05, 0.1], "strictly increasing"),
+    ([0, 10], [0.05, 0.1], "positive"),
+    ([10, 50], [0.05, 1.0], "in [0, 1)"),
+    ([10, 50], [-0.1, 0.1], "in [0, 1)"),
+])
+def test_inconsistent_quantity_discounts_are_rejected(breaks, discounts, message):
+    with pytest.raises(ValidationError, match=message.replace("[", r"\[").replace(")", r"\)")):
+        Settings(QUOTE_QUANTITY_BREAKS=breaks, QUOTE_QUANTITY_DISCOUNTS=discounts)
+
+
+def test_quantity_discounts_may_be_turned_off():
+    settings = Settings(QUOTE_QUANTITY_BREAKS=[], QUOTE_QUANTITY_DISCOUNTS=[])
+
+    assert settings.QUOTE_QUANTITY_BREAKS == []
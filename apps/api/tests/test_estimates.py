@@ -0,0 +1,87 @@
+"""Estimate matrix on /analyze and the cache key that depends on its settings."""
+from dataclasses import replace
+
+import numpy as np
+import pytest
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import analysis, profiles
+from app.services.geometry.cache import analysis_cache
+
+
+def _stl() -> bytes:
+    return trimesh.exchange.stl.export_stl(trimesh.creation.box(extents=(20.0, 10.0, 5.0)))
+
+
+def _analyze(client, data: bytes):
+    return client.post("/geometry/analyze", files={"file": ("box.stl", data, "model/stl")})
+
+
+def _estimate(extents):
+    mesh = trimesh.creation.box(extents=extents)
+    return analysis.estimate_print([mesh.triangles], mesh.bounds)
+
+
+def test_matrix_covers_the_configured_axes_and_the_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "ESTIMATE_MATERIALS", ["PETG", "RESIN"])
+    monkeypatch.setattr(settings, "ESTIMATE_LAYER_HEIGHTS", [0.12, 0.28])
+    monkeypatch.setattr(settings, "ESTIMATE_INFILL_DENSITIES", [0.5])
+
+    estimate = _estimate((20.0, 10.0, 5.0))
+
+    matrix = estimate["matrix"]
+    assert matrix["printer"] == settings.PRINTER_PROFILE
+    assert matrix["materials"] == ["PETG", "RESIN", "PLA"]
+    assert matrix["layerHeights"] == [0.12, 0.28, 0.2]
+    assert matrix["infillDensities"] == [0.5, 0.15]
+    assert np.shape(matrix["printTime"]) == (3, 3, 2)
+    assert np.shape(matrix["material"]) == (3, 3, 2)
+    # The headline numbers are the default profile's cell
+    assert estimate["print_time"] == pytest.approx(matrix["printTime"][2][2][1], abs=1e-3)
+    assert estimate["material"] == pytest.approx(matrix["material"][2][2][1], abs=0.01)
+
+
+def test_finer_layers_and_denser_infill_take_longer():
+    times = _estimate((60.0, 60.0, 30.0))["matrix"]["printTime"][0]
+
+    assert times[0][0] > times[-1][0]
+    assert times[0][-1] > times[0][0]
+
+
+def test_analyze_returns_the_matrix(client):
+    body = _analyze(client, _stl()).json()
+
+    assert body["estimates"]["printer"] == settings.PRINTER_PROFILE
+    assert body["estimatedPrintTime"] > 0
+
+
+def test_cache_key_follows_the_estimate_settings(monkeypatch):
+    key = analysis_cache.key("inspect", "a" * 64, ".stl")
+    assert key == analysis_cache.key("inspect", "a" * 64, ".stl")
+
+    monkeypatch.setattr(settings, "ESTIMATE_LAYER_HEIGHTS", [0.1, 0.2])
+    assert analysis_cache.key("inspect", "a" * 64, ".stl") != key
+
+
+def test_cache_key_follows_the_resolved_profiles(monkeypatch):
+    key = analysis_cache.key("inspect", "a" * 64, ".stl")
+
+    printer = profiles.get_printer(settings.PRINTER_PROFILE)
+    monkeypatch.setitem(profiles.PRINTERS, printer.name, replace(printer, speed_factor=0.4))
+    slower = analysis_cache.key("inspect", "a" * 64, ".stl")
+    assert slower != key
+
+    monkeypatch.setitem(profiles.MATERIALS, "PLA", replace(profiles.get_material("PLA"), density=1.3))
+    assert analysis_cache.key("inspect", "a" * 64, ".stl") not in (key, slower)
+
+
+def test_settings_change_misses_the_cache(client, monkeypatch):
+    data = _stl()
+    assert _analyze(client, data).headers["X-Cache"] == "MISS"
+    assert _analyze(client, data).headers["X-Cache"] == "HIT-MEMORY"
+
+    monkeypatch.setattr(settings, "PRINTER_PROFILE", "bambu-a1")
+    response = _analyze(client, data)
+
+    assert response.headers["X-Cache"] == "MISS"
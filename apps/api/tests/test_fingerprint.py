@@ -0,0 +1,123 @@
+"""Shape fingerprints, the near-duplicate index, and what /analyze reuses from a match."""
+import asyncio
+
+import numpy as np
+import pytest
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import fingerprint
+from app.services.geometry.similarity import fingerprint_index
+
+from .conftest import auth
+
+
+def _part() -> trimesh.Trimesh:
+    """An asymmetric part: a plate with a post off-centre."""
+    plate = trimesh.creation.box(extents=(40.0, 25.0, 4.0))
+    post = trimesh.creation.cylinder(radius=4.0, height=20.0, sections=48)
+    post.apply_translation([12.0, 5.0, 12.0])
+    return trimesh.util.concatenate([plate, post])
+
+
+def _moved(mesh: trimesh.Trimesh) -> trimesh.Trimesh:
+    """The same surface re-triangulated, rotated and translated."""
+    moved = mesh.subdivide()
+    moved.apply_transform(trimesh.transformations.rotation_matrix(0.7, [1.0, 2.0, 0.5]))
+    moved.apply_translation([100.0, -30.0, 7.5])
+    return moved
+
+
+def _signature(mesh: trimesh.Trimesh) -> np.ndarray:
+    return fingerprint.compute_signature(np.asarray(mesh.triangles))
+
+
+def _distance(a, b) -> float:
+    return float(fingerprint.distance(
+        a, b, settings.SIMILARITY_SCALAR_TOLERANCE, settings.SIMILARITY_SHAPE_TOLERANCE
+    ))
+
+
+@pytest.fixture(autouse=True)
+def _empty_index():
+    fingerprint_index.clear()
+    yield
+    fingerprint_index.clear()
+
+
+def test_signature_survives_retriangulation_and_placement():
+    part = _part()
+
+    assert _distance(_signature(part), _signature(_moved(part))) <= 1
+
+
+def test_other_shapes_are_not_near_duplicates():
+    part = _part()
+    scaled = part.copy()
+    scaled.apply_scale(1.1)
+    other = trimesh.creation.box(extents=(40.0, 25.0, 24.0))
+
+    assert _distance(_signature(part), _signature(scaled)) > 1
+    assert _distance(_signature(part), _signature(other)) > 1
+
+
+def test_signature_round_trips_through_its_encoding():
+    signature = _signature(_part())
+
+    assert fingerprint.decode(fingerprint.encode(signature)).tobytes() == signature.tobytes()
+
+
+def test_index_returns_matches_closest_first():
+    part = _part()
+    for digest, ext, mesh in (("a", ".stl", part), ("b", ".obj", _moved(part)), ("c", ".stl", trimesh.creation.icosphere())):
+        asyncio.run(fingerprint_index.add(digest * 64, ext, _signature(mesh)))
+
+    matches = fingerprint_index.nearest(_signature(part), limit=None, exclude="a" * 64)
+
+    assert [(digest, ext) for digest, ext, _ in matches] == [("b" * 64, ".obj")]
+    assert fingerprint_index.nearest(_signature(part), limit=1)[0][:2] == ("a" * 64, ".stl")
+
+
+def _analyze(client, mesh: trimesh.Trimesh):
+    data = trimesh.exchange.stl.export_stl(mesh)
+    return client.post("/geometry/analyze", files={"file": ("part.stl", data, "model/stl")})
+
+
+def test_analyze_does_not_reuse_near_duplicates_by_default(client):
+    part = _part()
+    _analyze(client, part)
+
+    response = _analyze(client, _moved(part))
+
+    assert response.headers["X-Cache"] == "MISS"
+
+
+def test_reused_analysis_keeps_the_uploads_own_placement(client, monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_REUSE_ANALYSIS", True)
+    part, moved = _part(), _moved(_part())
+    original = _analyze(client, part).json()
+
+    response = _analyze(client, moved)
+
+    assert response.headers["X-Cache"] == "HIT-SIMILAR"
+    reused = response.json()
+    # Placement-independent values come from the match
+    assert reused["volume"] == original["volume"]
+    assert reused["surfaceArea"] == original["surfaceArea"]
+    # Everything that depends on this file is its own
+    assert reused["triangleCount"] == len(moved.faces)
+    np.testing.assert_allclose(reused["boundingBox"]["min"], moved.bounds[0], atol=1e-4)
+    np.testing.assert_allclose(reused["boundingBox"]["max"], moved.bounds[1], atol=1e-4)
+    assert reused["estimatedPrintTime"] != original["estimatedPrintTime"]
+
+
+def test_similar_only_lists_the_callers_models(client, s3):
+    part = _part()
+    _analyze(client, part)
+    data = trimesh.exchange.stl.export_stl(part)
+    client.post("/upload/model", files={"file": ("part.stl", data, "model/stl")}, headers=auth("alice"))
+    query = {"file": ("copy.stl", trimesh.exchange.stl.export_stl(_moved(part)), "model/stl")}
+
+    assert client.post("/geometry/similar", files=query).status_code in (401, 403)
+    assert len(client.post("/geometry/similar", files=query, headers=auth("alice")).json()) == 1
+    assert client.post("/geometry/similar", files=query, headers=auth("bob")).json() == []
@@ -0,0 +1,105 @@
+"""Responsive image derivatives for /upload/image."""
+import io
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services import images
+
+from .conftest import auth
+
+
+def _jpeg(tmp_path, size=(3000, 2000), orientation=None):
+    image = Image.new("RGB", size, (200, 80, 40))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    path = tmp_path / "photo.jpg"
+    image.save(path, format="JPEG", exif=exif)
+    return str(path)
+
+
+def _widths(built, extension=None) -> list:
+    return [d["width"] for d in built["derivatives"] if extension in (None, d["format"])]
+
+
+def test_derivatives_cover_the_configured_widths_largest_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [320, 1024, 1600])
+
+    built = images.build_derivatives(_jpeg(tmp_path))
+
+    assert (built["width"], built["height"]) == (3000, 2000)
+    extension = images.derivative_formats()[0][1]
+    assert _widths(built, extension) == [1600, 1024, 320]
+    for derivative in built["derivatives"]:
+        assert derivative["height"] == round(2000 * derivative["width"] / 3000)
+        decoded = Image.open(io.BytesIO(derivative["data"]))
+        assert decoded.size == (derivative["width"], derivative["height"])
+
+
+def test_small_images_are_never_upscaled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [320, 1024, 1600])
+
+    built = images.build_derivatives(_jpeg(tmp_path, size=(800, 600)))
+
+    extension = images.derivative_formats()[0][1]
+    assert _widths(built, extension) == [800, 320]
+
+
+def test_exif_orientation_is_applied(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [500])
+
+    # Stored landscape, displayed portrait
+    built = images.build_derivatives(_jpeg(tmp_path, size=(1500, 1000), orientation=6))
+
+    assert (built["width"], built["height"]) == (1000, 1500)
+    assert (built["derivatives"][0]["width"], built["derivatives"][0]["height"]) == (500, 750)
+
+
+def test_unreadable_and_oversized_images_are_rejected(tmp_path, monkeypatch):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    with pytest.raises(images.InvalidImageError):
+        images.build_derivatives(str(path))
+
+    # build_derivatives sets Pillow's process-wide limit; restore it afterwards
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS)
+    monkeypatch.setattr(settings, "IMAGE_MAX_PIXELS", 1000)
+    for size in ((40, 40), (100, 100)):
+        with pytest.raises(images.InvalidImageError, match="limited to 1000 pixels"):
+            images.build_derivatives(_jpeg(tmp_path, size=size))
+
+
+def test_srcset_groups_derivatives_by_type():
+    derivatives = [
+        {"name": "640w.webp", "width": 640, "contentType": "image/webp"},
+        {"name": "320w.webp", "width": 320, "contentType": "image/webp"},
+        {"name": "640w.jpg", "width": 640, "contentType": "image/jpeg"},
+    ]
+    urls = {d["name"]: f"https://cdn/{d['name']}" for d in derivatives}
+
+    assert images.srcset(derivatives, urls) == {
+        "image/webp": "https://cdn/640w.webp 640w, https://cdn/320w.webp 320w",
+        "image/jpeg": "https://cdn/640w.jpg 640w",
+    }
+
+
+def test_upload_stores_derivatives_and_deletes_them_with_the_image(client, s3, tmp_path):
+    with open(_jpeg(tmp_path, size=(700, 500)), "rb") as f:
+        data = f.read()
+
+    response = client.post(
+        "/upload/image", files={"file": ("photo.jpg", data, "image/jpeg")}, headers=auth("alice")
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    prefix = body["key"].rsplit(".", 1)[0] + "/"
+    stored = {obj["Key"] for obj in s3.list_objects_v2(Bucket=settings.AWS_S3_BUCKET)["Contents"]}
+    assert stored == {body["key"]} | {d["key"] for d in body["derivatives"]}
+    assert all(d["key"].startswith(prefix) for d in body["derivatives"])
+    assert body["srcset"]
+
+    assert client.delete(f"/upload/{body['key']}", headers=auth("alice")).status_code == 200
+    assert "Contents" not in s3.list_objects_v2(Bucket=settings.AWS_S3_BUCKET)
@@ -0,0 +1,92 @@
+"""Async geometry jobs: ?async=true queues on Celery, /geometry/jobs/{id} reports them."""
+import trimesh
+
+from app.core.celery_app import celery_app
+from app.services.geometry import tasks
+
+
+def _stl() -> bytes:
+    return trimesh.exchange.stl.export_stl(trimesh.creation.box(extents=(20.0, 10.0, 5.0)))
+
+
+def _submit(client, path: str, data: bytes, filename: str = "box.stl"):
+    return client.post(f"{path}?async=true", files={"file": (filename, data, "model/stl")})
+
+
+def test_celery_runs_eagerly():
+    assert celery_app.conf.task_always_eager
+    assert celery_app.conf.task_store_eager_result
+
+
+def test_async_analyze_queues_a_job_and_polling_returns_its_result(client):
+    response = _submit(client, "/geometry/analyze", _stl())
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "PENDING"
+    assert response.headers["Location"] == f"/geometry/jobs/{job['id']}"
+
+    polled = client.get(response.headers["Location"])
+    assert polled.status_code == 200
+    body = polled.json()
+    assert body["status"] == "SUCCESS"
+    assert body["progress"] == 1.0
+    analysis = body["result"]["analysis"]
+    assert analysis["volume"] == 1000.0
+    assert analysis["boundingBox"]["dimensions"] == [20.0, 10.0, 5.0]
+    assert body["result"]["valid"] is True
+
+
+def test_polled_result_fills_the_cache(client):
+    data = _stl()
+    job = _submit(client, "/geometry/analyze", data).json()
+    client.get(f"/geometry/jobs/{job['id']}")
+
+    again = _submit(client, "/geometry/analyze", data)
+
+    # Answered from the cache without queueing another job
+    assert again.status_code == 200
+    assert again.headers["X-Cache"] == "HIT-MEMORY"
+    assert again.json()["volume"] == 1000.0
+
+
+def test_async_validate(client):
+    job = _submit(client, "/geometry/validate", _stl()).json()
+
+    body = client.get(f"/geometry/jobs/{job['id']}").json()
+
+    assert body["status"] == "SUCCESS"
+    assert body["result"]["valid"] is True
+    assert body["result"]["issues"] == []
+
+
+def test_failed_job_reports_its_error(client):
+    job = _submit(client, "/geometry/analyze", b"solid nothing\nendsolid nothing\n").json()
+
+    body = client.get(f"/geometry/jobs/{job['id']}").json()
+
+    assert body["status"] == "FAILURE"
+    assert body["error"]
+    assert body["result"] is None
+
+
+def test_unknown_job_is_pending(client):
+    body = client.get("/geometry/jobs/00000000-0000-0000-0000-000000000000").json()
+
+    assert body == {"id": "00000000-0000-0000-0000-000000000000", "status": "PENDING",
+                    "progress": None, "result": None, "error": None}
+
+
+def test_task_reports_progress_and_removes_its_file(tmp_path, monkeypatch):
+    path = tmp_path / "box.stl"
+    path.write_bytes(_stl())
+    updates = []
+    monkeypatch.setattr(tasks, "PROGRESS_INTERVAL", 0.0)
+    monkeypatch.setattr(tasks.inspect_task, "update_state", lambda **kwargs: updates.append(kwargs))
+
+    result = tasks.inspect_task.apply(args=(str(path), ".stl", "d" * 64)).get()
+
+    assert result["digest"] == "d" * 64 and result["fileExt"] == ".stl"
+    assert result["inspection"]["analysis"]["triangle_count"] == 12
+    assert updates and all(update["state"] == "PROGRESS" for update in updates)
+    assert not path.exists()
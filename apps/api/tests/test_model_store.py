@@ -0,0 +1,164 @@
+"""Blobs are stored once and deleted with their last reference."""
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.services import model_store
+from app.services.geometry import previews
+from app.services.geometry.compact import compact_key
+
+EXT = ".stl"
+
+
+@pytest.fixture
+def model(tmp_path):
+    data = b"solid box\nendsolid box\n" * 64
+    path = tmp_path / "model.stl"
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _store(db, s3, bucket, model, user_id, key):
+    path, digest, _ = model
+    return model_store.store(db, s3, bucket, user_id, key, "box.stl", digest, EXT, path, "model/stl")
+
+
+def _keys(s3, bucket) -> set:
+    return {obj["Key"] for obj in s3.list_objects_v2(Bucket=bucket).get("Contents", [])}
+
+
+def _ref_count(db, blob):
+    return db.execute(text('SELECT "refCount" FROM "ModelBlob" WHERE key = :key'), {"key": blob}).scalar()
+
+
+def test_store_uploads_each_blob_once(db, s3, bucket, model):
+    _, digest, _ = model
+    blob = model_store.blob_key(digest, EXT)
+
+    assert _store(db, s3, bucket, model, "alice", "models/alice/a.stl") is False
+    assert _store(db, s3, bucket, model, "bob", "models/bob/b.stl") is True
+
+    assert _keys(s3, bucket) == {blob}
+    assert _ref_count(db, blob) == 2
+    assert s3.head_object(Bucket=bucket, Key=blob)["Metadata"]["sha256"] == digest
+
+
+def test_store_uploads_again_if_blob_vanished(db, s3, bucket, model):
+    _, digest, _ = model
+    blob = model_store.blob_key(digest, EXT)
+    _store(db, s3, bucket, model, "alice", "models/alice/a.stl")
+    s3.delete_object(Bucket=bucket, Key=blob)
+
+    assert _store(db, s3, bucket, model, "bob", "models/bob/b.stl") is False
+    assert blob in _keys(s3, bucket)
+
+
+def _proofs(data: bytes, challenge: dict) -> list:
+    return [model_store.proof(challenge, data[offset:offset + length]) for offset, length in challenge["ranges"]]
+
+
+def test_claim_needs_the_stored_blob_and_proof_of_its_bytes(db, s3, bucket, model):
+    path, digest, size = model
+    data = open(path, "rb").read()
+    challenge = model_store.new_challenge("bob", digest, EXT, size)
+
+    assert not model_store.is_stored(db, digest, EXT, size)
+    assert not model_store.claim(db, s3, bucket, "bob", "models/bob/b.stl", "box.stl", challenge, _proofs(data, challenge))
+
+    _store(db, s3, bucket, model, "alice", "models/alice/a.stl")
+    assert model_store.is_stored(db, digest, EXT, size)
+    assert not model_store.is_stored(db, digest, EXT, size + 1)
+    # Knowing the digest is not enough, even when a range is the whole file
+    assert not model_store.claim(
+        db, s3, bucket, "bob", "models/bob/b.stl", "box.stl", challenge, [digest] * len(challenge["ranges"])
+    )
+    wrong = _proofs(b"x" * size, challenge)
+    assert not model_store.claim(db, s3, bucket, "bob", "models/bob/b.stl", "box.stl", challenge, wrong)
+    assert not model_store.claim(db, s3, bucket, "bob", "models/bob/b.stl", "box.stl", challenge, [])
+    assert _ref_count(db, model_store.blob_key(digest, EXT)) == 1
+
+    assert model_store.claim(db, s3, bucket, "bob", "models/bob/b.stl", "box.stl", challenge, _proofs(data, challenge))
+    assert _ref_count(db, model_store.blob_key(digest, EXT)) == 2
+
+
+def test_challenge_ranges_lie_within_the_file(monkeypatch):
+    monkeypatch.setattr(settings, "CLAIM_PROOF_BYTES", 100)
+    for size in (1, 99, 100, 101, 10_000):
+        challenge = model_store.new_challenge("bob", "0" * 64, EXT, size)
+        assert len(challenge["ranges"]) == settings.CLAIM_PROOF_RANGES
+        for offset, length in challenge["ranges"]:
+            assert length == min(100, size) and 0 <= offset and offset + length <= size
+
+
+def test_challenge_token_is_bound_to_its_user():
+    token = model_store.encode_challenge(model_store.new_challenge("bob", "0" * 64, EXT, 10))
+
+    assert model_store.decode_challenge(token, "bob")["sha256"] == "0" * 64
+    with pytest.raises(model_store.ChallengeInvalid):
+        model_store.decode_challenge(token, "alice")
+    with pytest.raises(model_store.ChallengeInvalid):
+        model_store.decode_challenge(token[:-2], "bob")
+
+
+def test_blob_keys_do_not_reveal_the_digest(model):
+    _, digest, _ = model
+    blob = model_store.blob_key(digest, EXT)
+
+    assert digest not in blob and digest not in compact_key(digest)
+    assert blob == model_store.blob_key(digest, EXT)
+
+
+def test_release_deletes_blob_and_compact_copies_with_last_reference(db, s3, bucket, model):
+    _, digest, _ = model
+    blob = model_store.blob_key(digest, EXT)
+    _store(db, s3, bucket, model, "alice", "models/alice/a.stl")
+    _store(db, s3, bucket, model, "bob", "models/bob/b.stl")
+    compact = {compact_key(digest), compact_key(digest, 0.01)}
+    for key in compact:
+        s3.put_object(Bucket=bucket, Key=key, Body=b"compact")
+
+    assert not model_store.release(db, s3, bucket, "bob", "models/alice/a.stl")
+    assert model_store.release(db, s3, bucket, "alice", "models/alice/a.stl")
+    assert _keys(s3, bucket) == {blob} | compact
+
+    assert model_store.release(db, s3, bucket, "bob", "models/bob/b.stl")
+    assert _keys(s3, bucket) == set()
+    assert _ref_count(db, blob) is None
+    assert not model_store.release(db, s3, bucket, "bob", "models/bob/b.stl")
+
+
+def test_content_shared_with_another_extension_outlives_one_blob(db, s3, bucket, model):
+    path, digest, _ = model
+    _store(db, s3, bucket, model, "alice", "models/alice/a.stl")
+    model_store.store(
+        db, s3, bucket, "alice", "models/alice/a.obj", "box.obj", digest, ".obj", path, "model/obj"
+    )
+    s3.put_object(Bucket=bucket, Key=compact_key(digest), Body=b"compact")
+    os.makedirs(previews.preview_dir(digest), exist_ok=True)
+
+    assert model_store.release(db, s3, bucket, "alice", "models/alice/a.stl")
+    assert compact_key(digest) in _keys(s3, bucket)
+    assert os.path.isdir(previews.preview_dir(digest))
+
+    assert model_store.release(db, s3, bucket, "alice", "models/alice/a.obj")
+    assert _keys(s3, bucket) == set()
+    assert not os.path.exists(previews.preview_dir(digest))
+
+
+def test_readable_keys(db, s3, bucket, model):
+    _, digest, _ = model
+    blob = model_store.blob_key(digest, EXT)
+    _store(db, s3, bucket, model, "alice", "models/alice/a.stl")
+
+    assert model_store.readable_keys(db, "alice", ["models/alice/a.stl", blob, "models/alice/old.stl"]) == {
+        "models/alice/a.stl": blob,
+        blob: blob,
+        "models/alice/old.stl": "models/alice/old.stl"
+    }
+    assert model_store.readable_keys(db, "bob", ["models/alice/a.stl", blob]) == {
+        "models/alice/a.stl": None,
+        blob: None
+    }
@@ -0,0 +1,126 @@
+"""Build-plate nesting: plate counts, placements and /geometry/nest."""
+import itertools
+
+import pytest
+
+from app.core.config import settings
+from app.services.geometry import nesting, profiles
+
+PRINTER = profiles.get_printer("bambu-p1s")  # 256 × 256 mm plate, 2 mm margin
+
+
+def _part(id="part", width=50.0, depth=50.0, height=10.0, quantity=1):
+    return nesting.PartFootprint(id=id, width=width, depth=depth, height=height, quantity=quantity)
+
+
+def _overlaps(a: dict, b: dict, spacing: float) -> bool:
+    return (
+        a["plate"] == b["plate"]
+        and a["x"] < b["x"] + b["width"] + spacing - 1e-6
+        and b["x"] < a["x"] + a["width"] + spacing - 1e-6
+        and a["y"] < b["y"] + b["depth"] + spacing - 1e-6
+        and b["y"] < a["y"] + a["depth"] + spacing - 1e-6
+    )
+
+
+def _check_layout(result: dict, spacing: float):
+    width, depth, _ = result["plateSize"]
+    margin = PRINTER.bed_margin
+    for placement in result["placements"]:
+        assert placement["x"] >= margin - 1e-6
+        assert placement["y"] >= margin - 1e-6
+        assert placement["x"] + placement["width"] <= width - margin + 1e-6
+        assert placement["y"] + placement["depth"] <= depth - margin + 1e-6
+    for a, b in itertools.combinations(result["placements"], 2):
+        assert not _overlaps(a, b, spacing)
+
+
+def test_a_grid_of_squares_fills_one_plate():
+    # (256 - 4 + 2) / (48 + 2) = 5 per row
+    result = nesting.nest([_part(width=48.0, depth=48.0, quantity=25)], PRINTER, spacing=2.0)
+
+    assert result["plateCount"] == 1
+    assert len(result["placements"]) == 25
+    assert result["utilization"] == pytest.approx(25 * 48 * 48 / 256 ** 2)
+    _check_layout(result, 2.0)
+
+    overflow = nesting.nest([_part(width=48.0, depth=48.0, quantity=26)], PRINTER, spacing=2.0)
+    assert overflow["plateCount"] == 2
+    assert [p["plate"] for p in overflow["placements"]].count(1) == 1
+
+
+def test_mixed_parts_never_overlap():
+    parts = [
+        _part("a", 120.0, 80.0, quantity=3),
+        _part("b", 30.0, 70.0, quantity=11),
+        _part("c", 15.0, 15.0, quantity=40),
+        _part("d", 200.0, 20.0, quantity=2),
+    ]
+
+    result = nesting.nest(parts, PRINTER, spacing=3.0)
+
+    assert len(result["placements"]) == 56
+    assert sorted({p["instance"] for p in result["placements"] if p["id"] == "b"}) == list(range(11))
+    assert len(result["plateUtilization"]) == result["plateCount"]
+    _check_layout(result, 3.0)
+
+
+def test_rotation_lets_long_parts_share_a_plate():
+    # The first takes the full depth on the left; the second only fits
+    # beside it turned through 90°
+    parts = [_part("tall", 120.0, 250.0), _part("wide", 250.0, 120.0)]
+
+    rotated = nesting.nest(parts, PRINTER)
+    fixed = nesting.nest(parts, PRINTER, allow_rotation=False)
+
+    assert rotated["plateCount"] == 1
+    wide = next(p for p in rotated["placements"] if p["id"] == "wide")
+    assert wide["rotated"]
+    assert (wide["width"], wide["depth"]) == (120.0, 250.0)
+    _check_layout(rotated, 2.0)
+    assert fixed["plateCount"] == 2
+    assert not any(p["rotated"] for p in fixed["placements"])
+
+
+def test_parts_that_cannot_fit_are_rejected():
+    with pytest.raises(nesting.NestingError, match="taller"):
+        nesting.nest([_part(height=300.0)], PRINTER)
+    with pytest.raises(nesting.NestingError, match="does not fit"):
+        nesting.nest([_part(width=260.0)], PRINTER)
+    # Only the bed margin limits a single part; the spacing is shared
+    nesting.check_fit(_part(width=252.0), PRINTER, spacing=10.0)
+    with pytest.raises(nesting.NestingError, match="does not fit"):
+        nesting.check_fit(_part(width=252.5), PRINTER, spacing=0.0)
+
+
+def test_nest_endpoint(client):
+    response = client.post("/geometry/nest", json={
+        "parts": [{"id": "bracket", "width": 60, "depth": 40, "height": 20, "quantity": 4}],
+        "spacing": 5
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["printer"] == PRINTER.name
+    assert body["plateCount"] == 1
+    assert len(body["placements"]) == 4
+
+
+def test_nest_endpoint_rejects_oversized_and_excessive_requests(client, monkeypatch):
+    too_big = client.post("/geometry/nest", json={
+        "parts": [{"id": "wing", "width": 400, "depth": 40, "height": 20}]
+    })
+    assert too_big.status_code == 400
+    assert "does not fit" in too_big.json()["detail"]
+
+    unknown = client.post("/geometry/nest", json={
+        "parts": [{"id": "a", "width": 10, "depth": 10, "height": 10}], "printer": "nope"
+    })
+    assert unknown.status_code == 400
+
+    monkeypatch.setattr(settings, "NESTING_MAX_INSTANCES", 10)
+    many = client.post("/geometry/nest", json={
+        "parts": [{"id": "a", "width": 10, "depth": 10, "height": 10, "quantity": 11}]
+    })
+    assert many.status_code == 400
+    assert "At most 10 instances" in many.json()["detail"]
@@ -0,0 +1,123 @@
+"""LOD previews: built on ingest of stored models, removed with them."""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import previews
+
+from .conftest import auth
+
+
+def _sphere():
+    return trimesh.creation.icosphere(subdivisions=4, radius=10.0)
+
+
+def _stl(mesh) -> bytes:
+    return trimesh.exchange.stl.export_stl(mesh)
+
+
+def _build(tmp_path, mesh, digest: str) -> dict:
+    path = tmp_path / "model.stl"
+    path.write_bytes(_stl(mesh))
+    return previews.build_previews(str(path), ".stl", digest)
+
+
+def test_levels_stay_within_their_face_budgets(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PREVIEW_LOD_FACES", [50000, 200, 1000])
+    mesh = _sphere()
+
+    manifest = _build(tmp_path, mesh, "a" * 64)
+
+    faces = [level["faces"] for level in manifest["levels"]]
+    assert faces[0] <= 200 * 1.05
+    assert faces[1] <= 1000 * 1.05
+    assert faces == sorted(faces)
+    # The full mesh fits the last budget, so it is kept as it is
+    assert faces[-1] == len(mesh.faces)
+    directory = previews.preview_dir("a" * 64)
+    assert previews.load_manifest("a" * 64) == manifest
+    for level in manifest["levels"]:
+        with open(os.path.join(directory, level["name"]), "rb") as f:
+            data = f.read()
+        assert struct.unpack_from("<III", data) == (previews.GLB_MAGIC, 2, len(data))
+        assert level["bytes"] == len(data)
+
+
+def test_glb_positions_round_trip_within_quantization(tmp_path):
+    mesh = _sphere()
+    _build(tmp_path, mesh, "b" * 64)
+
+    loaded = trimesh.load(os.path.join(previews.preview_dir("b" * 64), "lod0.glb"), force="mesh")
+
+    # glTF is Y-up; the preview's extent matches the model's
+    extent = loaded.bounds[1] - loaded.bounds[0]
+    assert np.allclose(sorted(extent), sorted(mesh.extents), atol=20.0 / previews.QUANTIZATION_LEVELS * 2)
+
+
+def test_claim_is_exclusive_until_released(tmp_path):
+    digest = "c" * 64
+
+    assert previews.claim(digest)
+    assert not previews.claim(digest)
+    previews.release(digest)
+    assert previews.claim(digest)
+    previews.release(digest)
+
+    _build(tmp_path, _sphere(), digest)
+    assert not previews.claim(digest)
+
+    previews.remove(digest)
+    assert not os.path.exists(previews.preview_dir(digest))
+    assert previews.load_manifest(digest) is None
+
+
+def test_preview_endpoints(client, tmp_path):
+    digest = "d" * 64
+    assert client.get(f"/geometry/previews/{digest}").status_code == 404
+
+    _build(tmp_path, _sphere(), digest)
+
+    manifest = client.get(f"/geometry/previews/{digest}").json()
+    assert manifest["thumbnailUrl"] == f"/geometry/previews/{digest}/thumbnail"
+    level = client.get(manifest["levels"][0]["url"])
+    assert level.headers["content-type"] == "model/gltf-binary"
+    assert len(level.content) == manifest["levels"][0]["bytes"]
+    assert client.get(f"/geometry/previews/{digest}/manifest.json").status_code == 404
+
+
+def test_analyze_builds_no_previews(client):
+    data = _stl(_sphere())
+
+    response = client.post("/geometry/analyze", files={"file": ("ball.stl", data, "model/stl")})
+
+    assert response.status_code == 200
+    assert "X-Preview-Url" not in response.headers
+    assert not os.path.exists(previews.preview_dir(hashlib.sha256(data).hexdigest()))
+
+
+def test_stored_models_get_previews_until_their_last_reference_goes(client, s3):
+    data = _stl(_sphere())
+    digest = hashlib.sha256(data).hexdigest()
+
+    uploads = [
+        client.post(
+            "/upload/model", files={"file": ("ball.stl", data, "model/stl")}, headers=auth(user_id)
+        ).json()
+        for user_id in ("alice", "bob")
+    ]
+
+    assert uploads[0]["previewUrl"] == f"/geometry/previews/{digest}"
+    with open(os.path.join(previews.preview_dir(digest), "manifest.json")) as f:
+        assert json.load(f)["digest"] == digest
+
+    client.delete(f"/upload/{uploads[0]['key']}", headers=auth("alice"))
+    assert client.get(uploads[1]["previewUrl"]).status_code == 200
+
+    client.delete(f"/upload/{uploads[1]['key']}", headers=auth("bob"))
+    assert client.get(uploads[1]["previewUrl"]).status_code == 404
+    assert not os.path.exists(previews.preview_dir(digest))
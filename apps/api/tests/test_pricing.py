@@ -0,0 +1,148 @@
+"""Quote pricing from geometry analysis."""
+import asyncio
+import hashlib
+
+import pytest
+import trimesh
+
+from app.core.config import settings
+from app.models.schemas import QuoteEstimate, QuoteItemCreate
+from app.services import model_store, pricing
+from app.services.geometry import analysis, profiles
+from app.services.geometry.cache import analysis_cache
+
+PRINTER = profiles.get_printer("bambu-p1s")
+
+
+@pytest.fixture(scope="module")
+def box(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pricing") / "box.stl"
+    trimesh.creation.box(extents=(40.0, 30.0, 12.0)).export(path)
+    return str(path), analysis.inspect_path(str(path), ".stl")
+
+
+def _row(box, index=0, quantity=1, material="PLA", error=None):
+    return {"index": index, "quantity": quantity, "material": material, "analysis": box[1]["analysis"], "error": error}
+
+
+def _unit(box, material="PLA"):
+    hours, grams = pricing._unit_estimate(box[1]["analysis"], material)
+    return hours, grams, grams * profiles.get_material(material).price_per_gram + hours * PRINTER.hourly_rate
+
+
+def test_single_item_costs_add_up(box, monkeypatch):
+    monkeypatch.setattr(settings, "QUOTE_MINIMUM", 0.0)
+    hours, grams, unit_price = _unit(box)
+
+    estimate = pricing.price_items([_row(box, quantity=3)], PRINTER)
+
+    item = estimate["items"][0]
+    assert item["error"] is None
+    assert (item["printTime"], item["materialUsed"]) == (round(hours, 3), round(grams, 2))
+    assert item["unitPrice"] == round(unit_price, 2)
+    assert item["discount"] == 0.0
+    assert estimate["plateCount"] == 1
+    assert estimate["materialCost"] == round(3 * grams * 3.0, 2)
+    assert estimate["machineCost"] == round(3 * hours * PRINTER.hourly_rate, 2)
+    assert estimate["plateCost"] == settings.QUOTE_PLATE_FEE
+    assert estimate["total"] == pytest.approx(3 * unit_price + settings.QUOTE_PLATE_FEE, abs=0.01)
+    assert estimate["complete"]
+    QuoteEstimate(**estimate)
+
+
+def test_estimate_matches_the_default_print_settings(box):
+    hours, grams, _ = _unit(box)
+
+    # The stored matrix is rounded
+    assert hours == pytest.approx(box[1]["analysis"]["print_time"], abs=0.01)
+    assert grams == pytest.approx(box[1]["analysis"]["material"], abs=0.01)
+
+
+@pytest.mark.parametrize("quantity, discount", [(9, 0.0), (10, 0.05), (49, 0.05), (50, 0.1), (1000, 0.15)])
+def test_quantity_discounts_apply_from_each_break(box, quantity, discount):
+    _, _, unit_price = _unit(box)
+
+    estimate = pricing.price_items([_row(box, quantity=quantity)], PRINTER)
+
+    item = estimate["items"][0]
+    assert item["discount"] == discount
+    assert item["totalPrice"] == round(unit_price * quantity * (1 - discount), 2)
+    assert estimate["discount"] == round(unit_price * quantity * discount, 2)
+
+
+def test_small_quotes_are_raised_to_the_minimum(box, monkeypatch):
+    monkeypatch.setattr(settings, "QUOTE_MINIMUM", 10_000.0)
+
+    assert pricing.price_items([_row(box)], PRINTER)["total"] == 10_000.0
+    # Nothing priced, nothing charged
+    assert pricing.price_items([_row(box, error="No stored model to price")], PRINTER)["total"] == 0.0
+
+
+def test_each_material_is_nested_on_its_own_plates(box):
+    rows = [_row(box, 0, material="PLA"), _row(box, 1, material="PETG"), _row(box, 2, material="PLA")]
+
+    estimate = pricing.price_items(rows, PRINTER)
+
+    assert estimate["plateCount"] == 2
+    assert estimate["plateCost"] == 2 * settings.QUOTE_PLATE_FEE
+
+
+def test_large_quantities_estimate_plates_from_a_sample(box, monkeypatch):
+    nested = pricing.price_items([_row(box, quantity=400)], PRINTER)["plateCount"]
+    monkeypatch.setattr(settings, "NESTING_MAX_INSTANCES", 40)
+
+    sampled = pricing.price_items([_row(box, quantity=400)], PRINTER)["plateCount"]
+
+    assert nested > 1
+    assert sampled >= nested
+
+
+def test_unpriceable_items_are_left_for_manual_pricing(box, monkeypatch):
+    tall = {**box[1]["analysis"], "bounds": [[0, 0, 0], [10, 10, 400]]}
+    rows = [
+        _row(box, 0),
+        _row(box, 1, error="Not authorized to use this file"),
+        _row(box, 2, material="NYLON"),
+        {**_row(box, 3), "analysis": tall},
+    ]
+
+    estimate = pricing.price_items(rows, PRINTER)
+
+    errors = [item["error"] for item in estimate["items"]]
+    assert errors[0] is None
+    assert errors[1] == "Not authorized to use this file"
+    assert "NYLON" in errors[2]
+    assert "taller" in errors[3]
+    assert all("totalPrice" not in item for item in estimate["items"][1:])
+    assert not estimate["complete"]
+
+    monkeypatch.setattr(settings, "LAYER_HEIGHT", 0.3)
+    stale = pricing.price_items([_row(box)], PRINTER)
+    assert stale["items"][0]["error"] == "Model analysis is out of date"
+
+
+def test_price_quote_uses_cached_analyses_of_stored_models(box, db, s3, bucket):
+    path, inspection = box
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    model_store.store(db, s3, bucket, "alice", "models/alice/box.stl", "box.stl", digest, ".stl", path, "model/stl")
+    asyncio.run(analysis_cache.set(analysis_cache.key("inspect", digest, ".stl"), inspection))
+    items = [
+        QuoteItemCreate(description="box", quantity=2, fileKey="models/alice/box.stl"),
+        QuoteItemCreate(description="same box", quantity=1, fileKey="models/alice/box.stl", material="PETG"),
+        QuoteItemCreate(description="someone else's", quantity=1, fileKey="models/bob/box.stl"),
+        QuoteItemCreate(description="drawing", quantity=1, fileKey="models/alice/drawing.pdf"),
+        QuoteItemCreate(description="by hand", quantity=1),
+    ]
+
+    estimate = asyncio.run(pricing.price_quote(items, "alice", None, db))
+
+    assert estimate["printer"] == settings.PRINTER_PROFILE
+    assert [item["error"] for item in estimate["items"]] == [
+        None, None, "Not authorized to use this file",
+        "Cannot price .pdf files automatically", "No stored model to price"
+    ]
+    assert estimate["items"][1]["material"] == "PETG"
+    assert not estimate["complete"]
+    with pytest.raises(ValueError):
+        asyncio.run(pricing.price_quote(items, "alice", "unknown-printer", db))
@@ -0,0 +1,128 @@
+"""Printability checks: overhangs, thin walls, their shared deadline and caching."""
+import asyncio
+import hashlib
+import time
+
+import pytest
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import analysis, printability
+from app.services.geometry.cache import analysis_cache
+
+FAR = float("inf")
+
+
+def _stl(mesh) -> bytes:
+    return trimesh.exchange.stl.export_stl(mesh)
+
+
+def _plate():
+    # 0.2mm thick, under the default 0.42mm line width
+    return trimesh.creation.box(extents=(20.0, 20.0, 0.2))
+
+
+def _cached(kind: str, data: bytes):
+    digest = hashlib.sha256(data).hexdigest()
+    value, _ = asyncio.run(analysis_cache.get(analysis_cache.key(kind, digest, ".stl")))
+    return value
+
+
+def test_floating_bottom_overhangs_but_a_resting_one_does_not():
+    box = trimesh.creation.box(extents=(20.0, 10.0, 5.0))
+    z_min = float(box.bounds[0][2])
+
+    resting = printability.check_overhangs(box.triangles, z_min, 45.0, FAR)
+    floating = printability.check_overhangs(box.triangles, z_min - 10.0, 45.0, FAR)
+
+    assert resting["faceCount"] == 0
+    assert resting["complete"]
+    assert floating["faceCount"] == 2
+    assert floating["area"] == pytest.approx(200.0)
+    assert sum(region["faceCount"] for region in floating["regions"]) == 2
+
+
+def test_thin_plate_is_flagged_and_a_solid_box_is_not():
+    plate = printability.check_thin_walls(_plate().triangles, 0.42, FAR)
+    box = printability.check_thin_walls(trimesh.creation.box(extents=(20.0, 20.0, 20.0)).triangles, 0.42, FAR)
+
+    assert plate["complete"]
+    assert plate["faceCount"] == 4
+    assert plate["thinnest"] == pytest.approx(0.2, abs=1e-3)
+    assert box["complete"]
+    assert box["faceCount"] == 0
+    assert box["thinnest"] is None
+
+
+def test_checks_past_their_deadline_report_a_sample():
+    triangles = _plate().triangles
+    deadline = time.monotonic() - 1.0
+
+    overhangs = printability.check_overhangs(triangles, 0.0, 45.0, deadline)
+    thin = printability.check_thin_walls(triangles, 0.42, deadline)
+
+    for check in (overhangs, thin):
+        assert not check["complete"]
+        assert check["checkedFaces"] == 0
+        assert check["checkedFraction"] == 0.0
+    assert not analysis.checks_complete({"overhangs": overhangs, "thinWalls": thin})
+
+
+def test_with_checks_turns_thin_walls_into_issues():
+    mesh = _plate()
+    inspection = analysis._inspect_mesh(mesh)
+    assert "checks" not in inspection
+    assert inspection["validation"]["valid"]
+
+    checks = analysis.check_printability(mesh.triangles, mesh.bounds)
+    validation = analysis.with_checks(inspection, checks)["validation"]
+
+    assert not validation["valid"]
+    assert validation["checks"] == checks
+    assert any("thinner than 0.42mm" in issue for issue in validation["issues"])
+    # The cached inspection is left as it was
+    assert inspection["validation"]["checks"] is None
+
+
+def test_analyze_skips_the_checks(client):
+    data = _stl(_plate())
+
+    client.post("/geometry/analyze", files={"file": ("plate.stl", data, "model/stl")})
+
+    assert _cached("inspect", data)["validation"]["checks"] is None
+    assert _cached("printability", data) is None
+
+
+def test_validate_caches_complete_checks_apart_from_the_inspection(client):
+    data = _stl(_plate())
+    client.post("/geometry/analyze", files={"file": ("plate.stl", data, "model/stl")})
+
+    response = client.post("/geometry/validate", files={"file": ("plate.stl", data, "model/stl")})
+
+    body = response.json()
+    assert response.headers["X-Cache"] == "MISS"
+    assert body["valid"] is False
+    assert body["checks"]["thinWalls"]["faceCount"] == 4
+    assert _cached("printability", data) == body["checks"]
+    # The analysis cache entry still holds only the topology verdict
+    assert _cached("inspect", data)["validation"]["checks"] is None
+
+    again = client.post("/geometry/validate", files={"file": ("plate.stl", data, "model/stl")})
+    assert again.headers["X-Cache"] == "HIT-MEMORY"
+    assert again.json() == body
+
+
+def test_sampled_checks_are_returned_but_not_cached(client, monkeypatch):
+    # Eager Celery runs the task in this process, where the budget applies
+    monkeypatch.setattr(settings, "PRINTABILITY_TIME_BUDGET", -1.0)
+    data = _stl(_plate())
+
+    job = client.post(
+        "/geometry/validate?async=true", files={"file": ("plate.stl", data, "model/stl")}
+    ).json()
+    result = client.get(f"/geometry/jobs/{job['id']}").json()["result"]
+
+    assert not result["checks"]["thinWalls"]["complete"]
+    assert any("its results are a sample" in warning for warning in result["warnings"])
+    assert _cached("inspect", data) is not None
+    assert _cached("printability", data) is None
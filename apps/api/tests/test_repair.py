@@ -0,0 +1,110 @@
+"""Mesh repair: welding, face cleanup, winding, hole filling and /geometry/repair."""
+import io
+import json
+
+import numpy as np
+import pytest
+import trimesh
+
+from app.services.geometry import repair
+
+
+def _repair(triangles, tolerance=1e-5, max_hole_edges=100):
+    return repair.repair_triangles(np.asarray(triangles, dtype=np.float32), tolerance, max_hole_edges)
+
+
+def _volume(vertices, faces) -> float:
+    return float(trimesh.Trimesh(vertices, faces, process=False).volume)
+
+
+def test_clean_mesh_comes_back_unchanged():
+    box = trimesh.creation.box(extents=(20.0, 10.0, 5.0))
+
+    vertices, faces, report = _repair(box.triangles)
+
+    assert (report["triangleCount"], report["vertexCount"]) == (12, 8)
+    assert report["flippedFaces"] == report["filledHoles"] == 0
+    assert report["isWatertight"] and report["isWindingConsistent"]
+    assert _volume(vertices, faces) == pytest.approx(1000.0)
+
+
+def test_near_coincident_corners_are_welded():
+    sphere = trimesh.creation.icosphere(subdivisions=2)
+    jitter = np.random.default_rng(0).uniform(-1e-7, 1e-7, sphere.triangles.shape)
+
+    _, _, report = _repair(sphere.triangles + jitter, tolerance=1e-5)
+
+    assert report["vertexCount"] == len(sphere.vertices)
+    assert report["isWatertight"]
+
+
+def test_degenerate_and_duplicate_faces_are_dropped():
+    box = trimesh.creation.box(extents=(10.0, 10.0, 10.0))
+    sliver = [[[0, 0, 0], [1, 0, 0], [2, 0, 0]]]
+    repeated = box.triangles[:2][:, ::-1]  # the same faces, wound the other way
+
+    _, _, report = _repair(np.concatenate([box.triangles, sliver, repeated]))
+
+    assert report["degenerateFaces"] == 1
+    assert report["duplicateFaces"] == 2
+    assert report["triangleCount"] == 12
+    assert report["isWatertight"]
+
+
+def test_inconsistent_and_inside_out_winding_is_fixed():
+    box = trimesh.creation.box(extents=(10.0, 10.0, 10.0))
+    triangles = box.triangles.copy()
+    triangles[:5] = triangles[:5][:, ::-1]
+
+    vertices, faces, report = _repair(triangles)
+    inverted = _repair(box.triangles[:, ::-1])
+
+    assert report["flippedFaces"] == 5
+    assert report["isWindingConsistent"]
+    assert _volume(vertices, faces) == pytest.approx(1000.0)
+    assert inverted[2]["flippedFaces"] == 12
+    assert _volume(inverted[0], inverted[1]) == pytest.approx(1000.0)
+
+
+def test_small_holes_are_closed_and_large_ones_left():
+    sphere = trimesh.creation.icosphere(subdivisions=2)
+    holed = sphere.triangles[1:]
+
+    _, _, closed = _repair(holed)
+    _, _, left = _repair(holed, max_hole_edges=2)
+
+    assert closed["filledHoles"] == 1
+    assert closed["isWatertight"]
+    assert left["filledHoles"] == 0
+    assert left["boundaryEdges"] == 3
+    assert not left["isWatertight"]
+
+
+def test_repair_endpoint_streams_the_mesh_and_its_report(client):
+    box = trimesh.creation.box(extents=(20.0, 10.0, 5.0))
+    triangles = box.triangles.copy()
+    triangles[:3] = triangles[:3][:, ::-1]
+    broken = trimesh.exchange.stl.export_stl(trimesh.Trimesh(**trimesh.triangles.to_kwargs(triangles)))
+
+    response = client.post("/geometry/repair", files={"file": ("part.stl", broken, "model/stl")})
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="part-repaired.stl"'
+    report = json.loads(response.headers["X-Repair-Report"])
+    assert report["inputTriangles"] == 12
+    assert report["bytes"] == len(response.content) == 84 + 50 * 12
+    repaired = trimesh.load(io.BytesIO(response.content), file_type="stl")
+    assert repaired.is_watertight and repaired.is_winding_consistent
+    assert repaired.volume == pytest.approx(1000.0)
+
+    glb = client.post("/geometry/repair?format=glb", files={"file": ("part.stl", broken, "model/stl")})
+    assert glb.headers["content-type"] == "model/gltf-binary"
+    assert glb.content[:4] == b"glTF"
+
+
+def test_repair_endpoint_rejects_empty_models(client):
+    response = client.post(
+        "/geometry/repair", files={"file": ("empty.stl", b"solid x\nendsolid x\n", "model/stl")}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,116 @@
+"""Layer slicing and the FDM/SLA print estimator."""
+import numpy as np
+import pytest
+import trimesh
+
+from app.services.geometry import profiles, slicing
+
+
+def _slices(mesh, layer_height=0.2, chunk=None):
+    triangles = mesh.triangles
+    chunks = [triangles] if chunk is None else [triangles[i:i + chunk] for i in range(0, len(triangles), chunk)]
+    return slicing.slice_layers(chunks, float(mesh.bounds[0][2]), float(mesh.bounds[1][2]), layer_height)
+
+
+def _box(x=20.0, y=10.0, z=5.0):
+    return trimesh.creation.box(extents=(x, y, z))
+
+
+def test_box_layers_have_its_cross_section_and_outline():
+    slices = _slices(_box())
+
+    assert len(slices.area) == 25
+    assert np.allclose(slices.area, 200.0)
+    assert np.allclose(slices.perimeter, 60.0)
+
+
+def test_holes_subtract_from_the_area():
+    outer = _box(20.0, 20.0, 4.0)
+    # An inward-facing inner box is a hole through the part
+    hole = _box(10.0, 10.0, 4.0)
+    hole.invert()
+    tube = trimesh.util.concatenate([outer, hole])
+
+    slices = _slices(tube)
+
+    assert np.allclose(slices.area, 400.0 - 100.0)
+    assert np.allclose(slices.perimeter, 80.0 + 40.0)
+
+
+def test_chunking_does_not_change_the_slices():
+    sphere = trimesh.creation.icosphere(subdivisions=3, radius=10.0)
+
+    whole = _slices(sphere)
+    chunked = _slices(sphere, chunk=97)
+
+    assert np.allclose(whole.area, chunked.area)
+    assert np.allclose(whole.perimeter, chunked.perimeter)
+    # Mid-plane sections of a sphere integrate to its volume
+    assert whole.area.sum() * whole.layer_height == pytest.approx(sphere.volume, rel=0.01)
+
+
+def test_resample_interpolates_coarser_layers():
+    base = _slices(_box(z=6.0), layer_height=0.1)
+
+    coarse = slicing.resample(base, 0.3, 3.0)
+
+    assert len(coarse.area) == 20
+    assert np.allclose(coarse.area, 200.0)
+
+
+def test_layer_height_must_be_positive():
+    with pytest.raises(ValueError):
+        slicing.slice_layers([_box().triangles], -2.5, 2.5, 0.0)
+
+
+def test_matrix_agrees_with_single_profile_estimates():
+    printer = profiles.get_printer("bambu-p1s")
+    materials = [profiles.get_material(name) for name in ("PLA", "RESIN")]
+    mesh = _box(40.0, 30.0, 12.0)
+    base = _slices(mesh, layer_height=0.1)
+
+    matrix = slicing.estimate_matrix(base, 6.0, printer, materials, [0.1, 0.2], [0.15, 0.5])
+
+    assert matrix["print_time"].shape == (2, 2, 2)
+    single = slicing.estimate_print(_slices(mesh, layer_height=0.2), printer, materials[0], 0.5)
+    assert matrix["print_time"][0, 1, 1] == pytest.approx(single["print_time"], rel=1e-6)
+    assert matrix["material"][0, 1, 1] == pytest.approx(single["material"], rel=1e-6)
+
+
+def test_fdm_estimates_follow_infill_and_layer_height():
+    printer = profiles.get_printer("bambu-p1s")
+    pla = profiles.get_material("PLA")
+    mesh = _box(40.0, 30.0, 12.0)
+    base = _slices(mesh, layer_height=0.1)
+
+    matrix = slicing.estimate_matrix(base, 6.0, printer, [pla], [0.1, 0.2], [0.1, 1.0])
+    time, grams = matrix["print_time"][0], matrix["material"][0]
+
+    assert time[0, 0] > time[1, 0]
+    assert time[0, 1] > time[0, 0]
+    assert grams[0, 1] > grams[0, 0]
+    # Solid infill extrudes about the whole part
+    assert grams[1, 1] == pytest.approx(mesh.volume / 1000.0 * pla.density, rel=0.02)
+
+
+def test_resin_prints_whole_layers_solid():
+    printer = profiles.get_printer("bambu-p1s")
+    resin = profiles.get_material("RESIN")
+    mesh = _box(40.0, 30.0, 12.0)
+    base = _slices(mesh, layer_height=0.1)
+
+    matrix = slicing.estimate_matrix(base, 6.0, printer, [resin], [0.1], [0.1, 0.5])
+
+    # Infill has no effect; time is layers × layer time
+    assert np.allclose(matrix["print_time"][0, 0], 120 * resin.layer_time / 3600.0)
+    assert np.allclose(matrix["material"][0, 0], mesh.volume / 1000.0 * resin.density)
+
+
+def test_small_layers_are_slowed_for_cooling():
+    printer = profiles.get_printer("bambu-p1s")
+    pla = profiles.get_material("PLA")
+    slices = _slices(_box(2.0, 2.0, 2.0))
+
+    estimate = slicing.estimate_print(slices, printer, pla, 0.15)
+
+    assert estimate["print_time"] == pytest.approx(10 * printer.min_layer_time / 3600.0)
@@ -0,0 +1,59 @@
+"""Native STL ingest agrees with trimesh on the same files."""
+import io
+
+import numpy as np
+import pytest
+import trimesh
+
+from app.services.geometry import stl
+
+
+def _meshes():
+    sphere = trimesh.creation.icosphere(subdivisions=3, radius=12.5)
+    torus = trimesh.creation.annulus(r_min=4.0, r_max=9.0, height=6.0)
+    torus.apply_translation([30.0, -5.0, 2.0])
+    open_box = trimesh.creation.box(extents=(20.0, 10.0, 5.0))
+    open_box.update_faces(np.arange(len(open_box.faces)) != 0)
+    flipped = trimesh.creation.box(extents=(8.0, 8.0, 8.0))
+    flipped.faces[3] = flipped.faces[3][::-1]
+    return {"sphere": sphere, "annulus": torus, "open box": open_box, "flipped face": flipped}
+
+
+MESHES = _meshes()
+
+
+def _export(mesh, ascii: bool) -> bytes:
+    return trimesh.exchange.stl.export_stl_ascii(mesh).encode() if ascii else trimesh.exchange.stl.export_stl(mesh)
+
+
+@pytest.mark.parametrize("ascii", [False, True], ids=["binary", "ascii"])
+@pytest.mark.parametrize("name", MESHES)
+def test_matches_trimesh(name, ascii):
+    data = _export(MESHES[name], ascii)
+    reference = trimesh.load(io.BytesIO(data), file_type="stl")
+
+    stats = stl.analyze_stl(io.BytesIO(data))
+
+    assert stats.triangle_count == len(reference.faces)
+    if reference.is_watertight and reference.is_winding_consistent:
+        # Volume is only defined for closed, consistently wound meshes
+        assert stats.volume == pytest.approx(reference.volume, rel=1e-5)
+    assert stats.area == pytest.approx(reference.area, rel=1e-5)
+    np.testing.assert_allclose(stats.bounds, reference.bounds, rtol=1e-5, atol=1e-5)
+    assert stats.is_watertight == reference.is_watertight
+    assert stats.is_winding_consistent == reference.is_winding_consistent
+
+
+@pytest.mark.parametrize("ascii", [False, True], ids=["binary", "ascii"])
+def test_load_triangles_matches_trimesh(ascii):
+    data = _export(MESHES["sphere"], ascii)
+    reference = trimesh.load(io.BytesIO(data), file_type="stl")
+
+    triangles = stl.load_triangles(memoryview(data))
+
+    np.testing.assert_allclose(triangles, reference.triangles, rtol=1e-6, atol=1e-5)
+
+
+def test_rejects_other_formats():
+    with pytest.raises(stl.STLFormatError):
+        stl.analyze_stl(io.BytesIO(b"\x89PNG\r\n\x1a\n not a mesh"))
@@ -0,0 +1,56 @@
+"""Software-rendered thumbnails: rendering, serving and removal with the model's previews."""
+import io
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+from app.core.config import settings
+from app.services.geometry import previews, thumbnails
+
+
+def _sphere():
+    return trimesh.creation.icosphere(subdivisions=4, radius=10.0)
+
+
+def test_thumbnail_is_a_shaded_square():
+    image = thumbnails.render_thumbnail(_sphere().triangles, 64)
+
+    assert image.size == (64, 64)
+    pixels = np.asarray(image)
+    # Opaque in the middle, transparent in the corners, and not flat
+    assert pixels[32, 32, 3] == 255
+    assert pixels[0, 0, 3] == 0
+    assert len(np.unique(pixels[pixels[:, :, 3] == 255][:, 0])) > 1
+
+
+def test_thumbnail_fills_the_frame_whatever_the_scale():
+    small = np.asarray(thumbnails.render_thumbnail(_sphere().triangles * 0.01, 64))[:, :, 3]
+    large = np.asarray(thumbnails.render_thumbnail(_sphere().triangles * 100.0, 64))[:, :, 3]
+
+    assert (small == 255).sum() == (large == 255).sum()
+
+
+def test_empty_model_renders_a_blank_image():
+    image = thumbnails.render_thumbnail(np.zeros((0, 3, 3)), 32)
+
+    assert image.size == (32, 32)
+    assert not np.asarray(image).any()
+
+
+def test_thumbnail_endpoint_serves_the_built_image_until_removed(client, tmp_path):
+    digest = "e" * 64
+    url = f"/geometry/previews/{digest}/thumbnail"
+    assert client.get(url).status_code == 404
+
+    path = tmp_path / "model.stl"
+    path.write_bytes(trimesh.exchange.stl.export_stl(_sphere()))
+    previews.build_previews(str(path), ".stl", digest)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == f"image/{previews.thumbnail_format()}"
+    assert Image.open(io.BytesIO(response.content)).size == (settings.THUMBNAIL_SIZE,) * 2
+
+    previews.remove(digest)
+    assert client.get(url).status_code == 404
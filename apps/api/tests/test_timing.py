@@ -0,0 +1,92 @@
+"""Per-stage timing: Server-Timing, histograms, /metrics and debug profiles."""
+import os
+
+import trimesh
+
+from app.core.config import settings
+from app.services.geometry import timing
+
+
+def _stl(subdivisions: int = 3) -> bytes:
+    return trimesh.exchange.stl.export_stl(trimesh.creation.icosphere(subdivisions=subdivisions))
+
+
+def _stages(response) -> list:
+    return [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+
+
+def _analyze(client, data: bytes, **kwargs):
+    return client.post("/geometry/analyze", files={"file": ("ball.stl", data, "model/stl")}, **kwargs)
+
+
+def test_triangle_buckets():
+    assert timing.triangle_bucket(None) == "unknown"
+    assert timing.triangle_bucket(9_999) == "<10k"
+    assert timing.triangle_bucket(10_000) == "10k-100k"
+    assert timing.triangle_bucket(2_000_000) == "1M-10M"
+    assert timing.triangle_bucket(10_000_000) == ">=10M"
+
+
+def test_server_timing_formats_durations_and_peaks():
+    timer = timing.StageTimer()
+    timer.add("parse", 0.01234, 3 << 20)
+    timer.add("cache", 0.0005)
+
+    assert timer.server_timing() == 'parse;dur=12.3;desc="peak 3MB", cache;dur=0.5'
+
+
+def _marked(value):
+    with timing.stage("work"):
+        return value + "!"
+
+
+def test_stage_only_records_inside_timed_jobs():
+    # Outside a job it is a no-op
+    assert _marked("x") == "x!"
+
+    outcome = timing.timed(None, _marked, "x")
+
+    assert outcome["result"] == "x!"
+    assert [name for name, _, _ in outcome["stages"]] == ["work"]
+
+
+def test_miss_reports_api_and_worker_stages(client):
+    response = _analyze(client, _stl())
+
+    stages = _stages(response)
+    assert stages[:3] == ["upload", "spool", "cache"]
+    assert {"queue", "parse", "estimate", "fingerprint"} <= set(stages)
+    assert "checks" not in stages
+    assert stages[-1] == "total"
+
+
+def test_hit_skips_the_worker(client):
+    data = _stl()
+    _analyze(client, data)
+
+    stages = _stages(_analyze(client, data))
+
+    assert "queue" not in stages and "parse" not in stages
+
+
+def test_metrics_needs_its_token(client, monkeypatch):
+    _analyze(client, _stl())
+
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape")
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 404
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert 'geometry_stage_seconds_count{file_type="stl",stage="parse",triangles="<10k"}' in response.text
+
+
+def test_debug_profile_dumps_the_pool_job(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "GEOMETRY_PROFILE_DIR", str(tmp_path))
+    assert "X-Profile" not in _analyze(client, _stl(), headers={"X-Debug-Profile": "1"}).headers
+
+    monkeypatch.setattr(settings, "DEBUG", True)
+    # A model not cached yet, so the pool job runs
+    response = _analyze(client, _stl(2), headers={"X-Debug-Profile": "1"})
+
+    assert os.path.exists(tmp_path / response.headers["X-Profile"])
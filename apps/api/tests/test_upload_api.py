@@ -0,0 +1,87 @@
+"""/upload/model: deduplicated storage, hash-first claims and private downloads."""
+import hashlib
+from urllib.parse import urlsplit
+
+import trimesh
+
+from app.core.config import settings
+
+from .conftest import auth
+
+
+def _model() -> bytes:
+    return trimesh.exchange.stl.export_stl(trimesh.creation.icosphere(subdivisions=2, radius=10.0))
+
+
+def _keys(s3, prefix="") -> set:
+    listing = s3.list_objects_v2(Bucket=settings.AWS_S3_BUCKET, Prefix=prefix)
+    return {obj["Key"] for obj in listing.get("Contents", [])}
+
+
+def _upload(client, user_id: str, data: bytes):
+    return client.post("/upload/model", files={"file": ("ball.stl", data, "model/stl")}, headers=auth(user_id))
+
+
+def test_upload_stores_once_and_deletes_with_last_reference(client, s3):
+    data = _model()
+
+    uploads = [_upload(client, user_id, data).json() for user_id in ("alice", "bob")]
+
+    assert [upload["deduplicated"] for upload in uploads] == [False, True]
+    assert len(_keys(s3, "blobs/")) == 1
+    assert client.delete(f"/upload/{uploads[1]['key']}", headers=auth("alice")).status_code == 403
+    for upload, user_id in zip(uploads, ("alice", "bob")):
+        assert client.delete(f"/upload/{upload['key']}", headers=auth(user_id)).status_code == 200
+        assert bool(_keys(s3, "blobs/")) == (user_id == "alice")
+    assert _keys(s3) == set()
+
+
+def test_model_urls_are_presigned_and_keys_hide_the_digest(client, s3):
+    data = _model()
+    digest = hashlib.sha256(data).hexdigest()
+
+    upload = _upload(client, "alice", data).json()
+
+    url = urlsplit(upload["url"])
+    assert "Signature" in url.query or "X-Amz-Signature" in url.query
+    assert digest not in url.path
+    assert all(digest not in key for key in _keys(s3))
+
+
+def test_claim_requires_proof_of_the_file(client, s3):
+    data = _model()
+    digest = hashlib.sha256(data).hexdigest()
+    claim = {"sha256": digest, "size": len(data), "filename": "mine.stl"}
+
+    assert client.post("/upload/model/claim/challenge", json=claim, headers=auth("bob")).status_code == 404
+    _upload(client, "alice", data)
+
+    issued = client.post("/upload/model/claim/challenge", json=claim, headers=auth("bob")).json()
+    ranges = [(r["offset"], r["length"]) for r in issued["ranges"]]
+    nonce = bytes.fromhex(issued["nonce"])
+    proofs = [hashlib.sha256(nonce + data[offset:offset + length]).hexdigest() for offset, length in ranges]
+
+    # Only the digest: refused
+    guess = {**claim, "challenge": issued["challenge"], "proofs": [digest] * len(ranges)}
+    assert client.post("/upload/model/claim", json=guess, headers=auth("bob")).status_code == 404
+    # Someone else's challenge: refused
+    stolen = {**claim, "challenge": issued["challenge"], "proofs": proofs}
+    assert client.post("/upload/model/claim", json=stolen, headers=auth("mallory")).status_code == 400
+
+    response = client.post("/upload/model/claim", json=stolen, headers=auth("bob"))
+    assert response.status_code == 200
+    assert response.json()["deduplicated"] is True
+    assert response.json()["key"].startswith("models/bob/")
+
+
+def test_download_redirects_owners_only(client, s3):
+    upload = _upload(client, "alice", _model()).json()
+
+    response = client.get(
+        "/upload/model/download", params={"key": upload["key"]}, headers=auth("alice"), follow_redirects=False
+    )
+    assert response.status_code == 307
+    assert "/blobs/" in urlsplit(response.headers["Location"]).path
+
+    response = client.get("/upload/model/download", params={"key": upload["key"]}, headers=auth("bob"))
+    assert response.status_code == 404
@@ -0,0 +1,88 @@
+"""Resumable uploads against S3 multipart uploads."""
+import pytest
+
+from app.core.config import settings
+from app.services import upload_sessions
+from app.services.storage import MIN_PART_SIZE
+
+KEY = "models/alice/model.stl"
+
+
+@pytest.fixture
+def payload():
+    return bytes(range(256)) * ((2 * MIN_PART_SIZE + 1000) // 256)
+
+
+@pytest.fixture
+def session(s3, bucket, payload, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_BYTES", MIN_PART_SIZE)
+    return upload_sessions.create(s3, bucket, "alice", KEY, "model.stl", len(payload), "model/stl")
+
+
+def _chunks(session, payload):
+    size = session["chunkSize"]
+    return [(offset, payload[offset:offset + size]) for offset in range(0, len(payload), size)]
+
+
+def _uploads(s3, bucket) -> list:
+    return s3.list_multipart_uploads(Bucket=bucket).get("Uploads", [])
+
+
+def test_chunks_in_any_order_complete_the_object(s3, bucket, session, payload):
+    chunks = _chunks(session, payload)
+    assert len(chunks) == 3
+
+    for offset, body in reversed(chunks[1:]):
+        upload_sessions.upload_chunk(s3, bucket, session, offset, body)
+    parts = upload_sessions.received(s3, bucket, session)
+    assert upload_sessions.missing_offsets(session, parts) == [0]
+    with pytest.raises(upload_sessions.IncompleteUpload) as e:
+        upload_sessions.complete(s3, bucket, session)
+    assert e.value.missing == [0]
+
+    upload_sessions.upload_chunk(s3, bucket, session, *chunks[0])
+    upload_sessions.complete(s3, bucket, session)
+
+    assert s3.get_object(Bucket=bucket, Key=KEY)["Body"].read() == payload
+    assert _uploads(s3, bucket) == []
+
+
+def test_chunks_must_line_up(s3, bucket, session, payload):
+    size = session["chunkSize"]
+    with pytest.raises(upload_sessions.ChunkError):
+        upload_sessions.upload_chunk(s3, bucket, session, 1, payload[1:size + 1])
+    with pytest.raises(upload_sessions.ChunkError):
+        upload_sessions.upload_chunk(s3, bucket, session, 0, payload[:size - 1])
+    with pytest.raises(upload_sessions.ChunkError):
+        upload_sessions.upload_chunk(s3, bucket, session, len(payload), b"")
+
+
+def test_token_is_bound_to_its_owner(session):
+    token = upload_sessions.encode(session)
+
+    assert upload_sessions.decode(token, "alice") == session
+    with pytest.raises(upload_sessions.SessionNotFound):
+        upload_sessions.decode(token, "bob")
+    with pytest.raises(upload_sessions.SessionNotFound):
+        upload_sessions.decode(token + "x", "alice")
+
+
+def test_abort_discards_parts(s3, bucket, session, payload):
+    upload_sessions.upload_chunk(s3, bucket, session, *_chunks(session, payload)[0])
+
+    upload_sessions.abort(s3, bucket, session)
+
+    assert _uploads(s3, bucket) == []
+    with pytest.raises(upload_sessions.SessionNotFound):
+        upload_sessions.received(s3, bucket, session)
+    with pytest.raises(upload_sessions.SessionNotFound):
+        upload_sessions.abort(s3, bucket, session)
+
+
+def test_sweep_aborts_expired_model_uploads(s3, bucket, session, monkeypatch):
+    s3.create_multipart_upload(Bucket=bucket, Key="images/alice/photo.png")
+
+    # Every upload started before a cutoff an hour from now
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_TTL", -3600)
+    assert upload_sessions.sweep(s3, bucket) == 1
+    assert [upload["Key"] for upload in _uploads(s3, bucket)] == ["images/alice/photo.png"]
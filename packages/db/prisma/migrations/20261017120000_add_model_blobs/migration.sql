@@ -0,0 +1,27 @@
+-- CreateTable
+CREATE TABLE "ModelBlob" (
+    "key" TEXT NOT NULL,
+    "digest" TEXT NOT NULL,
+    "size" BIGINT NOT NULL,
+    "refCount" INTEGER NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "ModelBlob_pkey" PRIMARY KEY ("key")
+);
+
+-- CreateTable
+CREATE TABLE "ModelReference" (
+    "key" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "blobKey" TEXT NOT NULL,
+    "filename" TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "ModelReference_pkey" PRIMARY KEY ("key")
+);
+
+-- CreateIndex
+CREATE INDEX "ModelReference_userId_blobKey_idx" ON "ModelReference"("userId", "blobKey");
+
+-- AddForeignKey
+ALTER TABLE "ModelReference" ADD CONSTRAINT "ModelReference_blobKey_fkey" FOREIGN KEY ("blobKey") REFERENCES "ModelBlob"("key") ON DELETE RESTRICT ON UPDATE CASCADE;
@@ -0,0 +1,4 @@
+-- AlterTable
+-- "Quote" belongs to the API and is not modelled in schema.prisma, so the
+-- change is guarded for databases that do not have the table.
+ALTER TABLE IF EXISTS "Quote" ADD COLUMN IF NOT EXISTS "estimate" JSONB;